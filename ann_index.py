@@ -0,0 +1,480 @@
+import os
+import json
+import shutil
+import threading
+import logging
+from typing import List, Dict, Any, Optional, Set, Tuple
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+MANIFEST = "manifest.json"
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return matrix / norms
+
+
+def assign_lists(rows: np.ndarray, centroids: np.ndarray, batch_size: int = 8192) -> np.ndarray:
+    """Index of the nearest (highest cosine) centroid for every row."""
+    assignments = np.empty(len(rows), dtype=np.int32)
+    for start in range(0, len(rows), batch_size):
+        block = np.asarray(rows[start:start + batch_size], dtype=np.float32)
+        assignments[start:start + batch_size] = np.argmax(block @ centroids.T, axis=1)
+    return assignments
+
+
+def train_centroids(sample: np.ndarray, nlist: int, iterations: int = 10, seed: int = 0) -> np.ndarray:
+    """Spherical k-means over L2-normalised rows."""
+    rng = np.random.default_rng(seed)
+    nlist = min(nlist, len(sample))
+    centroids = sample[rng.choice(len(sample), nlist, replace=False)].astype(np.float32)
+
+    for _ in range(iterations):
+        assignments = assign_lists(sample, centroids)
+        order = np.argsort(assignments, kind="stable")
+        counts = np.bincount(assignments, minlength=nlist)
+        filled = np.flatnonzero(counts)
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]])[filled]
+
+        sums = np.empty_like(centroids)
+        sums[filled] = np.add.reduceat(sample[order], starts, axis=0)
+        empty = counts == 0
+        if empty.any():
+            # Re-seed empty lists with random rows
+            sums[empty] = sample[rng.choice(len(sample), int(empty.sum()))]
+        centroids = normalize_rows(sums)
+
+    return centroids
+
+
+class _Segment:
+    """Immutable on-disk batch of rows, grouped by inverted list.
+
+    ``vectors.npy`` holds float16 rows ordered by list, so every list is a
+    contiguous slice ``offsets[l]:offsets[l + 1]`` of the memory map. A
+    segment written before the index was trained has a single list. Only
+    ``deleted.npy`` (tombstones) is rewritten after creation.
+
+    Segments are reference counted: the index holds one reference and every
+    search holds one while it reads. A segment retired by a merge is closed
+    and its directory removed when the last reference is released.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.name = os.path.basename(path)
+        self.vectors = np.load(os.path.join(path, "vectors.npy"), mmap_mode="r")
+        self.offsets = np.load(os.path.join(path, "offsets.npy"))
+        self.codes = np.load(os.path.join(path, "codes.npy"))
+        self.metadata_offsets = np.load(os.path.join(path, "metadata_offsets.npy"), mmap_mode="r")
+        with open(os.path.join(path, "ids.json"), "r", encoding="utf-8") as f:
+            self.ids: List[str] = json.load(f)
+        with open(os.path.join(path, "documents.json"), "r", encoding="utf-8") as f:
+            self.documents: List[str] = json.load(f)
+
+        deleted_path = os.path.join(path, "deleted.npy")
+        self.deleted = np.load(deleted_path) if os.path.exists(deleted_path) else np.zeros(len(self.ids), dtype=bool)
+        self.dirty = False
+
+        # Row positions of each document, for filtered search
+        order = np.argsort(self.codes, kind="stable")
+        bounds = np.searchsorted(self.codes[order], np.arange(len(self.documents) + 1))
+        self.document_positions: Dict[str, np.ndarray] = {
+            name: order[bounds[code]:bounds[code + 1]] for code, name in enumerate(self.documents)
+        }
+
+        self._metadata_file = open(os.path.join(path, "metadata.jsonl"), "rb")
+        self._metadata_lock = threading.Lock()
+        self._references = 1  # The index's own; released when the segment is retired
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def lists(self) -> int:
+        return len(self.offsets) - 1
+
+    def live_count(self) -> int:
+        return len(self.ids) - int(self.deleted.sum())
+
+    def metadata(self, position: int) -> Dict[str, Any]:
+        start, end = int(self.metadata_offsets[position]), int(self.metadata_offsets[position + 1])
+        with self._metadata_lock:
+            self._metadata_file.seek(start)
+            return json.loads(self._metadata_file.read(end - start))
+
+    def all_metadata(self) -> List[Dict[str, Any]]:
+        with self._metadata_lock:
+            self._metadata_file.seek(0)
+            data = self._metadata_file.read()
+        offsets = self.metadata_offsets
+        return [json.loads(data[offsets[n]:offsets[n + 1]]) for n in range(len(self.ids))]
+
+    def save_deleted(self):
+        np.save(os.path.join(self.path, "deleted.npy.tmp.npy"), self.deleted)
+        os.replace(os.path.join(self.path, "deleted.npy.tmp.npy"), os.path.join(self.path, "deleted.npy"))
+        self.dirty = False
+
+    def acquire(self):
+        with self._metadata_lock:
+            self._references += 1
+
+    def release(self):
+        """Drop a reference; the last one closes the segment and removes its directory."""
+        with self._metadata_lock:
+            self._references -= 1
+            if self._references > 0:
+                return
+            self._metadata_file.close()
+        shutil.rmtree(self.path, ignore_errors=True)
+
+    @staticmethod
+    def write(path: str, rows: np.ndarray, ids: List[str], metadata: List[Dict[str, Any]],
+              centroids: Optional[np.ndarray]):
+        """Write rows (grouped by nearest centroid when trained) as a new segment."""
+        if centroids is not None:
+            assignments = assign_lists(rows, centroids)
+            order = np.argsort(assignments, kind="stable")
+            counts = np.bincount(assignments, minlength=len(centroids))
+        else:
+            order = np.arange(len(ids))
+            counts = np.array([len(ids)])
+        offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+
+        ids = [ids[n] for n in order]
+        metadata = [metadata[n] for n in order]
+        documents = list(dict.fromkeys(str(meta.get("document_id", "")) for meta in metadata))
+        codes_by_name = {name: code for code, name in enumerate(documents)}
+        codes = np.array([codes_by_name[str(meta.get("document_id", ""))] for meta in metadata], dtype=np.int32)
+
+        lines = [json.dumps(meta).encode("utf-8") for meta in metadata]
+        metadata_offsets = np.concatenate([[0], np.cumsum([len(line) for line in lines])]).astype(np.int64)
+
+        tmp = path + ".tmp"
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+        np.save(os.path.join(tmp, "vectors.npy"), np.asarray(rows, dtype=np.float16)[order])
+        np.save(os.path.join(tmp, "offsets.npy"), offsets)
+        np.save(os.path.join(tmp, "codes.npy"), codes)
+        np.save(os.path.join(tmp, "metadata_offsets.npy"), metadata_offsets)
+        with open(os.path.join(tmp, "metadata.jsonl"), "wb") as f:
+            f.write(b"".join(lines))
+        with open(os.path.join(tmp, "ids.json"), "w", encoding="utf-8") as f:
+            json.dump(ids, f)
+        with open(os.path.join(tmp, "documents.json"), "w", encoding="utf-8") as f:
+            json.dump(documents, f)
+        os.replace(tmp, path)
+
+
+class IVFIndex:
+    """Inverted-file (IVF) index of float16 vectors with incremental adds.
+
+    Rows are added to an in-memory buffer and written as an immutable segment
+    on ``flush()``; searches only see flushed rows, so query threads never
+    write segments. Until ``min_train_rows`` rows exist, segments are scanned
+    exactly; at that size k-means trains ``nlist`` centroids, all rows are
+    rewritten grouped by nearest centroid, and later segments are grouped on
+    write. A query scans the ``nprobe`` lists closest to it in every segment.
+    When there are more than ``max_segments`` segments the smaller half is
+    merged, which also drops deleted rows.
+
+    Filters match metadata fields exactly; ``document_id`` may also be
+    ``{"$in": [...]}``. A ``document_id`` filter covering at most
+    ``exact_filter_rows`` rows is answered by an exact scan of just those rows.
+    """
+
+    def __init__(self, root: str, dimension: int, nlist: int = 1024, nprobe: int = 16,
+                 min_train_rows: int = 40_000, max_segments: int = 16, exact_filter_rows: int = 50_000):
+        self.root = root
+        self.dimension = dimension
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.min_train_rows = min_train_rows
+        self.max_segments = max_segments
+        self.exact_filter_rows = exact_filter_rows
+        os.makedirs(root, exist_ok=True)
+
+        self._lock = threading.RLock()
+        self._segments: List[_Segment] = []
+        self._centroids: Optional[np.ndarray] = None
+        self._pending: Dict[str, Tuple[np.ndarray, Dict[str, Any]]] = {}
+        self._locations: Dict[str, Tuple[_Segment, int]] = {}
+        self._next_segment = 0
+        self._load()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._pending) + sum(
+                segment.live_count() for segment in self._segments
+            ) - sum(1 for vector_id in self._pending if vector_id in self._locations)
+
+    @property
+    def trained(self) -> bool:
+        return self._centroids is not None
+
+    def add(self, ids: List[str], rows: np.ndarray, metadata: List[Dict[str, Any]]):
+        """Buffer L2-normalised rows; a row replaces any earlier row with its id."""
+        with self._lock:
+            for vector_id, row, meta in zip(ids, rows, metadata):
+                self._pending[vector_id] = (np.asarray(row, dtype=np.float32), meta)
+
+    def remove(self, ids: List[str]) -> int:
+        """Delete rows by id; returns how many existed."""
+        removed = 0
+        with self._lock:
+            for vector_id in ids:
+                found = self._pending.pop(vector_id, None) is not None
+                location = self._locations.pop(vector_id, None)
+                if location is not None:
+                    segment, position = location
+                    segment.deleted[position] = True
+                    segment.dirty = True
+                    found = True
+                removed += found
+        return removed
+
+    def flush(self):
+        """Write buffered rows and tombstones to disk."""
+        with self._lock:
+            retired: List[_Segment] = []
+            if self._pending:
+                if not self.trained and len(self) >= self.min_train_rows:
+                    retired = self._train_and_rebuild()
+                else:
+                    self._write_pending()
+
+            for segment in self._segments:
+                if segment.dirty:
+                    segment.save_deleted()
+
+            if len(self._segments) > self.max_segments:
+                retired += self._merge_smallest()
+
+            self._write_manifest()
+            for segment in retired:
+                segment.release()  # Removed now, or when the searches reading it finish
+
+    def search(self, vector: np.ndarray, top_k: int,
+               filter: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """Approximate top-k by cosine similarity among rows matching ``filter``; unflushed rows are not seen."""
+        with self._lock:
+            segments = list(self._segments)
+            centroids = self._centroids
+            for segment in segments:
+                segment.acquire()
+        try:
+            return self._search(segments, centroids, vector, top_k, filter)
+        finally:
+            for segment in segments:
+                segment.release()
+
+    def _search(self, segments: List[_Segment], centroids: Optional[np.ndarray], vector: np.ndarray,
+                top_k: int, filter: Optional[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        query = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm > 0:
+            query = query / norm
+
+        filter = dict(filter or {})
+        documents = self._document_filter(filter.pop("document_id", None))
+        exact = documents is not None and sum(
+            len(segment.document_positions.get(name, ())) for segment in segments for name in documents
+        ) <= self.exact_filter_rows
+
+        probe = None
+        if centroids is not None and not exact:
+            list_scores = centroids @ query
+            probe = np.argsort(-list_scores)[:self.nprobe]
+
+        # Over-fetch when other metadata filters are checked after scoring
+        fetch = top_k * 4 if filter else top_k
+        candidates = []
+        for segment in segments:
+            positions, scores = self._score_segment(segment, query, documents, exact, probe)
+            if len(scores) == 0:
+                continue
+            scores = np.where(segment.deleted[positions], -np.inf, scores)
+            best = np.argsort(-scores)[:fetch] if len(scores) <= fetch else \
+                np.argpartition(-scores, fetch)[:fetch]
+            candidates.extend(
+                (float(scores[n]), segment, int(positions[n])) for n in best if np.isfinite(scores[n])
+            )
+
+        candidates.sort(key=lambda c: c[0], reverse=True)
+        matches = []
+        for score, segment, position in candidates:
+            metadata = segment.metadata(position)
+            if all(metadata.get(k) == v for k, v in filter.items()):
+                matches.append({"id": segment.ids[position], "score": score, "metadata": metadata})
+                if len(matches) == top_k:
+                    break
+        return matches
+
+    def has_document(self, document_id: str) -> bool:
+        with self._lock:
+            if any(meta.get("document_id") == document_id for _, meta in self._pending.values()):
+                return True
+            return any(
+                not segment.deleted[segment.document_positions[document_id]].all()
+                for segment in self._segments if document_id in segment.document_positions
+            )
+
+    def document_ids(self, document_id: str) -> List[str]:
+        """Ids of all live rows of a document."""
+        with self._lock:
+            ids = [vector_id for vector_id, (_, meta) in self._pending.items()
+                   if meta.get("document_id") == document_id]
+            for segment in self._segments:
+                for position in segment.document_positions.get(document_id, ()):
+                    if not segment.deleted[position]:
+                        ids.append(segment.ids[position])
+            return list(dict.fromkeys(ids))
+
+    def _score_segment(self, segment: _Segment, query: np.ndarray, documents: Optional[Set[str]],
+                       exact: bool, probe: Optional[np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+        """Candidate row positions of a segment and their scores."""
+        if exact:
+            parts = [segment.document_positions[name] for name in documents if name in segment.document_positions]
+            positions = np.sort(np.concatenate(parts)) if parts else np.zeros(0, dtype=np.int64)
+            return positions, np.asarray(segment.vectors[positions], dtype=np.float32) @ query
+
+        if probe is None or segment.lists == 1:
+            ranges = [(0, len(segment))]
+        else:
+            ranges = [(int(segment.offsets[l]), int(segment.offsets[l + 1])) for l in probe]
+            ranges = [(start, end) for start, end in ranges if end > start]
+
+        positions = np.concatenate([np.arange(start, end) for start, end in ranges]) if ranges else \
+            np.zeros(0, dtype=np.int64)
+        # float16 matrix products are slow in numpy, so score each slice in float32
+        scores = np.concatenate([
+            np.asarray(segment.vectors[start:end], dtype=np.float32) @ query for start, end in ranges
+        ]) if ranges else np.zeros(0, dtype=np.float32)
+
+        if documents is not None:
+            allowed = [code for code, name in enumerate(segment.documents) if name in documents]
+            scores = np.where(np.isin(segment.codes[positions], allowed), scores, -np.inf)
+        return positions, scores
+
+    @staticmethod
+    def _document_filter(value: Any) -> Optional[Set[str]]:
+        if value is None:
+            return None
+        if isinstance(value, dict):
+            return set(value["$in"])
+        return {value}
+
+    def _write_pending(self):
+        ids = list(self._pending)
+        rows = np.vstack([row for row, _ in self._pending.values()])
+        metadata = [meta for _, meta in self._pending.values()]
+        self._pending = {}
+        self._add_segment(self._new_segment(rows, ids, metadata))
+
+    def _train_and_rebuild(self) -> List[_Segment]:
+        """Train centroids on all rows and rewrite them as one grouped segment."""
+        pending_ids = list(self._pending)
+        ids, rows, metadata = self._live_rows(self._segments, exclude=set(pending_ids))
+        ids += pending_ids
+        rows = np.vstack([rows] + [self._pending[vector_id][0][None, :] for vector_id in pending_ids])
+        metadata += [self._pending[vector_id][1] for vector_id in pending_ids]
+        self._pending = {}
+
+        sample_size = min(len(rows), self.nlist * 64)
+        sample = rows[np.random.default_rng(0).choice(len(rows), sample_size, replace=False)]
+        logger.info(f"Training IVF index: {self.nlist} lists on {sample_size} of {len(rows)} rows")
+        self._centroids = train_centroids(sample, self.nlist)
+        np.save(os.path.join(self.root, "centroids.npy"), self._centroids)
+
+        retired, self._segments = self._segments, []
+        self._locations = {}
+        self._add_segment(self._new_segment(rows, ids, metadata))
+        return retired
+
+    def _merge_smallest(self) -> List[_Segment]:
+        """Merge the smaller half of the segments into one."""
+        by_size = sorted(self._segments, key=len)
+        retired = by_size[:max(2, len(by_size) // 2)]
+        ids, rows, metadata = self._live_rows(retired)
+
+        self._segments = [segment for segment in self._segments if segment not in retired]
+        for vector_id in ids:
+            self._locations.pop(vector_id, None)
+        if ids:
+            self._add_segment(self._new_segment(rows, ids, metadata))
+        logger.info(f"Merged {len(retired)} IVF segments into one of {len(ids)} rows")
+        return retired
+
+    def _live_rows(self, segments: List[_Segment], exclude: Set[str] = frozenset()
+                   ) -> Tuple[List[str], np.ndarray, List[Dict[str, Any]]]:
+        """Ids, float32 rows and metadata of the undeleted rows in ``segments``."""
+        ids, blocks, metadata = [], [], []
+        for segment in segments:
+            live = np.array([n for n in np.flatnonzero(~segment.deleted) if segment.ids[n] not in exclude],
+                            dtype=np.int64)
+            all_metadata = segment.all_metadata()
+            ids += [segment.ids[n] for n in live]
+            blocks.append(np.asarray(segment.vectors[live], dtype=np.float32))
+            metadata += [all_metadata[n] for n in live]
+        rows = np.vstack(blocks) if blocks else np.zeros((0, self.dimension), dtype=np.float32)
+        return ids, rows, metadata
+
+    def _new_segment(self, rows: np.ndarray, ids: List[str], metadata: List[Dict[str, Any]]) -> _Segment:
+        path = os.path.join(self.root, f"seg_{self._next_segment:06d}")
+        self._next_segment += 1
+        _Segment.write(path, rows, ids, metadata, self._centroids)
+        return _Segment(path)
+
+    def _add_segment(self, segment: _Segment):
+        """Register a segment; its rows replace older rows with the same ids."""
+        for position, vector_id in enumerate(segment.ids):
+            previous = self._locations.get(vector_id)
+            if previous is not None:
+                old_segment, old_position = previous
+                old_segment.deleted[old_position] = True
+                old_segment.dirty = True
+            if not segment.deleted[position]:
+                self._locations[vector_id] = (segment, position)
+        self._segments.append(segment)
+
+    def _write_manifest(self):
+        manifest = {
+            "dimension": self.dimension,
+            "nlist": self.nlist,
+            "trained": self.trained,
+            "next_segment": self._next_segment,
+            "segments": [segment.name for segment in self._segments]
+        }
+        tmp = os.path.join(self.root, MANIFEST + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+        os.replace(tmp, os.path.join(self.root, MANIFEST))
+
+    def _load(self):
+        path = os.path.join(self.root, MANIFEST)
+        manifest = {"segments": [], "next_segment": 0, "trained": False}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+            if manifest["dimension"] != self.dimension:
+                raise ValueError(f"IVF index at {self.root} has dimension {manifest['dimension']}, "
+                                 f"expected {self.dimension}")
+            self.nlist = manifest["nlist"]
+
+        if manifest["trained"]:
+            self._centroids = np.load(os.path.join(self.root, "centroids.npy"))
+        self._next_segment = manifest["next_segment"]
+
+        # Segments not in the manifest were left by an interrupted flush or merge
+        listed = set(manifest["segments"])
+        for name in os.listdir(self.root):
+            if name.startswith("seg_") and name not in listed:
+                shutil.rmtree(os.path.join(self.root, name), ignore_errors=True)
+
+        for name in manifest["segments"]:
+            self._add_segment(_Segment(os.path.join(self.root, name)))
+        if self._segments:
+            logger.info(f"Loaded IVF index from {self.root}: {len(self)} rows in {len(self._segments)} segments")
@@ -1,151 +1,212 @@
 import re
-from typing import List, Dict, Any
+from typing import List, Optional, Tuple, Pattern, FrozenSet
 import logging
+import numpy as np
+from sentence_store import Sentence, split_sentences
 
 logger = logging.getLogger(__name__)
 
+class ExtractionRule:
+    """One answer extractor: when it applies and how it picks a sentence.
+
+    ``required`` is a tuple of term groups; a sentence qualifies when every
+    group has at least one term present (single words are looked up in the
+    sentence's token set, phrases in its lowercase text). ``select_patterns``
+    qualify a sentence on their own and outrank plain qualifying sentences,
+    earlier patterns first; their groups fill ``select_template``.
+    ``format_pattern`` only rewrites the chosen sentence via ``format_template``.
+    Mode "first" keeps the earliest qualifying sentence, mode "overlap" the one
+    sharing the most words with the question (at least ``min_overlap``), or,
+    when the question embedding and stored sentence embeddings are available,
+    the one most similar to the question (cosine at least ``min_similarity``).
+    """
+
+    def __init__(self, name: str, question_phrases: Tuple[str, ...] = (),
+                 required: Tuple[Tuple[str, ...], ...] = (), required_text: Tuple[str, ...] = (),
+                 select_patterns: Tuple[Pattern, ...] = (), select_template: str = "",
+                 format_pattern: Optional[Pattern] = None, format_template: str = "",
+                 mode: str = "first", min_length: int = 0, min_overlap: int = 1,
+                 min_similarity: float = 0.0, fallback_min_length: Optional[int] = None, not_found: str = ""):
+        self.name = name
+        self.question_phrases = question_phrases
+        self.required = [
+            (frozenset(t for t in group if " " not in t), tuple(t for t in group if " " in t))
+            for group in required
+        ]
+        self.required_text = required_text
+        self.select_patterns = select_patterns
+        self.select_template = select_template
+        self.format_pattern = format_pattern
+        self.format_template = format_template
+        self.mode = mode
+        self.min_length = min_length
+        self.min_overlap = min_overlap
+        self.min_similarity = min_similarity
+        self.fallback_min_length = fallback_min_length
+        self.not_found = not_found
+
+    def applies_to(self, question_lower: str) -> bool:
+        return not self.question_phrases or any(p in question_lower for p in self.question_phrases)
+
+    def qualifies(self, sentence: Sentence) -> bool:
+        for words, phrases in self.required:
+            if not (words & sentence.tokens or any(p in sentence.lower for p in phrases)):
+                return False
+        return all(t in sentence.text for t in self.required_text)
+
+
+# Checked in order; the last rule (no question phrases) is the general fallback
+RULES = [
+    ExtractionRule(
+        "grace_period",
+        question_phrases=("grace period",),
+        required=(("grace",), ("period",)),
+        select_patterns=(
+            re.compile(r"grace period of (\d+) days?", re.IGNORECASE),
+            re.compile(r"(\d+) days? grace period", re.IGNORECASE),
+            re.compile(r"grace.*?(\d+) days?", re.IGNORECASE),
+        ),
+        select_template="A grace period of {0} days is provided for premium payment.",
+        not_found="Grace period information not found in the document."
+    ),
+    ExtractionRule(
+        "waiting_period",
+        question_phrases=("waiting period",),
+        required=(("waiting",), ("months", "years")),
+        format_pattern=re.compile(r'(\d+)\s*(months?|years?)', re.IGNORECASE),
+        format_template="There is a waiting period of {0} {1}. {sentence}",
+        not_found="Waiting period information not found in the document."
+    ),
+    ExtractionRule(
+        "coverage",
+        question_phrases=("covered", "coverage", "benefit"),
+        mode="overlap",
+        min_length=20,
+        min_similarity=0.25,
+        not_found="Coverage information not found in the document."
+    ),
+    ExtractionRule(
+        "maternity",
+        question_phrases=("maternity",),
+        required=(("maternity",),),
+        not_found="Maternity coverage information not found in the document."
+    ),
+    ExtractionRule(
+        "room_rent",
+        question_phrases=("room rent", "icu"),
+        required=(("room rent", "icu"),),
+        required_text=("%",),
+        not_found="Room rent information not found in the document."
+    ),
+    ExtractionRule(
+        "general",
+        mode="overlap",
+        min_length=30,
+        min_overlap=2,
+        min_similarity=0.3,
+        fallback_min_length=51,
+        not_found="Relevant information not found in the document."
+    ),
+]
+
 class AnswerGenerator:
-    def __init__(self):
-        pass
-    
-    def generate_answer(self, question: str, context_chunks: List[str]) -> str:
-        """Generate answer from context chunks."""
+    def __init__(self, rules: Optional[List[ExtractionRule]] = None):
+        self.rules = rules or RULES
+
+    def generate_answer(self, question: str, context_chunks: List[str],
+                        chunk_sentences: Optional[List[Optional[List[Sentence]]]] = None,
+                        question_embedding: Optional[List[float]] = None) -> str:
+        """Generate answer from context chunks.
+
+        ``chunk_sentences`` holds the pre-split sentences of each chunk (None
+        for chunks without them); missing ones are split here.
+        ``question_embedding`` is the query embedding already computed for
+        retrieval; with it, overlap rules rank stored sentence embeddings.
+        """
         if not context_chunks:
             return "No relevant information found in the document."
-        
-        # Combine context
-        context = "\n\n".join(context_chunks[:3])  # Use top 3 chunks
-        
+
+        # Use top 3 chunks
+        sentences: List[Sentence] = []
+        for i, chunk_text in enumerate(context_chunks[:3]):
+            presplit = chunk_sentences[i] if chunk_sentences and i < len(chunk_sentences) else None
+            sentences.extend(presplit if presplit is not None else split_sentences(chunk_text))
+
         # Generate answer based on question type
-        return self._extract_answer(question, context)
-    
-    def _extract_answer(self, question: str, context: str) -> str:
-        """Extract answer using pattern matching."""
+        return self._extract_answer(question, sentences, question_embedding)
+
+    def _extract_answer(self, question: str, sentences: List[Sentence],
+                        question_embedding: Optional[List[float]] = None) -> str:
+        """Pick the rule for the question and score all sentences in one pass."""
         question_lower = question.lower()
-        
-        # Grace period questions
-        if "grace period" in question_lower:
-            return self._extract_grace_period(context)
-        
-        # Waiting period questions
-        elif "waiting period" in question_lower:
-            return self._extract_waiting_period(context)
-        
-        # Coverage questions
-        elif any(word in question_lower for word in ["covered", "coverage", "benefit"]):
-            return self._extract_coverage_info(question, context)
-        
-        # Maternity questions
-        elif "maternity" in question_lower:
-            return self._extract_maternity_info(context)
-        
-        # Room rent questions
-        elif "room rent" in question_lower or "icu" in question_lower:
-            return self._extract_room_rent_info(context)
-        
-        # General extraction
-        else:
-            return self._extract_general_info(question, context)
-    
-    def _extract_grace_period(self, text: str) -> str:
-        """Extract grace period information."""
-        patterns = [
-            r"grace period of (\d+) days?",
-            r"(\d+) days? grace period",
-            r"grace.*?(\d+) days?"
-        ]
-        
-        for pattern in patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
-            if match:
-                days = match.group(1)
-                return f"A grace period of {days} days is provided for premium payment."
-        
-        # Look for sentences mentioning grace period
-        sentences = re.split(r'[.!?]+', text)
-        for sentence in sentences:
-            if "grace" in sentence.lower() and "period" in sentence.lower():
-                return sentence.strip()
-        
-        return "Grace period information not found in the document."
-    
-    def _extract_waiting_period(self, text: str) -> str:
-        """Extract waiting period information."""
-        sentences = re.split(r'[.!?]+', text)
-        for sentence in sentences:
-            if "waiting" in sentence.lower() and ("months" in sentence.lower() or "years" in sentence.lower()):
-                # Extract time period
-                time_match = re.search(r'(\d+)\s*(months?|years?)', sentence, re.IGNORECASE)
-                if time_match:
-                    period = time_match.group(1)
-                    unit = time_match.group(2)
-                    return f"There is a waiting period of {period} {unit}. {sentence.strip()}"
-                return sentence.strip()
-        
-        return "Waiting period information not found in the document."
-    
-    def _extract_coverage_info(self, question: str, text: str) -> str:
-        """Extract coverage information."""
-        question_words = set(re.findall(r'\b\w+\b', question.lower()))
-        sentences = re.split(r'[.!?]+', text)
-        
-        best_match = ""
-        max_overlap = 0
-        
-        for sentence in sentences:
-            if len(sentence.strip()) < 20:
-                continue
-            
-            sentence_words = set(re.findall(r'\b\w+\b', sentence.lower()))
-            overlap = len(question_words.intersection(sentence_words))
-            
-            if overlap > max_overlap:
-                max_overlap = overlap
-                best_match = sentence.strip()
-        
-        return best_match if best_match else "Coverage information not found in the document."
-    
-    def _extract_maternity_info(self, text: str) -> str:
-        """Extract maternity coverage information."""
-        sentences = re.split(r'[.!?]+', text)
-        for sentence in sentences:
-            if "maternity" in sentence.lower():
-                return sentence.strip()
-        
-        return "Maternity coverage information not found in the document."
-    
-    def _extract_room_rent_info(self, text: str) -> str:
-        """Extract room rent information."""
-        sentences = re.split(r'[.!?]+', text)
-        for sentence in sentences:
-            if ("room rent" in sentence.lower() or "icu" in sentence.lower()) and "%" in sentence:
-                return sentence.strip()
-        
-        return "Room rent information not found in the document."
-    
-    def _extract_general_info(self, question: str, text: str) -> str:
-        """Extract general information based on keyword matching."""
-        question_words = set(re.findall(r'\b\w+\b', question.lower()))
-        sentences = re.split(r'[.!?]+', text)
-        
-        scored_sentences = []
-        for sentence in sentences:
-            if len(sentence.strip()) < 30:
+        rule = next(r for r in self.rules if r.applies_to(question_lower))
+        question_tokens = Sentence(question).tokens
+        similarities = self._similarities(question_embedding, sentences) if rule.mode == "overlap" else None
+
+        best_rank = None
+        best: Optional[Tuple[Sentence, Optional[re.Match]]] = None
+        fallback = None
+
+        for i, sentence in enumerate(sentences):
+            if fallback is None and rule.fallback_min_length is not None \
+                    and len(sentence.text) >= rule.fallback_min_length:
+                fallback = sentence
+
+            if len(sentence.text) < rule.min_length:
                 continue
-            
-            sentence_words = set(re.findall(r'\b\w+\b', sentence.lower()))
-            overlap = len(question_words.intersection(sentence_words))
-            
-            if overlap >= 2:
-                scored_sentences.append((sentence.strip(), overlap))
-        
-        if scored_sentences:
-            scored_sentences.sort(key=lambda x: x[1], reverse=True)
-            return scored_sentences[0][0]
-        
-        # Return first meaningful sentence if no good match
-        for sentence in sentences:
-            if len(sentence.strip()) > 50:
-                return sentence.strip()
-        
-        return "Relevant information not found in the document."
\ No newline at end of file
+
+            similarity = similarities[i] if similarities is not None else None
+            ranked = self._rank(rule, question_tokens, sentence, similarity)
+            if ranked is not None and (best_rank is None or ranked[0] < best_rank):
+                best_rank, best = ranked[0], (sentence, ranked[1])
+
+        if best is not None:
+            return self._format(rule, *best)
+        if fallback is not None:
+            # Return first meaningful sentence if no good match
+            return fallback.text
+        return rule.not_found
+
+    @staticmethod
+    def _similarities(question_embedding: Optional[List[float]],
+                      sentences: List[Sentence]) -> Optional[np.ndarray]:
+        """Cosine similarity of the question to every sentence in one product, or None without embeddings."""
+        if question_embedding is None or not sentences or any(s.vector is None for s in sentences):
+            return None
+        question = np.asarray(question_embedding, dtype=np.float32)
+        norm = np.linalg.norm(question)
+        if not norm:
+            return None
+        # Stored rows are unit length, so the dot product is the cosine
+        matrix = np.stack([s.vector for s in sentences]).astype(np.float32)
+        return matrix @ (question / norm)
+
+    def _rank(self, rule: ExtractionRule, question_tokens: FrozenSet[str], sentence: Sentence,
+              similarity: Optional[float] = None) -> Optional[Tuple[Tuple, Optional[re.Match]]]:
+        """Rank key (lower is better) and pattern match for a sentence, or None."""
+        for i, pattern in enumerate(rule.select_patterns):
+            match = pattern.search(sentence.text)
+            if match:
+                return (0, i), match
+
+        if not rule.qualifies(sentence):
+            return None
+
+        if rule.mode == "overlap" and similarity is not None:
+            return ((1, -similarity), None) if similarity >= rule.min_similarity else None
+        if rule.mode == "overlap":
+            overlap = len(question_tokens & sentence.tokens)
+            return ((1, -overlap), None) if overlap >= rule.min_overlap else None
+
+        return (1, 0), None
+
+    def _format(self, rule: ExtractionRule, sentence: Sentence, match: Optional[re.Match]) -> str:
+        if match is not None:
+            return rule.select_template.format(*match.groups())
+
+        if rule.format_pattern is not None:
+            format_match = rule.format_pattern.search(sentence.text)
+            if format_match:
+                return rule.format_template.format(*format_match.groups(), sentence=sentence.text)
+
+        return sentence.text
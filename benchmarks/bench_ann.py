@@ -0,0 +1,140 @@
+"""Recall and latency of the IVF index against exact search.
+
+Usage: python benchmarks/bench_ann.py [--rows 100000] [--nprobe 1 4 16 64] [--doc-rows 500]
+
+Builds an index incrementally from synthetic clustered embeddings, one
+flush per "document", then compares cross-document and single-document
+(filtered) queries against an exact float32 scan. Reports build throughput,
+load time from disk, and recall@k and latency for each nprobe as JSON.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import statistics
+from typing import List, Dict, Any
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ann_index import IVFIndex, normalize_rows
+
+
+def clustered_rows(count: int, centers: np.ndarray, rng: np.random.Generator, spread: float) -> np.ndarray:
+    """Rows scattered around random centers, like chunks of related clauses."""
+    picks = rng.integers(0, len(centers), count)
+    noise = rng.standard_normal((count, centers.shape[1])).astype(np.float32)
+    return normalize_rows(centers[picks] + spread * noise / np.sqrt(centers.shape[1]))
+
+
+def exact_top_k(matrix: np.ndarray, query: np.ndarray, k: int) -> np.ndarray:
+    scores = matrix @ query
+    top = np.argpartition(-scores, min(k, len(scores) - 1))[:k]
+    return top[np.argsort(-scores[top])]
+
+
+def latency_ms(samples: List[float]) -> Dict[str, float]:
+    ordered = sorted(samples)
+    return {
+        "median_ms": round(statistics.median(ordered) * 1000, 3),
+        "p95_ms": round(ordered[int(0.95 * (len(ordered) - 1))] * 1000, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--dimension", type=int, default=384)
+    parser.add_argument("--doc-rows", type=int, default=500, help="rows per document (one flush each)")
+    parser.add_argument("--clusters", type=int, default=2000)
+    parser.add_argument("--spread", type=float, default=1.0, help="noise around cluster centers")
+    parser.add_argument("--nlist", type=int, default=1024)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32, 64])
+    parser.add_argument("--min-train-rows", type=int, default=40_000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=10)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    centers = normalize_rows(rng.standard_normal((args.clusters, args.dimension)).astype(np.float32))
+    rows = clustered_rows(args.rows, centers, rng, args.spread)
+    queries = clustered_rows(args.queries, centers, rng, args.spread)
+    documents = np.arange(args.rows) // args.doc_rows
+    ids = [f"doc{documents[n]}_{n}" for n in range(args.rows)]
+
+    root = tempfile.mkdtemp(prefix="hackrx_ann_")
+    try:
+        index = IVFIndex(root, args.dimension, nlist=args.nlist, min_train_rows=args.min_train_rows)
+        start = time.perf_counter()
+        for first in range(0, args.rows, args.doc_rows):
+            last = min(first + args.doc_rows, args.rows)
+            index.add(ids[first:last], rows[first:last],
+                      [{"document_id": f"doc{documents[n]}"} for n in range(first, last)])
+            index.flush()
+        build_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        index = IVFIndex(root, args.dimension, nlist=args.nlist, min_train_rows=args.min_train_rows)
+        load_seconds = time.perf_counter() - start
+
+        exact = [exact_top_k(rows, query, args.top_k) for query in queries]
+        exact_latency = []
+        for query in queries:
+            start = time.perf_counter()
+            exact_top_k(rows, query, args.top_k)
+            exact_latency.append(time.perf_counter() - start)
+
+        report: Dict[str, Any] = {
+            "rows": args.rows,
+            "dimension": args.dimension,
+            "documents": int(documents[-1]) + 1,
+            "nlist": args.nlist,
+            "top_k": args.top_k,
+            "build_rows_per_second": round(args.rows / build_seconds, 1),
+            "load_seconds": round(load_seconds, 3),
+            "segments": len(index._segments),
+            "index_bytes": sum(
+                os.path.getsize(os.path.join(directory, name))
+                for directory, _, names in os.walk(root) for name in names
+            ),
+            "exact_float32": latency_ms(exact_latency),
+            "cross_document": [],
+        }
+
+        for nprobe in args.nprobe:
+            index.nprobe = nprobe
+            latency, recall = [], []
+            for query, expected in zip(queries, exact):
+                start = time.perf_counter()
+                matches = index.search(query, args.top_k)
+                latency.append(time.perf_counter() - start)
+                found = {int(match["id"].rsplit("_", 1)[1]) for match in matches}
+                recall.append(len(found & set(expected.tolist())) / args.top_k)
+            report["cross_document"].append(
+                {"nprobe": nprobe, "recall": round(float(np.mean(recall)), 4), **latency_ms(latency)}
+            )
+
+        # Single-document queries, the /hackrx/run path
+        latency, recall = [], []
+        for n, query in enumerate(queries):
+            document = int(rng.integers(0, documents[-1] + 1))
+            members = np.flatnonzero(documents == document)
+            expected = members[exact_top_k(rows[members], query, args.top_k)]
+            start = time.perf_counter()
+            matches = index.search(query, args.top_k, {"document_id": f"doc{document}"})
+            latency.append(time.perf_counter() - start)
+            found = {int(match["id"].rsplit("_", 1)[1]) for match in matches}
+            recall.append(len(found & set(expected.tolist())) / min(args.top_k, len(members)))
+        report["single_document"] = {"recall": round(float(np.mean(recall)), 4), **latency_ms(latency)}
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""Compare serial and process-pool PDF page extraction.
+
+Usage: python benchmarks/bench_pdf_extraction.py [policy.pdf | --pages 200] [--workers 4] [--pages-per-task 16]
+
+Checks that the parallel output matches the serial output page for page
+and prints the timings and speedup as JSON.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from pdf_extraction import iter_pages
+from synthetic_pdf import write_policy_pdf
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("pdf_path", nargs="?", help="defaults to a synthetic policy PDF")
+    parser.add_argument("--pages", type=int, default=200, help="pages of the synthetic PDF")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2)
+    parser.add_argument("--pages-per-task", type=int, default=16)
+    args = parser.parse_args()
+
+    if args.pdf_path is None:
+        args.pdf_path = write_policy_pdf(
+            os.path.join(tempfile.mkdtemp(prefix="hackrx_bench_"), f"policy_{args.pages}.pdf"), args.pages
+        )
+
+    start = time.perf_counter()
+    serial = list(iter_pages(args.pdf_path))
+    serial_seconds = time.perf_counter() - start
+
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        # Warm the workers so process start-up is not counted
+        list(pool.map(abs, range(args.workers)))
+
+        start = time.perf_counter()
+        parallel = list(iter_pages(args.pdf_path, pool, args.pages_per_task,
+                                   max_in_flight=args.workers + 1))
+        parallel_seconds = time.perf_counter() - start
+
+    if parallel != serial:
+        mismatched = [s[0] for s, p in zip(serial, parallel) if s != p]
+        raise SystemExit(f"Parallel extraction differs from serial on pages {mismatched[:10]}")
+
+    print(json.dumps({
+        "pdf": args.pdf_path,
+        "pages": len(serial),
+        "workers": args.workers,
+        "pages_per_task": args.pages_per_task,
+        "serial_seconds": round(serial_seconds, 3),
+        "parallel_seconds": round(parallel_seconds, 3),
+        "speedup": round(serial_seconds / parallel_seconds, 2) if parallel_seconds else None,
+        "identical": True
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
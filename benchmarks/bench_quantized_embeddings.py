@@ -0,0 +1,116 @@
+"""Compare fp32 and int8-quantized embedding backends on CPU.
+
+Usage: python benchmarks/bench_quantized_embeddings.py [--chunks 2000] [--threads 4] [--min-overlap 0.9]
+
+Encodes synthetic policy chunks and questions with both backends, reports
+encode throughput and speedup, and checks that the top-k chunks retrieved
+with int8 embeddings agree with fp32 retrieval. Exits non-zero when the mean
+top-k overlap falls below ``--min-overlap`` (default
+``Config.EMBEDDING_MIN_TOPK_OVERLAP``).
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+from dataclasses import replace
+from typing import List
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from config import Config
+from embedding_service import EmbeddingService
+from synthetic_pdf import CLAUSES
+
+QUESTIONS = [
+    "What is the grace period for premium payment?",
+    "What is the waiting period for pre-existing diseases (PED)?",
+    "Does this policy cover maternity expenses?",
+    "What are the room rent and ICU limits?",
+    "Is AYUSH treatment covered?",
+    "Are cosmetic surgery expenses excluded?",
+    "What is the no claim discount?",
+    "How soon must a claim be intimated?",
+    "Are organ donor expenses covered?",
+    "Is there a waiting period for cataract surgery?",
+    "Are preventive health check-ups reimbursed?",
+    "Is domiciliary hospitalisation covered?",
+]
+
+
+def make_chunks(count: int, seed: int = 0) -> List[str]:
+    """Chunks of 1-8 clauses, so lengths vary like real chunks do."""
+    rnd = random.Random(seed)
+    return [
+        " ".join(rnd.choice(CLAUSES).format(n=rnd.randint(1, 60)) for _ in range(rnd.randint(1, 8)))
+        for _ in range(count)
+    ]
+
+
+def top_k(queries: np.ndarray, documents: np.ndarray, k: int) -> np.ndarray:
+    queries = queries / np.linalg.norm(queries, axis=1, keepdims=True)
+    documents = documents / np.linalg.norm(documents, axis=1, keepdims=True)
+    return np.argsort(-(queries @ documents.T), axis=1)[:, :k]
+
+
+def encode_throughput(service: EmbeddingService, texts: List[str], repeats: int) -> float:
+    service.encode(texts[:64])  # warm-up
+    start = time.perf_counter()
+    for _ in range(repeats):
+        service.encode(texts)
+    return len(texts) * repeats / (time.perf_counter() - start)
+
+
+def main():
+    config = Config()
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--chunks", type=int, default=2000)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--threads", type=int, default=config.EMBEDDING_THREADS, help="0 keeps torch's default")
+    parser.add_argument("--top-k", type=int, default=config.TOP_K_RESULTS)
+    parser.add_argument("--min-overlap", type=float, default=config.EMBEDDING_MIN_TOPK_OVERLAP)
+    args = parser.parse_args()
+
+    chunks = make_chunks(args.chunks)
+    # Questions plus clause-like queries, so every topic is probed several times
+    queries = QUESTIONS + make_chunks(len(QUESTIONS) * 4, seed=1)
+
+    results = {}
+    for backend in ("fp32", "int8"):
+        service = EmbeddingService(replace(config, EMBEDDING_BACKEND=backend, EMBEDDING_THREADS=args.threads))
+        results[backend] = {
+            "texts_per_second": round(encode_throughput(service, chunks, args.repeats), 1),
+            "top_k": top_k(service.encode(queries), service.encode(chunks), args.top_k),
+        }
+
+    overlap = np.array([
+        len(set(a) & set(b)) / args.top_k
+        for a, b in zip(results["fp32"]["top_k"], results["int8"]["top_k"])
+    ])
+    report = {
+        "model": config.EMBEDDING_MODEL_NAME,
+        "chunks": len(chunks),
+        "queries": len(queries),
+        "threads": args.threads,
+        "fp32_texts_per_second": results["fp32"]["texts_per_second"],
+        "int8_texts_per_second": results["int8"]["texts_per_second"],
+        "speedup": round(results["int8"]["texts_per_second"] / results["fp32"]["texts_per_second"], 2),
+        "top_k": args.top_k,
+        "mean_top_k_overlap": round(float(overlap.mean()), 4),
+        "min_top_k_overlap": round(float(overlap.min()), 4),
+        "min_overlap_required": args.min_overlap,
+    }
+    print(json.dumps(report, indent=2))
+
+    if report["mean_top_k_overlap"] < args.min_overlap:
+        raise SystemExit(
+            f"int8 retrieval overlap {report['mean_top_k_overlap']} is below the required {args.min_overlap}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""Compare table extraction with and without the table-detection pre-pass.
+
+Usage: python benchmarks/bench_table_prepass.py [policy.pdf ...] [--pages 200] [--text-tables]
+
+Without arguments, a plain and a framed synthetic policy are compared;
+framed pages are the costly case, where exhaustive extraction turns the
+page frame into a one-cell table that is then thrown away.
+
+Extracts every page of each PDF exhaustively (``extract_tables`` on every
+page) and with the pre-pass, checks that page texts and the meaningful
+tables (the ones ingestion keeps) are identical, and prints the timings
+(whole extraction and the table-finding part alone), pages skipped and
+speedups as JSON. Exits non-zero on any difference.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+from typing import List, Dict, Any
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import pdfplumber
+
+from pdf_extraction import TABLE_KEYWORDS, iter_pages, table_settings
+from synthetic_pdf import write_policy_pdf
+
+
+def kept_tables(tables: List[List]) -> List[List]:
+    """The tables ``DocumentProcessor._is_meaningful_table`` keeps."""
+    return [
+        table for table in tables
+        if len(table) >= 2 and any(
+            keyword in " ".join(" ".join(str(cell) for cell in row if cell) for row in table).lower()
+            for keyword in TABLE_KEYWORDS
+        )
+    ]
+
+
+def table_seconds(pdf_path: str, prepass: bool, text_tables: bool) -> float:
+    """Time spent finding tables (including the pre-pass), leaving out text extraction."""
+    elapsed = 0.0
+    with pdfplumber.open(pdf_path) as pdf:
+        for page in pdf.pages:
+            page_text = page.extract_text() or ""
+            start = time.perf_counter()
+            if prepass:
+                settings = table_settings(page, page_text, text_tables)
+                if settings is not None:
+                    page.extract_tables(settings)
+            else:
+                page.extract_tables()
+            elapsed += time.perf_counter() - start
+            page.flush_cache()
+    return elapsed
+
+
+def compare(pdf_path: str, text_tables: bool) -> Dict[str, Any]:
+    start = time.perf_counter()
+    exhaustive = list(iter_pages(pdf_path, table_prepass=False))
+    exhaustive_seconds = time.perf_counter() - start
+
+    counts: Dict[str, int] = {}
+    start = time.perf_counter()
+    prepass = list(iter_pages(pdf_path, text_tables=text_tables, counts=counts))
+    prepass_seconds = time.perf_counter() - start
+
+    exhaustive_tables = table_seconds(pdf_path, False, text_tables)
+    prepass_tables = table_seconds(pdf_path, True, text_tables)
+
+    text_mismatch = [e[0] for e, p in zip(exhaustive, prepass) if e[1] != p[1]]
+    missing = [e[0] for e, p in zip(exhaustive, prepass) if kept_tables(e[2]) != kept_tables(p[2])]
+    return {
+        "pdf": pdf_path,
+        "pages": len(exhaustive),
+        "table_pages_extracted": counts.get("extracted", 0),
+        "table_pages_skipped": counts.get("skipped", 0),
+        "exhaustive_seconds": round(exhaustive_seconds, 3),
+        "prepass_seconds": round(prepass_seconds, 3),
+        "speedup": round(exhaustive_seconds / prepass_seconds, 2) if prepass_seconds else None,
+        "exhaustive_table_seconds": round(exhaustive_tables, 3),
+        "prepass_table_seconds": round(prepass_tables, 3),
+        "table_speedup": round(exhaustive_tables / prepass_tables, 2) if prepass_tables else None,
+        "tables_exhaustive": sum(len(kept_tables(page[2])) for page in exhaustive),
+        "tables_prepass": sum(len(kept_tables(page[2])) for page in prepass),
+        "text_mismatch_pages": text_mismatch[:10],
+        "table_mismatch_pages": missing[:10],
+        "identical": not text_mismatch and not missing,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("pdf_paths", nargs="*", help="defaults to a plain and a framed synthetic policy PDF")
+    parser.add_argument("--pages", type=int, default=200, help="pages of the synthetic PDFs")
+    parser.add_argument("--text-tables", action="store_true",
+                        help="also search keyword pages without rulings for borderless tables")
+    args = parser.parse_args()
+
+    if not args.pdf_paths:
+        directory = tempfile.mkdtemp(prefix="hackrx_bench_")
+        args.pdf_paths = [
+            write_policy_pdf(os.path.join(directory, f"policy_{args.pages}.pdf"), args.pages),
+            write_policy_pdf(os.path.join(directory, f"policy_{args.pages}_framed.pdf"), args.pages, bordered=True),
+        ]
+
+    reports = [compare(pdf_path, args.text_tables) for pdf_path in args.pdf_paths]
+    print(json.dumps(reports, indent=2))
+
+    different = [report["pdf"] for report in reports if not report["identical"]]
+    if different and not args.text_tables:
+        raise SystemExit(f"Pre-pass extraction differs from exhaustive extraction for {different}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""Throughput and reliability of the parallel upsert writer against a mock index.
+
+Usage: python benchmarks/bench_upsert_writer.py [--vectors 5000] [--latency 0.03] [--failure-rate 0.1]
+
+Writes synthetic chunk vectors (metadata texts of 50-1000 characters) to
+``MockIndex`` the old way, sequential batches of 50 without retries, and
+with ``UpsertWriter`` at several concurrencies. Reports vectors per second,
+requests, retries and failures as JSON, and checks that every run of the
+writer leaves exactly the written vectors in the index. Exits non-zero if
+one does not.
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+from dataclasses import replace
+from typing import List, Dict, Any
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from config import Config
+from mock_index import MockIndex
+from synthetic_pdf import CLAUSES
+from upsert_writer import UpsertWriter
+
+
+def make_vectors(count: int, dimension: int, seed: int = 0) -> List[Any]:
+    rnd = random.Random(seed)
+    vectors = []
+    for n in range(count):
+        text = ""
+        target = rnd.randint(50, 1000)
+        while len(text) < target:
+            text += rnd.choice(CLAUSES).format(n=rnd.randint(1, 60)) + " "
+        metadata = {"document_id": f"doc{n // 500}", "text": text[:1000], "page": n // 10 + 1,
+                    "page_end": n // 10 + 1, "type": "text", "chunk_id": f"text_{n}"}
+        vectors.append((f"doc{n // 500}_{n:08x}", [rnd.uniform(-1, 1) for _ in range(dimension)], metadata))
+    return vectors
+
+
+def sequential(index: MockIndex, vectors: List[Any], batch_size: int = 50) -> Dict[str, Any]:
+    """The previous behaviour: one batch after another, the first error fails the write."""
+    start = time.perf_counter()
+    error = None
+    try:
+        for first in range(0, len(vectors), batch_size):
+            index.upsert(vectors=vectors[first:first + batch_size])
+    except Exception as e:
+        error = str(e)
+    seconds = time.perf_counter() - start
+    return {"seconds": round(seconds, 3),
+            "vectors_per_second": round(len(vectors) / seconds, 1) if error is None else None,
+            "vectors_written": len(index.vectors), "requests": index.requests, "failed": error}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--vectors", type=int, default=5000)
+    parser.add_argument("--dimension", type=int, default=Config().EMBEDDING_DIMENSION)
+    parser.add_argument("--latency", type=float, default=0.03, help="seconds per request before payload time")
+    parser.add_argument("--bandwidth", type=float, default=20e6, help="payload bytes per second per request")
+    parser.add_argument("--failure-rate", type=float, default=0.1)
+    parser.add_argument("--max-request-bytes", type=int, default=2_000_000, help="larger requests get a 413")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--write-size", type=int, default=50, help="vectors per write() call, as ingestion sends")
+    args = parser.parse_args()
+
+    vectors = make_vectors(args.vectors, args.dimension)
+    expected = {vector_id: (values, metadata) for vector_id, values, metadata in vectors}
+    config = replace(Config(), UPSERT_BACKOFF_SECONDS=0.05)
+
+    def mock_index(failure_rate: float, seed: int = 0) -> MockIndex:
+        return MockIndex(latency=args.latency, bytes_per_second=args.bandwidth, failure_rate=failure_rate,
+                         max_request_bytes=args.max_request_bytes, seed=seed)
+
+    report: Dict[str, Any] = {
+        "vectors": args.vectors,
+        "dimension": args.dimension,
+        "failure_rate": args.failure_rate,
+        "sequential_no_failures": sequential(mock_index(0.0), vectors),
+        "sequential": sequential(mock_index(args.failure_rate), vectors),
+        "writer": [],
+    }
+
+    mismatched = []
+    for concurrency in args.concurrency:
+        index = mock_index(args.failure_rate, seed=concurrency)
+        writer = UpsertWriter(index, replace(config, UPSERT_CONCURRENCY=concurrency))
+        for first in range(0, len(vectors), args.write_size):
+            writer.write(vectors[first:first + args.write_size])
+        stats = writer.flush()
+        identical = index.vectors == expected
+        if not identical:
+            mismatched.append(concurrency)
+        report["writer"].append({
+            "concurrency": concurrency,
+            **stats,
+            "requests": index.requests,
+            "failures_injected": index.failures,
+            "rejected_too_large": index.rejected,
+            "identical": identical,
+        })
+
+    print(json.dumps(report, indent=2))
+    if mismatched:
+        raise SystemExit(f"Index contents differ from the written vectors at concurrency {mismatched}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""In-process stand-in for a Pinecone index with injectable latency and failures.
+
+Used by benchmarks/bench_upsert_writer.py. Requests cost a fixed latency
+plus payload bytes over a bandwidth; a share of them fail with a 503 before
+or after being partly applied, and requests over ``max_request_bytes`` are
+rejected with a 413, like Pinecone's 2 MB limit.
+"""
+import json
+import time
+import random
+import threading
+from typing import List, Dict, Any, Optional
+
+
+class MockIndexError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(f"({status}) {message}")
+        self.status = status
+
+
+class MockIndex:
+    def __init__(self, latency: float = 0.03, bytes_per_second: float = 20e6, failure_rate: float = 0.0,
+                 max_request_bytes: int = 2_000_000, max_concurrency: Optional[int] = None, seed: int = 0):
+        self.latency = latency
+        self.bytes_per_second = bytes_per_second
+        self.failure_rate = failure_rate
+        self.max_request_bytes = max_request_bytes
+        self.vectors: Dict[str, Any] = {}
+        self.requests = 0
+        self.failures = 0
+        self.rejected = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._slots = threading.Semaphore(max_concurrency) if max_concurrency else None
+
+    def upsert(self, vectors: List[Any]):
+        size = len(json.dumps([
+            {"id": vector_id, "values": values, "metadata": metadata} for vector_id, values, metadata in vectors
+        ]))
+        with self._lock:
+            self.requests += 1
+            roll = self._rng.random()
+            jitter = self._rng.uniform(0.5, 1.5)
+        if size > self.max_request_bytes:
+            with self._lock:
+                self.rejected += 1
+            raise MockIndexError(413, f"Request size {size} exceeds the maximum supported size")
+
+        if self._slots:
+            self._slots.acquire()
+        try:
+            time.sleep(self.latency * jitter + size / self.bytes_per_second)
+        finally:
+            if self._slots:
+                self._slots.release()
+
+        if roll < self.failure_rate / 2:
+            self._fail()
+        with self._lock:
+            # The second half of the failures lands part of the batch first
+            applied = vectors if roll >= self.failure_rate else vectors[:len(vectors) // 2]
+            for vector_id, values, metadata in applied:
+                self.vectors[vector_id] = (values, metadata)
+        if roll < self.failure_rate:
+            self._fail()
+        return {"upserted_count": len(vectors)}
+
+    def _fail(self):
+        with self._lock:
+            self.failures += 1
+        raise MockIndexError(503, "Service unavailable")
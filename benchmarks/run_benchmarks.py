@@ -0,0 +1,314 @@
+"""End-to-end ingestion and query benchmarks on synthetic policy PDFs.
+
+Runs offline: PDFs are generated with synthetic_pdf.py and served from a
+local HTTP server, and Pinecone is replaced by the in-memory vector store.
+Each stage is timed on its own, cold start of the service is measured in a
+fresh process, then /hackrx/run is load-tested through a real uvicorn server. Results are written as JSON so runs can be compared.
+
+Usage: python benchmarks/run_benchmarks.py --pages 10 50 200 --output results.json
+"""
+import os
+import sys
+import json
+import time
+import socket
+import shutil
+import logging
+import platform
+import tempfile
+import argparse
+import functools
+import statistics
+import threading
+import subprocess
+import http.server
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Callable, Tuple
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# Must be set before config is imported anywhere
+os.environ["VECTOR_STORE_BACKEND"] = "memory"
+
+import requests
+
+from synthetic_pdf import write_policy_pdf
+
+QUESTIONS = [
+    "What is the grace period for premium payment?",
+    "What is the waiting period for pre-existing diseases (PED)?",
+    "Does this policy cover maternity expenses?",
+    "What are the room rent and ICU limits?",
+    "Is AYUSH treatment covered?",
+    "Are cosmetic surgery expenses excluded?",
+    "What is the no claim discount?",
+    "How soon must a claim be intimated?",
+]
+
+
+def summarize(samples: List[float]) -> Dict[str, Any]:
+    """Latency summary in milliseconds."""
+    ordered = sorted(samples)
+    return {
+        "n": len(ordered),
+        "min_ms": round(ordered[0] * 1000, 3),
+        "median_ms": round(statistics.median(ordered) * 1000, 3),
+        "mean_ms": round(statistics.fmean(ordered) * 1000, 3),
+        "p95_ms": round(ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))] * 1000, 3),
+        "max_ms": round(ordered[-1] * 1000, 3),
+    }
+
+
+def timed(func: Callable, *args, repeats: int = 1, setup: Callable = None) -> Tuple[Any, Dict[str, Any]]:
+    samples = []
+    result = None
+    for _ in range(repeats):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        result = func(*args)
+        samples.append(time.perf_counter() - start)
+    return result, summarize(samples)
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def serve_directory(directory: str) -> http.server.ThreadingHTTPServer:
+    class QuietHandler(http.server.SimpleHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), functools.partial(QuietHandler, directory=directory))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def bench_document(doc_processor, query_engine, url: str, pages: int, repeats: int) -> Dict[str, Any]:
+    """Time each ingestion and query stage for one document."""
+    stages = {}
+    document_id = f"bench_{pages}"
+
+    downloads = []
+    _, stages["download_document"] = timed(
+        lambda: downloads.append(doc_processor._download_document(url)), repeats=repeats
+    )
+    for download in downloads[1:]:
+        os.remove(download["path"])
+    pdf_path = downloads[0]["path"]
+
+    try:
+        chunks, stages["extract_content"] = timed(doc_processor._extract_content, pdf_path, repeats=repeats)
+
+        full_text = "".join(f"\n[PAGE {n}]\n{text}" for n, text, _ in doc_processor._iter_pages(pdf_path))
+        _, stages["create_chunks"] = timed(doc_processor._create_chunks, full_text, repeats=repeats)
+
+        _, stages["store_embeddings"] = timed(doc_processor._store_embeddings, chunks, document_id)
+        stages["store_embeddings"]["chunks_per_second"] = round(
+            len(chunks) / (stages["store_embeddings"]["mean_ms"] / 1000), 1
+        )
+    finally:
+        os.remove(pdf_path)
+
+    def clear_caches():
+        query_engine.result_cache.clear()
+        query_engine.embedding_cache.clear()
+
+    cold, warm, answer = [], [], []
+    for question in QUESTIONS:
+        _, summary = timed(query_engine.query, question, document_id, repeats=repeats, setup=clear_caches)
+        cold.append(summary["mean_ms"] / 1000)
+        _, summary = timed(query_engine.query, question, document_id, repeats=repeats)
+        warm.append(summary["mean_ms"] / 1000)
+
+        relevant_chunks = query_engine._retrieve_chunks(question, document_id)
+        texts = [chunk["metadata"]["text"] for chunk in relevant_chunks]
+        _, summary = timed(query_engine.answer_generator.generate_answer, question, texts, repeats=repeats)
+        answer.append(summary["mean_ms"] / 1000)
+
+    stages["query_uncached"] = summarize(cold)
+    stages["query_cached"] = summarize(warm)
+    stages["generate_answer"] = summarize(answer)
+
+    return {"pages": pages, "chunks": len(chunks), "stages": stages}
+
+
+def wait_until(url: str, timeout: float = 600) -> float:
+    """Poll ``url`` until it answers 200; return the seconds waited."""
+    start = time.perf_counter()
+    while time.perf_counter() - start < timeout:
+        try:
+            if requests.get(url, timeout=1).status_code == 200:
+                return time.perf_counter() - start
+        except requests.ConnectionError:
+            pass
+        time.sleep(0.02)
+    raise TimeoutError(f"{url} not ready after {timeout}s")
+
+
+def bench_startup() -> Dict[str, Any]:
+    """Cold start of the service in a fresh process: time to bind and time to ready."""
+    port = free_port()
+    env = dict(os.environ, PYTHONPATH=REPO_ROOT + os.pathsep + os.environ.get("PYTHONPATH", ""))
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--log-level", "warning"],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        wait_until(f"http://127.0.0.1:{port}/healthz")
+        live = time.perf_counter() - start
+        wait_until(f"http://127.0.0.1:{port}/readyz")
+        ready = time.perf_counter() - start
+        phases = requests.get(f"http://127.0.0.1:{port}/readyz", timeout=5).json()["startup_seconds"]
+    finally:
+        process.terminate()
+        process.wait()
+    return {"live_ms": round(live * 1000, 3), "ready_ms": round(ready * 1000, 3), "phases_seconds": phases}
+
+
+def bench_load(app, url: str, concurrency: int, total_requests: int) -> Dict[str, Any]:
+    """Throughput and latency of /hackrx/run through a real uvicorn server."""
+    import uvicorn
+
+    port = free_port()
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    # Models load in the background after the server binds
+    wait_until(f"http://127.0.0.1:{port}/readyz")
+
+    endpoint = f"http://127.0.0.1:{port}/hackrx/run"
+
+    def post(questions: List[str]) -> float:
+        start = time.perf_counter()
+        response = requests.post(endpoint, json={"documents": url, "questions": questions}, timeout=600)
+        response.raise_for_status()
+        return time.perf_counter() - start
+
+    results = {}
+    try:
+        results["cold_request_ms"] = round(post(QUESTIONS) * 1000, 3)
+
+        scenarios = {
+            # Identical questions: served from the answer cache after the first request
+            "repeated_questions": lambda i: QUESTIONS,
+            # Distinct wording per request: every question is retrieved and answered
+            "distinct_questions": lambda i: [f"{q} (request {i})" for q in QUESTIONS],
+        }
+        for name, make_questions in scenarios.items():
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                latencies = list(pool.map(lambda i: post(make_questions(i)), range(total_requests)))
+            elapsed = time.perf_counter() - start
+            results[name] = {
+                "requests": total_requests,
+                "concurrency": concurrency,
+                "questions_per_request": len(QUESTIONS),
+                "requests_per_second": round(total_requests / elapsed, 2),
+                "latency": summarize(latencies),
+            }
+    finally:
+        server.should_exit = True
+        thread.join()
+
+    return results
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=REPO_ROOT, text=True).strip()
+    except Exception:
+        return "unknown"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline end-to-end benchmarks")
+    parser.add_argument("--pages", type=int, nargs="+", default=[10, 50, 200])
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--load-requests", type=int, default=32)
+    parser.add_argument("--load-pages", type=int, default=50)
+    parser.add_argument("--output", help="write JSON here instead of stdout")
+    args = parser.parse_args()
+    output_path = os.path.abspath(args.output) if args.output else None
+
+    # Keep registry/index files of the run out of the working tree
+    workdir = tempfile.mkdtemp(prefix="hackrx_bench_")
+    pdf_dir = os.path.join(workdir, "pdfs")
+    os.makedirs(pdf_dir)
+    os.chdir(workdir)
+
+    from config import Config
+    from document_processor import DocumentProcessor
+    from query_engine import ImprovedQueryEngine
+    from vector_store import InMemoryVectorStore
+
+    logging.getLogger().setLevel(logging.WARNING)
+    http_server = serve_directory(pdf_dir)
+    base_url = f"http://127.0.0.1:{http_server.server_port}"
+
+    try:
+        config = Config()
+        store = InMemoryVectorStore(config)
+        doc_processor = DocumentProcessor(config, store)
+        query_engine = ImprovedQueryEngine(config, store)
+
+        documents = []
+        for pages in args.pages:
+            filename = f"policy_{pages}.pdf"
+            write_policy_pdf(os.path.join(pdf_dir, filename), pages, seed=pages)
+            result = bench_document(doc_processor, query_engine, f"{base_url}/{filename}", pages, args.repeats)
+            result["bytes"] = os.path.getsize(os.path.join(pdf_dir, filename))
+            documents.append(result)
+            print(f"benchmarked {pages} pages", file=sys.stderr)
+
+        startup = bench_startup()
+        print("benchmarked startup", file=sys.stderr)
+
+        load_file = f"load_{args.load_pages}.pdf"
+        write_policy_pdf(os.path.join(pdf_dir, load_file), args.load_pages, seed=1)
+
+        import main as service
+        logging.getLogger().setLevel(logging.WARNING)
+        load = bench_load(service.app, f"{base_url}/{load_file}", args.concurrency, args.load_requests)
+        load["pages"] = args.load_pages
+
+        report = {
+            "meta": {
+                "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+                "git_commit": git_commit(),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "cpu_count": os.cpu_count(),
+                "embedding_model": config.EMBEDDING_MODEL_NAME,
+                "retrieval_mode": config.RETRIEVAL_MODE,
+                "repeats": args.repeats,
+            },
+            "documents": documents,
+            "startup": startup,
+            "load": load,
+        }
+    finally:
+        http_server.shutdown()
+        os.chdir(REPO_ROOT)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    text = json.dumps(report, indent=2)
+    if output_path:
+        with open(output_path, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
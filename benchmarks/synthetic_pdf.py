@@ -0,0 +1,126 @@
+"""Deterministic synthetic insurance-policy PDFs for benchmarks.
+
+Writes plain PDF 1.4 by hand (Helvetica text plus ruled tables drawn with
+line operators), so no PDF library is needed and pdfplumber finds both the
+text and the tables.
+
+Usage: python benchmarks/synthetic_pdf.py out.pdf --pages 200 [--seed 0]
+"""
+import random
+import argparse
+from typing import List
+
+CLAUSES = [
+    "A grace period of {n} days is provided for premium payment after the due date.",
+    "There is a waiting period of {n} months for pre-existing diseases (PED) from the first policy inception.",
+    "Maternity expenses are covered after {n} months of continuous coverage, limited to two deliveries.",
+    "Room rent is capped at {n}% of the sum insured per day and ICU charges at 2% of the sum insured.",
+    "AYUSH treatment is covered up to the sum insured when taken in an AYUSH hospital.",
+    "Cosmetic or plastic surgery is excluded unless necessitated by an accident or burns.",
+    "Claims must be intimated to the insurer within {n} hours of emergency hospitalisation.",
+    "Organ donor expenses are covered for the harvesting of the organ for an insured person.",
+    "A no claim discount of {n}% is offered on renewal for every claim-free policy year.",
+    "Health check-up expenses are reimbursed at the end of every block of {n} continuous policy years.",
+    "Cataract surgery has a waiting period of {n} years and is limited per eye.",
+    "The policy may be renewed for life unless fraud or misrepresentation is established.",
+    "Grievances may be raised with the grievance redressal officer within {n} days.",
+    "Domiciliary hospitalisation is covered when treatment exceeds {n} consecutive days.",
+]
+
+TABLE_HEADER = ["Plan", "Sum Insured", "Annual Premium", "Room Rent Limit"]
+PLANS = ["Silver", "Gold", "Platinum", "Diamond"]
+
+PAGE_WIDTH = 612
+PAGE_HEIGHT = 842
+LINES_PER_PAGE = 44
+LINES_PER_TABLE_PAGE = 30
+
+
+def _escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def _page_content(rnd: random.Random, with_table: bool, bordered: bool = False) -> bytes:
+    ops = ["BT /F1 10 Tf 12 TL 50 800 Td"]
+    for _ in range(LINES_PER_TABLE_PAGE if with_table else LINES_PER_PAGE):
+        clause = rnd.choice(CLAUSES).format(n=rnd.randint(1, 60))
+        ops.append(f"({_escape(clause)}) '")
+    ops.append("ET")
+
+    if bordered:
+        # Page frame with a rule above it, as many insurers' layouts have
+        ops.append(f"30 30 {PAGE_WIDTH - 60} {PAGE_HEIGHT - 80} re S")
+        ops.append(f"30 {PAGE_HEIGHT - 30} m {PAGE_WIDTH - 30} {PAGE_HEIGHT - 30} l S")
+
+    if with_table:
+        rows: List[List[str]] = [TABLE_HEADER] + [
+            [plan, f"{rnd.randint(1, 50)} lakh", str(rnd.randint(5, 90) * 100), f"{rnd.randint(1, 3)}%"]
+            for plan in PLANS
+        ]
+        top, row_height, left, col_width = 380, 20, 50, 125
+        for r, row in enumerate(rows):
+            for c, cell in enumerate(row):
+                ops.append(f"BT /F1 9 Tf {left + 5 + c * col_width} {top - (r + 1) * row_height + 6} Td "
+                           f"({_escape(cell)}) Tj ET")
+        for r in range(len(rows) + 1):
+            y = top - r * row_height
+            ops.append(f"{left} {y} m {left + col_width * len(TABLE_HEADER)} {y} l S")
+        for c in range(len(TABLE_HEADER) + 1):
+            x = left + c * col_width
+            ops.append(f"{x} {top} m {x} {top - len(rows) * row_height} l S")
+
+    return "\n".join(ops).encode("latin-1")
+
+
+def make_policy_pdf(pages: int, seed: int = 0, table_every: int = 3, bordered: bool = False) -> bytes:
+    """Return the bytes of a ``pages``-page policy PDF; every ``table_every``-th page has a table.
+
+    ``bordered`` draws a frame and a header rule on every page.
+    """
+    rnd = random.Random(seed)
+    objects: List[bytes] = [b""]  # object 1 is the page tree, filled in last
+
+    def add(body: bytes) -> int:
+        objects.append(body)
+        return len(objects)
+
+    font = add(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    kids = []
+    for page in range(pages):
+        content = _page_content(rnd, with_table=page % table_every == 0, bordered=bordered)
+        stream = add(b"<< /Length %d >>\nstream\n" % len(content) + content + b"\nendstream")
+        kids.append(add(
+            f"<< /Type /Page /Parent 1 0 R /MediaBox [0 0 {PAGE_WIDTH} {PAGE_HEIGHT}] "
+            f"/Contents {stream} 0 R /Resources << /Font << /F1 {font} 0 R >> >> >>".encode()
+        ))
+    objects[0] = f"<< /Type /Pages /Kids [{' '.join(f'{k} 0 R' for k in kids)}] /Count {len(kids)} >>".encode()
+    catalog = add(b"<< /Type /Catalog /Pages 1 0 R >>")
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n".encode() + body + b"\nendobj\n"
+
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    for offset in offsets:
+        out += f"{offset:010d} 00000 n \n".encode()
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root {catalog} 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    return bytes(out)
+
+
+def write_policy_pdf(path: str, pages: int, seed: int = 0, bordered: bool = False) -> str:
+    with open(path, "wb") as f:
+        f.write(make_policy_pdf(pages, seed, bordered=bordered))
+    return path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write a synthetic policy PDF")
+    parser.add_argument("path")
+    parser.add_argument("--pages", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--bordered", action="store_true", help="frame every page")
+    args = parser.parse_args()
+    write_policy_pdf(args.path, args.pages, args.seed, args.bordered)
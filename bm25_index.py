@@ -0,0 +1,172 @@
+import os
+import re
+import json
+import math
+import logging
+from collections import Counter
+from typing import List, Dict, Any, Optional
+import numpy as np
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+TOKEN_PATTERN = re.compile(r'\b\w+\b')
+
+STOPWORDS = frozenset("""
+a an the and or of to in on at by for from with as is are was were be been being
+it its this that these those there here what which who whom whose when where why how
+do does did can could should would will shall may might must any all some
+i me my we our you your he she they them their his her
+under about into over than then so if not no yes per
+""".split())
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased word tokens without stopwords."""
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOPWORDS]
+
+
+class BM25Index:
+    """Compact per-document BM25 inverted index over chunk texts.
+
+    Postings are stored as flat NumPy arrays (``offsets`` into ``postings``
+    and ``frequencies``), which keeps the on-disk ``.npz`` small and lets a
+    query score all chunks with a few vectorized adds. Search results use the
+    vector store's match shape without a ``score``: ``coverage`` is the
+    fraction of the query's IDF mass that the chunk contains (0-1) and
+    ``bm25`` the raw ranking score.
+    """
+
+    K1 = 1.5
+    B = 0.75
+
+    def __init__(self, ids: List[str], metadata: List[Dict[str, Any]], terms: List[str],
+                 offsets: np.ndarray, postings: np.ndarray, frequencies: np.ndarray,
+                 doc_lengths: np.ndarray):
+        self.ids = ids
+        self.metadata = metadata
+        self.term_index = {term: n for n, term in enumerate(terms)}
+        self.offsets = offsets
+        self.postings = postings
+        self.frequencies = frequencies
+        self.doc_lengths = doc_lengths
+        self.avg_length = float(doc_lengths.mean()) if len(doc_lengths) else 0.0
+
+    @classmethod
+    def build(cls, ids: List[str], metadata: List[Dict[str, Any]]) -> "BM25Index":
+        """Index the ``text`` field of each metadata dict."""
+        term_postings: Dict[str, List[tuple]] = {}
+        doc_lengths = []
+
+        for row, meta in enumerate(metadata):
+            tokens = tokenize(meta.get("text", ""))
+            doc_lengths.append(len(tokens))
+            for term, count in Counter(tokens).items():
+                term_postings.setdefault(term, []).append((row, count))
+
+        terms = sorted(term_postings)
+        offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        postings, frequencies = [], []
+        for n, term in enumerate(terms):
+            rows, counts = zip(*term_postings[term])
+            postings.extend(rows)
+            frequencies.extend(counts)
+            offsets[n + 1] = len(postings)
+
+        return cls(
+            list(ids), list(metadata), terms, offsets,
+            np.asarray(postings, dtype=np.int32),
+            np.asarray(frequencies, dtype=np.int32),
+            np.asarray(doc_lengths, dtype=np.int32)
+        )
+
+    def search(self, query: str, top_k: int) -> List[Dict[str, Any]]:
+        """Return the ``top_k`` chunks by BM25 score."""
+        query_terms = set(tokenize(query))
+        n_docs = len(self.ids)
+        if not query_terms or not n_docs:
+            return []
+
+        scores = np.zeros(n_docs, dtype=np.float32)
+        matched_idf = np.zeros(n_docs, dtype=np.float32)
+        total_idf = 0.0
+        norms = self.K1 * (1 - self.B + self.B * self.doc_lengths / max(self.avg_length, 1e-9))
+
+        for term in query_terms:
+            term_id = self.term_index.get(term)
+            if term_id is None:
+                # Unknown terms still count towards the query's IDF mass
+                total_idf += math.log(1 + (n_docs + 0.5) / 0.5)
+                continue
+
+            start, end = self.offsets[term_id], self.offsets[term_id + 1]
+            rows = self.postings[start:end]
+            tf = self.frequencies[start:end]
+            idf = math.log(1 + (n_docs - len(rows) + 0.5) / (len(rows) + 0.5))
+
+            scores[rows] += idf * tf * (self.K1 + 1) / (tf + norms[rows])
+            matched_idf[rows] += idf
+            total_idf += idf
+
+        candidates = np.flatnonzero(scores > 0)
+        if not len(candidates):
+            return []
+        order = candidates[np.argsort(-scores[candidates], kind="stable")][:top_k]
+
+        return [
+            {
+                "id": self.ids[row],
+                "coverage": float(matched_idf[row] / total_idf) if total_idf else 0.0,
+                "bm25": float(scores[row]),
+                "metadata": self.metadata[row]
+            }
+            for row in order
+        ]
+
+    def save(self, path: str):
+        tmp_path = path + ".tmp.npz"
+        np.savez(
+            tmp_path,
+            terms=np.array(sorted(self.term_index, key=self.term_index.get)),
+            offsets=self.offsets,
+            postings=self.postings,
+            frequencies=self.frequencies,
+            doc_lengths=self.doc_lengths,
+            chunks=np.array(json.dumps([{"id": i, "metadata": m} for i, m in zip(self.ids, self.metadata)]))
+        )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "BM25Index":
+        with np.load(path) as data:
+            chunks = json.loads(str(data["chunks"]))
+            return cls(
+                [chunk["id"] for chunk in chunks],
+                [chunk["metadata"] for chunk in chunks],
+                data["terms"].tolist(),
+                data["offsets"],
+                data["postings"],
+                data["frequencies"],
+                data["doc_lengths"]
+            )
+
+
+class LexicalIndexStore:
+    """Loads and saves one BM25 index per document under LEXICAL_INDEX_DIR."""
+
+    def __init__(self, config: Config):
+        self.root = config.LEXICAL_INDEX_DIR
+        os.makedirs(self.root, exist_ok=True)
+
+    def save(self, document_id: str, index: BM25Index):
+        index.save(self._path(document_id))
+        logger.info(f"Saved BM25 index for {document_id}: {len(index.ids)} chunks, {len(index.term_index)} terms")
+
+    def load(self, document_id: str) -> Optional[BM25Index]:
+        path = self._path(document_id)
+        if not os.path.exists(path):
+            return None
+        return BM25Index.load(path)
+
+    def _path(self, document_id: str) -> str:
+        return os.path.join(self.root, f"{document_id}.npz")
@@ -7,6 +7,12 @@ class Config:
     PINECONE_INDEX_NAME: str = "hackrxxx"
     EMBEDDING_MODEL_NAME: str = "all-MiniLM-L6-v2"
     EMBEDDING_DIMENSION: int = 384
+    EMBEDDING_BATCH_SIZE: int = 64
+    # "fp32" or "int8" (dynamic int8 quantization of the transformer's linear layers, CPU only)
+    EMBEDDING_BACKEND: str = os.getenv("EMBEDDING_BACKEND", "fp32")
+    EMBEDDING_THREADS: int = int(os.getenv("EMBEDDING_THREADS", "0"))  # torch intra-op threads; 0 keeps torch's default
+    EMBEDDING_MAX_BATCH_TOKENS: int = 8192  # Padded tokens per encode batch; texts are batched by length
+    EMBEDDING_MIN_TOPK_OVERLAP: float = 0.9  # Retrieval agreement with fp32 required by the quantization check
     CHUNK_SIZE: int = 512
     CHUNK_OVERLAP: int = 50
     TOP_K_RESULTS: int = 5
@@ -17,4 +23,79 @@ class Config:
     
     # Document processing settings
     MAX_TABLE_ROWS: int = 50
-    MIN_CHUNK_LENGTH: int = 50
\ No newline at end of file
+    MIN_CHUNK_LENGTH: int = 50
+    DOWNLOAD_CHUNK_BYTES: int = 1 << 16
+    PIPELINE_QUEUE_SIZE: int = 8  # Max items buffered between ingestion stages
+    PDF_EXTRACTION_WORKERS: int = 1  # >1 extracts page ranges in a process pool
+    PDF_PAGES_PER_TASK: int = 16
+    PDF_TABLE_PREPASS: bool = True  # Only extract tables on pages with ruling lines and table keywords
+    PDF_TEXT_TABLES: bool = False  # Also look for borderless tables on keyword pages without rulings
+
+    # Content-addressed cache of chunk embeddings shared across documents
+    CHUNK_EMBEDDING_CACHE_DIR: str = "data/embedding_cache"
+    CHUNK_EMBEDDING_CACHE_MAX_ENTRIES: int = 100_000  # Least recently used entries beyond this are evicted
+    CHUNK_EMBEDDING_CACHE_DTYPE: str = "float16"  # or "float32"
+
+    # Vector store settings ("pinecone", "local", "ann" or "memory")
+    VECTOR_STORE_BACKEND: str = os.getenv("VECTOR_STORE_BACKEND", "pinecone")
+    LOCAL_VECTOR_STORE_DIR: str = "data/vectors"
+
+    # Pinecone upserts: byte-sized batches, several in flight per ingestion, retried with jittered backoff
+    UPSERT_MAX_BATCH_BYTES: int = 1_500_000  # Pinecone rejects requests over 2 MB
+    UPSERT_MAX_BATCH_VECTORS: int = 1000
+    UPSERT_CONCURRENCY: int = 4
+    UPSERT_MAX_RETRIES: int = 5
+    UPSERT_BACKOFF_SECONDS: float = 0.25
+    UPSERT_MAX_BACKOFF_SECONDS: float = 8.0
+
+    # "ann" backend: IVF index over float16 vectors shared by all documents
+    ANN_INDEX_DIR: str = "data/ann"
+    ANN_NLIST: int = 1024  # Inverted lists (k-means centroids)
+    ANN_NPROBE: int = 16  # Lists scanned per query; higher is slower and more accurate
+    ANN_MIN_TRAIN_ROWS: int = 40_000  # Below this the index is searched exactly
+    ANN_MAX_SEGMENTS: int = 16
+    ANN_EXACT_FILTER_ROWS: int = 50_000  # document_id filters up to this many rows are searched exactly
+    
+    # Local registry of ingested documents; URLs are re-checked (conditional GET) after this many seconds
+    REGISTRY_PATH: str = "data/registry.sqlite3"
+    REGISTRY_REVALIDATE_SECONDS: int = 3600
+    # New content at a URL updates its document in place: only changed chunks are re-embedded and upserted
+    INCREMENTAL_REINGEST: bool = True
+    
+    # Retrieval: "dense" (vector search with query expansion) or "hybrid" (BM25 + vector, fused)
+    RETRIEVAL_MODE: str = "dense"
+    LEXICAL_INDEX_DIR: str = "data/lexical"
+    # Hybrid mode answers from BM25 alone when the top chunk holds this share of the query's IDF mass
+    LEXICAL_FAST_PATH_COVERAGE: float = 0.9
+    RRF_K: int = 60
+    LEXICAL_INDEX_CACHE_SIZE: int = 32  # Also bounds cached per-document sentence tables
+    SENTENCE_STORE_DIR: str = "data/sentences"
+    # Embed every chunk sentence at ingestion (float16 matrix) so answers are picked by similarity to the question
+    SENTENCE_EMBEDDINGS: bool = True
+    # Sentence embeddings are cached apart from chunk embeddings so they never evict them
+    SENTENCE_EMBEDDING_CACHE_DIR: str = "data/sentence_embedding_cache"
+    SENTENCE_EMBEDDING_CACHE_MAX_ENTRIES: int = 500_000
+
+    # Query micro-batching: concurrent query encodes within this window share one model call
+    QUERY_BATCH_WINDOW_MS: float = 5.0
+    QUERY_MAX_BATCH_SIZE: int = 32
+
+    # Worker threads for blocking query work behind the async API (the query admission pool)
+    REQUEST_WORKERS: int = 8
+    # Background ingestion jobs (one per document at a time) and finished jobs kept for status lookups
+    INGESTION_WORKERS: int = 2
+    INGESTION_JOB_HISTORY: int = 1000
+    STREAM_PROGRESS_INTERVAL_SECONDS: float = 0.25  # How often streaming requests check ingestion progress
+
+    # Admission control: reject up front (429/503 + Retry-After) what cannot finish before its deadline
+    REQUEST_DEADLINE_SECONDS: float = 0.0  # Budget when the request sets none; 0 means no deadline
+    INGESTION_MAX_QUEUE: int = 16  # Queued or running ingestion jobs before new documents get 503
+    QUERY_MAX_WAITING: int = 256  # Questions waiting for a query worker before requests get 429 (413 if one has more)
+    INGESTION_ESTIMATE_SECONDS: float = 20.0  # Initial guesses, refined from observed durations
+    QUERY_ESTIMATE_SECONDS: float = 0.5
+
+    # Query caches (LRU + TTL). Bump ANSWER_CACHE_VERSION when answer logic changes.
+    QUERY_EMBEDDING_CACHE_SIZE: int = 4096
+    ANSWER_CACHE_SIZE: int = 4096
+    QUERY_CACHE_TTL_SECONDS: int = 3600
+    ANSWER_CACHE_VERSION: str = "3"
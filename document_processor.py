@@ -1,143 +1,315 @@
+import atexit
 import requests
-import pdfplumber
 import hashlib
+import json
+import os
 import re
-from typing import List, Dict, Any, Optional
-from sentence_transformers import SentenceTransformer
+import tempfile
 import time
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Dict, Any, Optional, Iterator, Tuple, Callable
 import logging
+import numpy as np
 from config import Config
-
-# Handle different Pinecone versions
-try:
-    from pinecone import Pinecone, ServerlessSpec
-    PINECONE_V3 = True
-except ImportError:
-    try:
-        import pinecone
-        PINECONE_V3 = False
-    except ImportError:
-        raise ImportError("Pinecone is not installed. Install with: pip install pinecone-client")
+from bm25_index import BM25Index, LexicalIndexStore
+from document_registry import DocumentRegistry
+from embedding_cache import ChunkEmbeddingCache
+from embedding_service import get_embedding_service
+from metrics import (timed, timed_iter, DOCUMENT_REQUESTS, CHUNKS_PER_DOCUMENT, VECTORS_UPSERTED,
+                     CACHE_REQUESTS, CHUNK_CACHE_HIT_RATIO, INGEST_CHUNKS)
+from pdf_extraction import TABLE_KEYWORDS, count_pages, iter_pages
+from pipeline import StreamingPipeline
+from sentence_store import SentenceStore, split_sentences
+from text_chunker import TextChunker
+from vector_store import VectorStore, create_vector_store
 
 logger = logging.getLogger(__name__)
 
+# Receives partial progress updates, e.g. {"stage": "ingesting", "pages_done": 3}
+ProgressCallback = Callable[[Dict[str, Any]], None]
+
 class DocumentProcessor:
-    def __init__(self, config: Config):
+    def __init__(self, config: Config, vector_store: Optional[VectorStore] = None):
         self.config = config
-        self.embedder = SentenceTransformer(config.EMBEDDING_MODEL_NAME)
+        self.embedder = get_embedding_service(config)
+        self.embedding_cache = ChunkEmbeddingCache(config)
+        self.sentence_cache = ChunkEmbeddingCache(
+            config, config.SENTENCE_EMBEDDING_CACHE_DIR, config.SENTENCE_EMBEDDING_CACHE_MAX_ENTRIES, "sentence"
+        ) if config.SENTENCE_EMBEDDINGS else None
+        self.vector_store = vector_store or create_vector_store(config)
+        self.registry = DocumentRegistry(config)
+        self.lexical_store = LexicalIndexStore(config)
+        self.sentence_store = SentenceStore(config)
+        
+        # Called with the document id after every (re-)ingestion, e.g. to drop cached answers
+        self.ingest_listeners: List[Callable[[str], None]] = []
         
-        # Initialize Pinecone based on version
-        if PINECONE_V3:
-            self.pc = Pinecone(api_key=config.PINECONE_API_KEY)
-        else:
-            self.pc = None
+        # Process pool for parallel page extraction, created on first use
+        self._extraction_pool: Optional[ProcessPoolExecutor] = None
+        self._extraction_pool_lock = threading.Lock()
         
-        self._ensure_index()
+        # document id -> (lock, users): one ingestion per document at a time
+        self._document_locks: Dict[str, Tuple[threading.Lock, int]] = {}
+        self._document_locks_lock = threading.Lock()
     
-    def _ensure_index(self):
-        """Ensure Pinecone index exists."""
+    def process_document(self, document_url: str, progress: Optional[ProgressCallback] = None) -> str:
+        """Download, process document and store embeddings."""
+        report = progress or (lambda update: None)
+        entry = self._registry_entry(document_url)
+        if self._is_fresh(entry):
+            logger.info(f"Document {entry['document_id']} already processed")
+            DOCUMENT_REQUESTS.inc(outcome="registry_hit")
+            return entry["document_id"]
+        
+        report({"stage": "downloading"})
+        download = self._download_document(document_url, entry)
+        if download is None:
+            logger.info(f"Document {entry['document_id']} unchanged (304)")
+            self.registry.touch_url(document_url)
+            DOCUMENT_REQUESTS.inc(outcome="not_modified")
+            return entry["document_id"]
+        
+        # Documents are found by content, so identical bytes share one ingestion
+        content_hash = download["content_hash"]
         try:
-            if PINECONE_V3:
-                if self.config.PINECONE_INDEX_NAME not in self.pc.list_indexes().names():
-                    self.pc.create_index(
-                        name=self.config.PINECONE_INDEX_NAME,
-                        dimension=self.config.EMBEDDING_DIMENSION,
-                        metric="cosine",
-                        spec=ServerlessSpec(cloud="aws", region="us-east-1")
-                    )
-                    while not self.pc.describe_index(self.config.PINECONE_INDEX_NAME).status["ready"]:
-                        time.sleep(1)
-                self.index = self.pc.Index(self.config.PINECONE_INDEX_NAME)
-            else:
-                pinecone.init(api_key=self.config.PINECONE_API_KEY, environment="us-east-1-aws")
-                if self.config.PINECONE_INDEX_NAME not in pinecone.list_indexes():
-                    pinecone.create_index(
-                        name=self.config.PINECONE_INDEX_NAME,
-                        dimension=self.config.EMBEDDING_DIMENSION,
-                        metric="cosine"
+            # Another URL with the same bytes may be ingesting right now: wait for it
+            with self._document_lock(content_hash):
+                document = self.registry.find_document_by_hash(content_hash)
+                if document and document["embedding_model"] == self.config.EMBEDDING_MODEL_NAME:
+                    document_id = document["document_id"]
+                    logger.info(f"Document {document_id} already processed (same content)")
+                    DOCUMENT_REQUESTS.inc(outcome="same_content")
+                else:
+                    # Stream pages through chunking, embedding and upserts
+                    document_id, previous = self._ingestion_target(content_hash, entry)
+                    ingest_report = self._ingest_streaming(download["path"], document_id, progress, previous)
+                    self.registry.record_document(
+                        document_id, content_hash, ingest_report["chunks"], self.config.EMBEDDING_MODEL_NAME
                     )
-                    while not pinecone.describe_index(self.config.PINECONE_INDEX_NAME).status["ready"]:
-                        time.sleep(1)
-                self.index = pinecone.Index(self.config.PINECONE_INDEX_NAME)
-        except Exception as e:
-            logger.error(f"Error setting up Pinecone index: {e}")
-            raise
+                    outcome = "ingested" if previous is None else "reingested"
+                    logger.info(f"Document {document_id} {outcome}: {ingest_report}")
+                    DOCUMENT_REQUESTS.inc(outcome=outcome)
+                    CHUNKS_PER_DOCUMENT.observe(ingest_report["chunks"])
+                    report({"report": ingest_report})
+                    for listener in self.ingest_listeners:
+                        listener(document_id)
+        finally:
+            os.remove(download["path"])
+        
+        self.registry.record_url(document_url, document_id, download["etag"], download["last_modified"])
+        return document_id
     
-    def process_document(self, document_url: str) -> str:
-        """Download, process document and store embeddings."""
-        document_id = hashlib.md5(document_url.encode()).hexdigest()[:12]
+    def cached_document_id(self, document_url: str) -> Optional[str]:
+        """Document id of a URL ingested with the current model (at most revalidated), else None."""
+        entry = self._registry_entry(document_url)
+        return entry["document_id"] if entry else None
+    
+    def fresh_document_id(self, document_url: str) -> Optional[str]:
+        """Document id of a URL that ``process_document`` would return without any network access, else None."""
+        entry = self._registry_entry(document_url)
+        if not self._is_fresh(entry):
+            return None
+        DOCUMENT_REQUESTS.inc(outcome="registry_hit")
+        return entry["document_id"]
+    
+    def _registry_entry(self, document_url: str) -> Optional[Dict[str, Any]]:
+        """Registry entry of a URL, unless it was ingested with another model (then it is fetched and re-embedded)."""
+        entry = self.registry.lookup_url(document_url)
+        if entry and entry["embedding_model"] != self.config.EMBEDDING_MODEL_NAME:
+            return None
+        return entry
+    
+    def _is_fresh(self, entry: Optional[Dict[str, Any]]) -> bool:
+        """Whether the entry was checked against its URL within REGISTRY_REVALIDATE_SECONDS."""
+        return bool(entry) and time.time() - entry["checked_at"] < self.config.REGISTRY_REVALIDATE_SECONDS
+    
+    def _ingestion_target(self, content_hash: str,
+                          entry: Optional[Dict[str, Any]]) -> Tuple[str, Optional[Dict[str, str]]]:
+        """Document id to ingest new content under, and the chunk fingerprints it replaces.
         
-        if self._is_document_processed(document_id):
-            logger.info(f"Document {document_id} already processed")
-            return document_id
+        With INCREMENTAL_REINGEST, new content at a URL that was the only user
+        of its document updates that document in place, so only changed chunks
+        are embedded and upserted. Otherwise the id comes from the content hash.
+        """
+        document_id = content_hash[:16]
+        if self.config.INCREMENTAL_REINGEST and entry and self.registry.count_urls(entry["document_id"]) == 1:
+            document_id = entry["document_id"]
+        elif (self.registry.get_document(document_id) or {}).get("content_hash", content_hash) != content_hash:
+            # The short id belongs to a document that has since been updated in place
+            document_id = content_hash[:32]
         
-        # Download and process
-        pdf_path = self._download_document(document_url)
-        chunks = self._extract_content(pdf_path)
-        self._store_embeddings(chunks, document_id)
+        existing = self.registry.get_document(document_id)
+        if existing is None:
+            return document_id, None
         
-        logger.info(f"Document {document_id} processed: {len(chunks)} chunks")
-        return document_id
+        previous = self.registry.get_chunks(document_id)
+        if not previous:
+            # Ingested before chunk fingerprints were recorded: every stored id is stale
+            index = self.lexical_store.load(document_id)
+            previous = dict.fromkeys(index.ids, "") if index else {}
+        if existing["embedding_model"] != self.config.EMBEDDING_MODEL_NAME:
+            previous = dict.fromkeys(previous, "")  # Every chunk needs a new embedding
+        return document_id, previous
+    
+    @contextmanager
+    def _document_lock(self, document_id: str):
+        """Serialize work on one document; the lock is dropped when unused."""
+        with self._document_locks_lock:
+            lock, users = self._document_locks.get(document_id, (threading.Lock(), 0))
+            self._document_locks[document_id] = (lock, users + 1)
+        try:
+            with lock:
+                yield
+        finally:
+            with self._document_locks_lock:
+                lock, users = self._document_locks[document_id]
+                if users == 1:
+                    del self._document_locks[document_id]
+                else:
+                    self._document_locks[document_id] = (lock, users - 1)
     
-    def _download_document(self, url: str) -> str:
-        """Download document from URL."""
+    def _download_document(self, url: str, entry: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+        """Stream document from URL into a unique temporary file.
+        
+        With a registry entry the request is conditional; None means the
+        server answered 304 Not Modified.
+        """
+        headers = {}
+        if entry:
+            if entry["etag"]:
+                headers["If-None-Match"] = entry["etag"]
+            if entry["last_modified"]:
+                headers["If-Modified-Since"] = entry["last_modified"]
+        
+        fd, filename = tempfile.mkstemp(prefix="hackrx_doc_", suffix=".pdf")
         try:
-            response = requests.get(url, timeout=30)
-            response.raise_for_status()
+            content_hash = hashlib.sha256()
+            with timed("download"), os.fdopen(fd, "wb") as f, requests.get(url, headers=headers, timeout=30, stream=True) as response:
+                if response.status_code == 304 and entry:
+                    not_modified = True
+                else:
+                    not_modified = False
+                    response.raise_for_status()
+                    for block in response.iter_content(chunk_size=self.config.DOWNLOAD_CHUNK_BYTES):
+                        content_hash.update(block)
+                        f.write(block)
             
-            filename = f"temp_doc_{int(time.time())}.pdf"
-            with open(filename, "wb") as f:
-                f.write(response.content)
+            if not_modified:
+                os.remove(filename)
+                return None
             
-            return filename
+            return {
+                "path": filename,
+                "content_hash": content_hash.hexdigest(),
+                "etag": response.headers.get("ETag"),
+                "last_modified": response.headers.get("Last-Modified")
+            }
         except Exception as e:
             logger.error(f"Error downloading document: {e}")
+            if os.path.exists(filename):
+                os.remove(filename)
             raise
     
-    def _is_document_processed(self, document_id: str) -> bool:
-        """Check if document is already processed."""
-        try:
-            dummy_vector = [0.0] * self.config.EMBEDDING_DIMENSION
-            results = self.index.query(
-                vector=dummy_vector,
-                filter={"document_id": document_id},
-                top_k=1,
-                include_metadata=True
+    def _ingest_streaming(self, pdf_path: str, document_id: str, progress: Optional[ProgressCallback] = None,
+                          previous: Optional[Dict[str, str]] = None) -> Dict[str, int]:
+        """Run page extraction -> chunking -> embedding -> upsert as a pipeline.
+        
+        ``previous`` maps the vector ids already stored for the document to
+        their fingerprints; unchanged chunks are skipped and ids that no
+        longer occur are deleted. Returns counts of the work done and skipped.
+        """
+        stored = []  # (vector id, metadata) of every chunk of the document
+        sentence_vectors = self._sentence_vectors()
+        stats = {"chunks": 0, "unchanged": 0, "upserted": 0, "embedded": 0, "embedding_cache_hits": 0}
+        table_pages: Dict[str, int] = {}
+        report = progress or (lambda update: None)
+        if progress:
+            report({"stage": "ingesting", "document_id": document_id, "pages_total": count_pages(pdf_path),
+                    "pages_done": 0, "vectors_stored": 0})
+        
+        def pages():
+            for pages_done, page in enumerate(self._iter_pages(pdf_path, table_pages), 1):
+                report({"pages_done": pages_done})
+                yield page
+        
+        def upsert(vectors):
+            stats["upserted"] += self._upsert_vectors(vectors, stored)
+            report({"vectors_stored": len(stored)})
+            logger.info(f"Stored {len(vectors)} vectors ({len(stored)} total)")
+        
+        with timed("ingest"):
+            StreamingPipeline(self.config.PIPELINE_QUEUE_SIZE, name=f"ingest-{document_id}").run(
+                pages(),
+                [self._iter_chunks,
+                 lambda chunks: self._iter_vectors(chunks, document_id, previous, stats, sentence_vectors)],
+                upsert
             )
-            return len(results.get("matches", [])) > 0
-        except:
-            return False
+            report({"stage": "indexing"})
+            stats["deleted"] = self._finish_document(document_id, stored, previous, sentence_vectors)
+        stats["table_pages_skipped"] = table_pages.get("skipped", 0)
+        
+        INGEST_CHUNKS.inc(stats["unchanged"], result="unchanged")
+        INGEST_CHUNKS.inc(stats["upserted"], result="upserted")
+        INGEST_CHUNKS.inc(stats["embedded"], result="embedded")
+        INGEST_CHUNKS.inc(stats["deleted"], result="deleted")
+        return stats
     
     def _extract_content(self, pdf_path: str) -> List[Dict[str, Any]]:
         """Extract content with smart chunking."""
-        chunks = []
+        return list(self._iter_chunks(self._iter_pages(pdf_path)))
+    
+    def _iter_pages(self, pdf_path: str,
+                    table_pages: Optional[Dict[str, int]] = None) -> Iterator[Tuple[int, str, List[List]]]:
+        """Yield (page number, text, tables) for each page in order."""
+        return timed_iter("extract_page", iter_pages(
+            pdf_path, self._get_extraction_pool(), self.config.PDF_PAGES_PER_TASK,
+            self.config.PDF_TABLE_PREPASS, self.config.PDF_TEXT_TABLES, table_pages,
+            max_in_flight=self.config.PDF_EXTRACTION_WORKERS + 1
+        ))
+    
+    def _get_extraction_pool(self) -> Optional[ProcessPoolExecutor]:
+        """Process pool for page extraction, or None for serial extraction."""
+        if self.config.PDF_EXTRACTION_WORKERS <= 1:
+            return None
         
-        with pdfplumber.open(pdf_path) as pdf:
-            full_text = ""
-            
-            # Extract text and tables
-            for page_num, page in enumerate(pdf.pages, 1):
-                page_text = page.extract_text() or ""
-                full_text += f"\n[PAGE {page_num}]\n" + page_text
-                
-                # Extract meaningful tables
-                tables = page.extract_tables()
-                if tables:
-                    for table_idx, table in enumerate(tables):
-                        if self._is_meaningful_table(table):
-                            table_text = self._format_table(table, page_text[:200])
-                            chunks.append({
-                                "text": table_text,
-                                "page": page_num,
-                                "type": "table",
-                                "chunk_id": f"table_{page_num}_{table_idx}"
-                            })
+        with self._extraction_pool_lock:
+            if self._extraction_pool is None:
+                self._extraction_pool = ProcessPoolExecutor(max_workers=self.config.PDF_EXTRACTION_WORKERS)
+                # Also reaped when the process exits without a lifespan shutdown (scripts, benchmarks)
+                atexit.register(self.close)
+            return self._extraction_pool
+    
+    def close(self):
+        """Shut down the page extraction processes; called on application shutdown."""
+        with self._extraction_pool_lock:
+            pool, self._extraction_pool = self._extraction_pool, None
+        if pool is not None:
+            pool.shutdown(wait=True, cancel_futures=True)
+    
+    def _iter_chunks(self, pages: Iterator[Tuple[int, str, List[List]]]) -> Iterator[Dict[str, Any]]:
+        """Turn a page stream into table and text chunks as pages arrive."""
+        chunker = TextChunker(self.config)
+        
+        for page_num, page_text, tables in pages:
+            # Extract meaningful tables
+            for table_idx, table in enumerate(tables):
+                if self._is_meaningful_table(table):
+                    table_text = self._format_table(table, page_text[:200])
+                    yield {
+                        "text": table_text,
+                        "page": page_num,
+                        "page_end": page_num,
+                        "type": "table",
+                        "chunk_id": f"table_{page_num}_{table_idx}"
+                    }
             
-            # Create text chunks
-            text_chunks = self._create_chunks(full_text)
-            chunks.extend(text_chunks)
+            with timed("chunk_page"):
+                chunks = chunker.add_page(page_num, page_text)
+            yield from chunks
         
-        return chunks
+        yield from chunker.finish()
     
     def _is_meaningful_table(self, table: List[List]) -> bool:
         """Check if table contains meaningful data."""
@@ -145,9 +317,7 @@ class DocumentProcessor:
             return False
         
         table_text = " ".join([" ".join([str(cell) for cell in row if cell]) for row in table]).lower()
-        keywords = ["premium", "coverage", "benefit", "limit", "amount", "period", "plan", "sum"]
-        
-        return any(keyword in table_text for keyword in keywords)
+        return any(keyword in table_text for keyword in TABLE_KEYWORDS)
     
     def _format_table(self, table: List[List], context: str = "") -> str:
         """Format table with context."""
@@ -163,92 +333,201 @@ class DocumentProcessor:
         return formatted
     
     def _create_chunks(self, text: str) -> List[Dict[str, Any]]:
-        """Create text chunks with overlap."""
-        # Remove page markers for chunking
-        clean_text = re.sub(r'\[PAGE \d+\]', '', text)
-        
-        # Split by sentences
-        sentences = re.split(r'(?<=[.!?])\s+', clean_text)
-        
+        """Create text chunks with overlap from text containing [PAGE n] markers."""
+        chunker = TextChunker(self.config)
         chunks = []
-        current_chunk = []
-        current_length = 0
-        chunk_id = 0
         
-        for sentence in sentences:
-            sentence_length = len(sentence)
-            
-            if current_length + sentence_length > self.config.CHUNK_SIZE and current_chunk:
-                chunk_text = ' '.join(current_chunk)
-                page_num = self._extract_page_number(chunk_text, text)
-                
-                chunks.append({
-                    "text": chunk_text,
-                    "page": page_num,
-                    "type": "text",
-                    "chunk_id": f"text_{chunk_id}"
-                })
-                
-                chunk_id += 1
-                # Overlap with last sentence
-                current_chunk = [current_chunk[-1], sentence] if current_chunk else [sentence]
-                current_length = sum(len(s) for s in current_chunk)
-            else:
-                current_chunk.append(sentence)
-                current_length += sentence_length
-        
-        # Add final chunk
-        if current_chunk:
-            chunk_text = ' '.join(current_chunk)
-            page_num = self._extract_page_number(chunk_text, text)
-            chunks.append({
-                "text": chunk_text,
-                "page": page_num,
-                "type": "text",
-                "chunk_id": f"text_{chunk_id}"
-            })
+        # re.split with a group alternates text and page numbers
+        parts = re.split(r'\n?\[PAGE (\d+)\]\n?', text)
+        if parts[0].strip():
+            chunks.extend(chunker.add_page(1, parts[0]))
+        for page_num, page_text in zip(parts[1::2], parts[2::2]):
+            chunks.extend(chunker.add_page(int(page_num), page_text))
         
+        chunks.extend(chunker.finish())
         return chunks
     
-    def _extract_page_number(self, chunk_text: str, full_text: str) -> int:
-        """Extract page number for a chunk."""
-        # Find chunk position in full text
-        chunk_pos = full_text.find(chunk_text[:100])
-        if chunk_pos == -1:
-            return 1
+    def _store_embeddings(self, chunks: List[Dict[str, Any]], document_id: str):
+        """Store embeddings in the vector store."""
+        stored = []
+        sentence_vectors = self._sentence_vectors()
+        vectors_iter = self._iter_vectors(iter(chunks), document_id, sentence_vectors=sentence_vectors)
+        for batch_num, vectors in enumerate(vectors_iter, 1):
+            self._upsert_vectors(vectors, stored)
+            logger.info(f"Stored batch {batch_num}: {len(vectors)} vectors")
+        
+        self._finish_document(document_id, stored, sentence_vectors=sentence_vectors)
+    
+    def _upsert_vectors(self, vectors: List[Tuple], stored: List[Tuple[str, Dict[str, Any]]]) -> int:
+        """Upsert the vectors that carry an embedding; record all of them in ``stored``."""
+        changed = [vector for vector in vectors if vector[1] is not None]
+        if changed:
+            with timed("upsert"):
+                self.vector_store.upsert(changed)
+            VECTORS_UPSERTED.inc(len(changed))
+        stored.extend((vector_id, metadata) for vector_id, _, metadata in vectors)
+        return len(changed)
+    
+    def _finish_document(self, document_id: str, stored: List[Tuple[str, Dict[str, Any]]],
+                         previous: Optional[Dict[str, str]] = None,
+                         sentence_vectors: Optional[Dict[str, np.ndarray]] = None) -> int:
+        """Delete stale vectors, flush the vector store and persist the document's indexes.
         
-        # Count page markers before this position
-        text_before = full_text[:chunk_pos]
-        page_matches = re.findall(r'\[PAGE (\d+)\]', text_before)
+        ``sentence_vectors`` holds the sentence embeddings computed by
+        ``_iter_vectors``. Returns the number of deleted vectors.
+        """
+        current = {vector_id for vector_id, _ in stored}
+        stale = sorted(vector_id for vector_id in previous or {} if vector_id not in current)
+        if stale:
+            with timed("delete_vectors"):
+                self.vector_store.delete(stale, document_id)
+            logger.info(f"Deleted {len(stale)} stale vectors of {document_id}")
         
-        return int(page_matches[-1]) if page_matches else 1
+        with timed("flush_vectors"):
+            self.vector_store.flush()
+        with timed("index_document"):
+            index = BM25Index.build([vector_id for vector_id, _ in stored], [metadata for _, metadata in stored])
+            self.lexical_store.save(document_id, index)
+            self.sentence_store.save(document_id, [(vector_id, metadata["text"]) for vector_id, metadata in stored],
+                                     sentence_vectors)
+            self.registry.record_chunks(
+                document_id, [(vector_id, chunk_fingerprint(metadata)) for vector_id, metadata in stored]
+            )
+        return len(stale)
     
-    def _store_embeddings(self, chunks: List[Dict[str, Any]], document_id: str):
-        """Store embeddings in Pinecone."""
+    def _iter_vectors(self, chunks: Iterator[Dict[str, Any]], document_id: str,
+                      previous: Optional[Dict[str, str]] = None,
+                      stats: Optional[Dict[str, int]] = None,
+                      sentence_vectors: Optional[Dict[str, np.ndarray]] = None) -> Iterator[List[Tuple]]:
+        """Embed chunks in batches and yield upsert-ready vector batches.
+        
+        Vector ids derive from chunk content, so an edited document keeps the
+        ids of its unchanged chunks. Chunks whose fingerprint matches
+        ``previous`` are yielded with a None embedding: they need no upsert.
+        If ``sentence_vectors`` is given, the sentences of every chunk are
+        embedded with its batch and stored there by vector id.
+        """
+        stats = stats if stats is not None else {}
+        for key in ("chunks", "unchanged", "embedded", "embedding_cache_hits"):
+            stats.setdefault(key, 0)
+        previous = previous or {}
         batch_size = 50
+        batch = []  # (vector id, chunk, metadata) to embed
+        unchanged = []
+        occurrences: Dict[str, int] = {}
         
-        for i in range(0, len(chunks), batch_size):
-            batch = chunks[i:i + batch_size]
-            vectors = []
+        for chunk in chunks:
+            if not chunk["text"].strip():
+                continue
             
-            for j, chunk in enumerate(batch):
-                text = chunk["text"]
-                if not text.strip():
-                    continue
-                
-                embedding = self.embedder.encode(text).tolist()
-                vector_id = f"{document_id}_{i + j}"
-                
-                metadata = {
-                    "document_id": document_id,
-                    "text": text[:1000],  # Truncate for metadata storage
-                    "page": chunk["page"],
-                    "type": chunk["type"],
-                    "chunk_id": chunk["chunk_id"]
-                }
-                
-                vectors.append((vector_id, embedding, metadata))
+            vector_id = self._vector_id(document_id, chunk, occurrences)
+            metadata = {
+                "document_id": document_id,
+                "text": chunk["text"][:1000],  # Truncate for metadata storage
+                "page": chunk["page"],
+                "page_end": chunk.get("page_end", chunk["page"]),
+                "type": chunk["type"],
+                "chunk_id": chunk["chunk_id"]
+            }
+            stats["chunks"] += 1
+            if previous.get(vector_id) == chunk_fingerprint(metadata):
+                unchanged.append((vector_id, None, metadata))
+                stats["unchanged"] += 1
+            else:
+                batch.append((vector_id, chunk, metadata))
             
-            if vectors:
-                self.index.upsert(vectors)
-                logger.info(f"Stored batch {i//batch_size + 1}: {len(vectors)} vectors")
\ No newline at end of file
+            if len(batch) + len(unchanged) >= batch_size:
+                yield self._embed_vectors(unchanged, batch, stats, sentence_vectors)
+                batch, unchanged = [], []
+        
+        if batch or unchanged:
+            yield self._embed_vectors(unchanged, batch, stats, sentence_vectors)
+        
+        looked_up = stats["embedded"] + stats["embedding_cache_hits"]
+        if looked_up:
+            CHUNK_CACHE_HIT_RATIO.observe(stats["embedding_cache_hits"] / looked_up)
+            logger.info(f"Chunk embedding cache for {document_id}: {stats['embedding_cache_hits']}/{looked_up} hits "
+                        f"({stats['embedding_cache_hits'] / looked_up:.0%})")
+    
+    @staticmethod
+    def _vector_id(document_id: str, chunk: Dict[str, Any], occurrences: Dict[str, int]) -> str:
+        """Content-derived vector id; repeated chunks of a document get a counter suffix."""
+        digest = hashlib.sha256(f"{chunk['type']}\0{chunk['text']}".encode("utf-8")).hexdigest()[:12]
+        count = occurrences.get(digest, 0)
+        occurrences[digest] = count + 1
+        return f"{document_id}_{digest}" if count == 0 else f"{document_id}_{digest}-{count}"
+    
+    def _embed_vectors(self, unchanged: List[Tuple], batch: List[Tuple[str, Dict[str, Any], Dict[str, Any]]],
+                       stats: Optional[Dict[str, int]],
+                       sentence_vectors: Optional[Dict[str, np.ndarray]]) -> List[Tuple]:
+        """Unchanged vectors followed by the embedded batch, with the sentences of all of them embedded."""
+        vectors = unchanged + self._embed_batch(batch, stats)
+        if sentence_vectors is not None:
+            self._embed_sentences(vectors, sentence_vectors)
+        return vectors
+    
+    def _embed_batch(self, batch: List[Tuple[str, Dict[str, Any], Dict[str, Any]]],
+                     stats: Optional[Dict[str, int]] = None) -> List[Tuple]:
+        """Encode (vector id, chunk, metadata) entries, reusing cached embeddings of identical text."""
+        if not batch:
+            return []
+        
+        embeddings = self._encode_cached([chunk["text"] for _, chunk, _ in batch], self.embedding_cache,
+                                         "chunk_embeddings", "embed_batch", stats)
+        return [
+            (vector_id, embedding.tolist(), metadata)
+            for (vector_id, _, metadata), embedding in zip(batch, embeddings)
+        ]
+    
+    def _sentence_vectors(self) -> Optional[Dict[str, np.ndarray]]:
+        """Collector for ``_iter_vectors``' sentence embeddings, or None when they are disabled."""
+        return {} if self.config.SENTENCE_EMBEDDINGS else None
+    
+    def _embed_sentences(self, vectors: List[Tuple], sentence_vectors: Dict[str, np.ndarray]):
+        """Embed the sentences of a vector batch for the sentence store, keyed by vector id.
+        
+        Sentences unchanged since the last ingestion are cached.
+        """
+        sentences = [
+            (vector_id, [sentence.text for sentence in split_sentences(metadata["text"])])
+            for vector_id, _, metadata in vectors
+        ]
+        texts = [text for _, texts in sentences for text in texts]
+        if not texts:
+            return
+        embeddings = np.asarray(
+            self._encode_cached(texts, self.sentence_cache, "sentence_embeddings", "embed_sentences")
+        )
+        start = 0
+        for vector_id, texts in sentences:
+            sentence_vectors[vector_id] = embeddings[start:start + len(texts)]
+            start += len(texts)
+    
+    def _encode_cached(self, texts: List[str], cache: ChunkEmbeddingCache, cache_label: str, stage: str,
+                       stats: Optional[Dict[str, int]] = None) -> List[np.ndarray]:
+        """Embeddings of ``texts`` in order, encoding (timed as ``stage``) only the ones not in ``cache``."""
+        keys = [cache.key(text) for text in texts]
+        cached = cache.get_many(keys)
+        hits = sum(1 for key in keys if key in cached)
+        
+        # Only encode the cache misses (each distinct text once)
+        missing = list(dict.fromkeys(key for key in keys if key not in cached))
+        if missing:
+            texts_by_key = dict(zip(keys, texts))
+            with timed(stage):
+                encoded = self.embedder.encode([texts_by_key[key] for key in missing])
+            cache.put_many(list(zip(missing, encoded)))
+            cached.update(zip(missing, encoded))
+        
+        CACHE_REQUESTS.inc(hits, cache=cache_label, result="hit")
+        CACHE_REQUESTS.inc(len(keys) - hits, cache=cache_label, result="miss")
+        if stats is not None:
+            stats["embedding_cache_hits"] += hits
+            stats["embedded"] += len(keys) - hits
+        
+        return [cached[key] for key in keys]
+
+
+def chunk_fingerprint(metadata: Dict[str, Any]) -> str:
+    """Hash of everything stored for a chunk; equal fingerprints need no upsert."""
+    return hashlib.sha256(json.dumps(metadata, sort_keys=True).encode("utf-8")).hexdigest()[:16]
@@ -0,0 +1,130 @@
+import os
+import time
+import sqlite3
+import threading
+import logging
+from typing import Dict, Any, List, Optional, Tuple
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    document_id     TEXT PRIMARY KEY,
+    content_hash    TEXT NOT NULL,
+    chunk_count     INTEGER NOT NULL,
+    embedding_model TEXT NOT NULL,
+    ingested_at     REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS urls (
+    url           TEXT PRIMARY KEY,
+    document_id   TEXT NOT NULL,
+    etag          TEXT,
+    last_modified TEXT,
+    checked_at    REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS chunks (
+    document_id TEXT NOT NULL,
+    vector_id   TEXT NOT NULL,
+    fingerprint TEXT NOT NULL,
+    PRIMARY KEY (document_id, vector_id)
+);
+CREATE INDEX IF NOT EXISTS documents_content_hash ON documents (content_hash);
+"""
+
+
+class DocumentRegistry:
+    """Local SQLite record of ingested documents and the URLs that serve them.
+
+    Documents are found by a hash of their content, so several URLs serving
+    the same bytes point at one ingested document. Each URL keeps the ETag
+    and Last-Modified validators from its last download for conditional
+    re-fetches. The fingerprint of every stored chunk is kept so a changed
+    document can be re-ingested incrementally.
+    """
+
+    def __init__(self, config: Config):
+        self.config = config
+        directory = os.path.dirname(config.REGISTRY_PATH)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(config.REGISTRY_PATH, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock, self._conn:
+            self._conn.executescript(SCHEMA)
+
+    def lookup_url(self, url: str) -> Optional[Dict[str, Any]]:
+        """Return the URL entry joined with its document, if both exist."""
+        with self._lock:
+            row = self._conn.execute(
+                """
+                SELECT u.url, u.document_id, u.etag, u.last_modified, u.checked_at,
+                       d.content_hash, d.chunk_count, d.embedding_model, d.ingested_at
+                FROM urls u JOIN documents d ON d.document_id = u.document_id
+                WHERE u.url = ?
+                """,
+                (url,)
+            ).fetchone()
+        return dict(row) if row else None
+
+    def get_document(self, document_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT * FROM documents WHERE document_id = ?", (document_id,)
+            ).fetchone()
+        return dict(row) if row else None
+
+    def find_document_by_hash(self, content_hash: str) -> Optional[Dict[str, Any]]:
+        """Most recently ingested document with these exact bytes."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT * FROM documents WHERE content_hash = ? ORDER BY ingested_at DESC LIMIT 1",
+                (content_hash,)
+            ).fetchone()
+        return dict(row) if row else None
+
+    def count_urls(self, document_id: str) -> int:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM urls WHERE document_id = ?", (document_id,)
+            ).fetchone()[0]
+
+    def get_chunks(self, document_id: str) -> Dict[str, str]:
+        """Vector id -> fingerprint of every chunk stored for a document."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT vector_id, fingerprint FROM chunks WHERE document_id = ?", (document_id,)
+            ).fetchall()
+        return {row["vector_id"]: row["fingerprint"] for row in rows}
+
+    def record_chunks(self, document_id: str, chunks: List[Tuple[str, str]]):
+        """Replace the stored (vector id, fingerprint) list of a document."""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM chunks WHERE document_id = ?", (document_id,))
+            self._conn.executemany(
+                "INSERT INTO chunks VALUES (?, ?, ?)",
+                [(document_id, vector_id, fingerprint) for vector_id, fingerprint in chunks]
+            )
+
+    def record_document(self, document_id: str, content_hash: str, chunk_count: int,
+                        embedding_model: str):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO documents VALUES (?, ?, ?, ?, ?)",
+                (document_id, content_hash, chunk_count, embedding_model, time.time())
+            )
+
+    def record_url(self, url: str, document_id: str, etag: Optional[str] = None,
+                   last_modified: Optional[str] = None):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO urls VALUES (?, ?, ?, ?, ?)",
+                (url, document_id, etag, last_modified, time.time())
+            )
+
+    def touch_url(self, url: str):
+        """Mark a URL as revalidated without changing its document."""
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE urls SET checked_at = ? WHERE url = ?", (time.time(), url))
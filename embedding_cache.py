@@ -0,0 +1,216 @@
+import os
+import glob
+import time
+import sqlite3
+import hashlib
+import threading
+import logging
+from typing import List, Dict, Any, Optional, Tuple
+import numpy as np
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key       BLOB PRIMARY KEY,
+    slot      INTEGER NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meta (
+    name  TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+
+class ChunkEmbeddingCache:
+    """Persistent, content-addressed embeddings of chunk texts.
+
+    Keys are a hash of the embedding model and the whitespace-normalised
+    chunk text, so boilerplate shared by many documents is encoded once.
+    Vectors are appended as raw ``CHUNK_EMBEDDING_CACHE_DTYPE`` rows to
+    ``vectors.<generation>.bin`` and read back through a memory map; a SQLite
+    index maps keys to row slots. Beyond ``CHUNK_EMBEDDING_CACHE_MAX_ENTRIES``
+    the least recently used entries are evicted by compacting into the next
+    generation's file, and the generation switch commits with the new index.
+
+    ``root`` and ``max_entries`` override the chunk cache settings for a
+    separate cache of other texts (the sentence store's sentences), so those
+    do not evict chunk embeddings.
+    """
+
+    EVICT_TO = 0.9  # Share of the cap kept after an eviction
+
+    def __init__(self, config: Config, root: Optional[str] = None, max_entries: Optional[int] = None,
+                 name: str = "chunk"):
+        self.config = config
+        self.name = name
+        self.root = root or config.CHUNK_EMBEDDING_CACHE_DIR
+        self.model_id = f"{config.EMBEDDING_MODEL_NAME}:{config.EMBEDDING_BACKEND}"
+        self.dimension = config.EMBEDDING_DIMENSION
+        self.dtype = np.dtype(config.CHUNK_EMBEDDING_CACHE_DTYPE)
+        self.max_entries = max_entries or config.CHUNK_EMBEDDING_CACHE_MAX_ENTRIES
+        self._row_bytes = self.dimension * self.dtype.itemsize
+        os.makedirs(self.root, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(os.path.join(self.root, "index.sqlite3"), check_same_thread=False)
+        with self._conn:
+            self._conn.executescript(SCHEMA)
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._generation = int(self._get_meta("generation", "0"))
+        layout = f"{self.dtype.name}:{self.dimension}"
+        if self._get_meta("layout", layout) != layout:
+            # Rows written with another dtype or dimension cannot be read back
+            logger.info(f"{self.name.capitalize()} embedding cache layout changed, starting empty")
+            self._generation += 1
+            with self._conn:
+                self._conn.execute("DELETE FROM entries")
+                self._set_meta("generation", str(self._generation))
+        with self._conn:
+            self._set_meta("layout", layout)
+        self._count = self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        self._open_vectors()
+
+    def key(self, text: str) -> bytes:
+        """Cache key of a text for the configured model."""
+        normalized = " ".join(text.split())
+        return hashlib.sha256(f"{self.model_id}\0{normalized}".encode("utf-8")).digest()[:16]
+
+    def get_many(self, keys: List[bytes]) -> Dict[bytes, np.ndarray]:
+        """Return the cached float32 vector of every key that is present."""
+        unique = list(set(keys))
+        with self._lock:
+            rows = []
+            for start in range(0, len(unique), 500):
+                part = unique[start:start + 500]
+                rows.extend(self._conn.execute(
+                    f"SELECT key, slot FROM entries WHERE key IN ({','.join('?' * len(part))})", part
+                ).fetchall())
+
+            found = {}
+            if rows:
+                view = self._view()
+                found = {bytes(key): np.asarray(view[slot], dtype=np.float32) for key, slot in rows}
+                now = time.time()
+                with self._conn:
+                    self._conn.executemany(
+                        "UPDATE entries SET last_used = ? WHERE key = ?", [(now, key) for key in found]
+                    )
+
+            self.hits += len(found)
+            self.misses += len(unique) - len(found)
+            return found
+
+    def put_many(self, items: List[Tuple[bytes, np.ndarray]]):
+        """Append vectors for keys not cached yet, evicting if over the cap."""
+        with self._lock:
+            new = {}
+            for key, vector in items:
+                new.setdefault(key, vector)
+            for start in range(0, len(new), 500):
+                part = list(new)[start:start + 500]
+                for (key,) in self._conn.execute(
+                    f"SELECT key FROM entries WHERE key IN ({','.join('?' * len(part))})", part
+                ):
+                    new.pop(bytes(key), None)
+            if not new:
+                return
+
+            rows = np.asarray(list(new.values()), dtype=self.dtype).reshape(-1, self.dimension)
+            # Rows reach the file before the index references them
+            self._file.write(rows.tobytes())
+            self._file.flush()
+            first_slot = self._rows
+            self._rows += len(rows)
+            self._mmap = None
+
+            now = time.time()
+            with self._conn:
+                self._conn.executemany(
+                    "INSERT INTO entries (key, slot, last_used) VALUES (?, ?, ?)",
+                    [(key, first_slot + i, now) for i, key in enumerate(new)]
+                )
+            self._count += len(new)
+
+            if self._count > self.max_entries:
+                self._evict()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": self._count,
+                "file_bytes": self._rows * self._row_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions
+            }
+
+    def _vectors_path(self, generation: int) -> str:
+        return os.path.join(self.root, f"vectors.{generation}.bin")
+
+    def _open_vectors(self):
+        path = self._vectors_path(self._generation)
+        for stale in glob.glob(os.path.join(self.root, "vectors.*.bin")):
+            if stale != path:
+                os.remove(stale)
+
+        size = os.path.getsize(path) if os.path.exists(path) else 0
+        self._rows = size // self._row_bytes
+        if size % self._row_bytes:
+            # Drop a row cut short by a crash mid-append
+            with open(path, "r+b") as f:
+                f.truncate(self._rows * self._row_bytes)
+        self._file = open(path, "ab")
+        self._mmap = None
+
+    def _view(self) -> np.ndarray:
+        """Memory map over all rows written so far, re-opened after appends."""
+        if self._mmap is None:
+            self._mmap = np.memmap(self._vectors_path(self._generation), dtype=self.dtype, mode="r",
+                                   shape=(self._rows, self.dimension))
+        return self._mmap
+
+    def _evict(self):
+        """Keep the most recently used entries, compacted into a new file."""
+        keep = int(self.max_entries * self.EVICT_TO)
+        kept = self._conn.execute(
+            "SELECT key, slot, last_used FROM entries ORDER BY last_used DESC LIMIT ?", (keep,)
+        ).fetchall()
+        kept.sort(key=lambda row: row[1])
+
+        view = self._view()
+        generation = self._generation + 1
+        with open(self._vectors_path(generation), "wb") as f:
+            for start in range(0, len(kept), 4096):
+                f.write(np.ascontiguousarray(view[[slot for _, slot, _ in kept[start:start + 4096]]]).tobytes())
+
+        with self._conn:
+            self._conn.execute("DELETE FROM entries")
+            self._conn.executemany(
+                "INSERT INTO entries (key, slot, last_used) VALUES (?, ?, ?)",
+                [(key, slot, last_used) for slot, (key, _, last_used) in enumerate(kept)]
+            )
+            self._set_meta("generation", str(generation))
+
+        evicted = self._count - len(kept)
+        self.evictions += evicted
+        self._count = len(kept)
+        self._file.close()
+        self._generation = generation
+        self._open_vectors()
+        logger.info(f"Evicted {evicted} {self.name} embeddings, {self._count} kept")
+
+    def _get_meta(self, name: str, default: str) -> str:
+        row = self._conn.execute("SELECT value FROM meta WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else default
+
+    def _set_meta(self, name: str, value: str):
+        self._conn.execute("INSERT OR REPLACE INTO meta (name, value) VALUES (?, ?)", (name, value))
@@ -0,0 +1,159 @@
+import queue
+import threading
+import time
+import logging
+from concurrent.futures import Future
+from typing import List, Dict, Tuple
+import numpy as np
+from sentence_transformers import SentenceTransformer
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingService:
+    """Process-wide SentenceTransformer shared by ingestion and retrieval.
+
+    ``encode`` embeds a list of texts, grouping them into length-sorted batches
+    so short texts are not padded to the longest one. ``encode_query`` is
+    meant for single questions arriving from concurrent requests, and
+    ``encode_queries`` for the questions of one request: texts are queued and
+    a background worker merges everything that arrives within
+    ``QUERY_BATCH_WINDOW_MS`` into one micro-batch.
+
+    With ``EMBEDDING_BACKEND = "int8"`` the model's linear layers are
+    dynamically quantized to int8, which trades a little accuracy for much
+    faster CPU inference; ``benchmarks/bench_quantized_embeddings.py`` checks
+    the retrieval agreement with fp32.
+    """
+
+    def __init__(self, config: Config):
+        self.config = config
+        self.model = self._load_model()
+        self.max_seq_length = getattr(self.model, "max_seq_length", None) or 512
+
+        self._requests: "queue.Queue[Tuple[str, Future]]" = queue.Queue()
+        self._worker = threading.Thread(target=self._batch_queries, name="query-encoder", daemon=True)
+        self._worker.start()
+
+    def _load_model(self) -> SentenceTransformer:
+        backend = self.config.EMBEDDING_BACKEND
+        if backend not in ("fp32", "int8"):
+            raise ValueError(f"Unknown embedding backend: {backend}")
+
+        if self.config.EMBEDDING_THREADS > 0:
+            import torch
+            torch.set_num_threads(self.config.EMBEDDING_THREADS)
+
+        if backend == "fp32":
+            return SentenceTransformer(self.config.EMBEDDING_MODEL_NAME)
+
+        import torch
+        model = SentenceTransformer(self.config.EMBEDDING_MODEL_NAME, device="cpu")
+        model.eval()
+        logger.info(f"Quantizing {self.config.EMBEDDING_MODEL_NAME} linear layers to int8")
+        return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        """Embed a list of texts, returning rows in input order."""
+        if not texts:
+            return np.zeros((0, self.config.EMBEDDING_DIMENSION), dtype=np.float32)
+
+        # Rough token counts (~4 characters per token) are enough to group by length
+        lengths = [min(len(text) // 4 + 2, self.max_seq_length) for text in texts]
+        batches = length_sorted_batches(
+            lengths, self.config.EMBEDDING_BATCH_SIZE, self.config.EMBEDDING_MAX_BATCH_TOKENS
+        )
+        embeddings = np.empty((len(texts), self.config.EMBEDDING_DIMENSION), dtype=np.float32)
+        for batch in batches:
+            embeddings[batch] = self.model.encode(
+                [texts[i] for i in batch],
+                batch_size=len(batch),
+                show_progress_bar=False,
+                convert_to_numpy=True
+            )
+        return embeddings
+
+    def encode_query(self, text: str) -> np.ndarray:
+        """Embed one query, sharing a model call with concurrent callers."""
+        return self.encode_queries([text])[0]
+
+    def encode_queries(self, texts: List[str]) -> np.ndarray:
+        """Embed a request's queries through the micro-batching queue.
+
+        The texts are queued together, so they share micro-batches with each
+        other and with concurrent requests instead of a separate model call.
+        """
+        futures = []
+        for text in texts:
+            future: Future = Future()
+            self._requests.put((text, future))
+            futures.append(future)
+        if not futures:
+            return np.zeros((0, self.config.EMBEDDING_DIMENSION), dtype=np.float32)
+        return np.vstack([future.result() for future in futures])
+
+    def _batch_queries(self):
+        """Collect queued queries into micro-batches and encode them."""
+        window = self.config.QUERY_BATCH_WINDOW_MS / 1000.0
+
+        while True:
+            batch = [self._requests.get()]
+            deadline = time.monotonic() + window
+
+            while len(batch) < self.config.QUERY_MAX_BATCH_SIZE:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._requests.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            texts = [text for text, _ in batch]
+            try:
+                embeddings = self.encode(texts)
+            except Exception as e:
+                logger.error(f"Error encoding query batch: {e}")
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+
+            for (_, future), embedding in zip(batch, embeddings):
+                future.set_result(embedding)
+
+            if len(batch) > 1:
+                logger.debug(f"Encoded query micro-batch of {len(batch)}")
+
+
+def length_sorted_batches(lengths: List[int], max_batch_size: int, max_batch_tokens: int) -> List[np.ndarray]:
+    """Group indexes into batches of similar length, longest first.
+
+    A batch is padded to its longest member, so it is closed once it holds
+    ``max_batch_size`` texts or adding one more would exceed
+    ``max_batch_tokens`` padded tokens.
+    """
+    order = np.argsort(-np.asarray(lengths), kind="stable")
+    batches = []
+    start = 0
+    while start < len(order):
+        longest = max(lengths[order[start]], 1)
+        size = max(1, min(max_batch_size, max_batch_tokens // longest))
+        batches.append(order[start:start + size])
+        start += size
+    return batches
+
+
+_services: Dict[Tuple[str, str], EmbeddingService] = {}
+_services_lock = threading.Lock()
+
+
+def get_embedding_service(config: Config) -> EmbeddingService:
+    """Return the shared embedding service for the configured model and backend."""
+    key = (config.EMBEDDING_MODEL_NAME, config.EMBEDDING_BACKEND)
+    with _services_lock:
+        service = _services.get(key)
+        if service is None:
+            service = EmbeddingService(config)
+            _services[key] = service
+        return service
@@ -0,0 +1,169 @@
+import time
+import uuid
+import threading
+import logging
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Any, Optional
+from config import Config
+from document_processor import DocumentProcessor
+from metrics import traced
+
+logger = logging.getLogger(__name__)
+
+
+class IngestionJob:
+    """One run of ``process_document`` for a URL, shared by everyone asking for it."""
+
+    def __init__(self, url: str):
+        self.job_id = uuid.uuid4().hex
+        self.url = url
+        self.status = "queued"  # queued -> running -> completed | failed
+        self.document_id: Optional[str] = None
+        self.error: Optional[str] = None
+        self.progress: Dict[str, Any] = {"stage": "queued"}
+        self.timings: Dict[str, Dict[str, float]] = {}
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.future: Future = Future()  # resolves to the document id
+
+    def done(self) -> bool:
+        return self.future.done()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.job_id,
+            "url": self.url,
+            "status": self.status,
+            "document_id": self.document_id,
+            "error": self.error,
+            "progress": dict(self.progress),
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at
+        }
+
+
+class IngestionJobs:
+    """In-process ingestion queue with single-flight deduplication.
+
+    ``submit`` returns the in-flight job for a URL if there is one, so
+    concurrent requests for the same document share one download and one
+    ingestion. Jobs run on ``INGESTION_WORKERS`` threads; the table keeps the
+    last ``INGESTION_JOB_HISTORY`` finished jobs for status lookups.
+
+    A URL the registry holds and that is not due for revalidation gets a job
+    completed on the spot in the calling thread, so questions about ingested
+    documents never wait behind cold ingestions for a worker.
+    """
+
+    def __init__(self, config: Config, doc_processor: DocumentProcessor):
+        self.config = config
+        self.doc_processor = doc_processor
+        self._executor = ThreadPoolExecutor(max_workers=config.INGESTION_WORKERS, thread_name_prefix="hackrx-ingest")
+        self._lock = threading.Lock()
+        self._jobs: "OrderedDict[str, IngestionJob]" = OrderedDict()
+        self._active: Dict[str, IngestionJob] = {}  # url -> queued or running job
+        # Moving average of jobs that downloaded and ingested a document, for admission estimates
+        self.ingest_seconds = config.INGESTION_ESTIMATE_SECONDS
+
+    def submit(self, url: str) -> IngestionJob:
+        """Start ingesting ``url``, or return the job already doing so (or a completed one for a registry hit).
+
+        Reads the registry, so async callers run it off the event loop.
+        """
+        with self._lock:
+            job = self._active.get(url)
+            if job is not None:
+                logger.info(f"Attaching to ingestion job {job.job_id} for {url}")
+                return job
+
+        document_id = self.doc_processor.fresh_document_id(url)
+        with self._lock:
+            job = self._active.get(url)
+            if job is not None:
+                return job
+            job = IngestionJob(url)
+            self._jobs[job.job_id] = job
+            if document_id is None:
+                self._active[url] = job
+            self._trim_history()
+
+        if document_id is not None:
+            job.started_at = time.time()
+            self._finish(job, "completed", document_id=document_id)
+            job.future.set_result(document_id)
+            return job
+
+        self._executor.submit(self._run, job)
+        return job
+
+    def get(self, job_id: str) -> Optional[IngestionJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def status(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Snapshot of a job's state and progress, or None if unknown."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return job.to_dict() if job else None
+
+    def is_active(self, url: str) -> bool:
+        with self._lock:
+            return url in self._active
+
+    def backlog(self) -> int:
+        """Queued and running jobs."""
+        with self._lock:
+            return len(self._active)
+
+    def estimate_seconds(self, url: str, cold: bool) -> float:
+        """Rough seconds until ``url`` is ingested: the job's remaining time, or a new job's queue wait plus its own."""
+        with self._lock:
+            job = self._active.get(url)
+            if job is not None and job.started_at is not None:
+                return max(0.0, self.ingest_seconds - (time.time() - job.started_at))
+            if job is None and not cold:
+                return 0.0
+            running = sum(1 for active in self._active.values() if active.started_at is not None)
+            queued = len(self._active) - running - (1 if job is not None else 0)
+            waves = (running + queued) // self.config.INGESTION_WORKERS
+            return self.ingest_seconds * (1 + waves)
+
+    def _run(self, job: IngestionJob):
+        job.status = "running"
+        job.started_at = time.time()
+        try:
+            document_id, job.timings = traced(self.doc_processor.process_document, job.url,
+                                              lambda update: self._update_progress(job, update))
+        except Exception as e:
+            self._finish(job, "failed", error=str(e))
+            job.future.set_exception(e)
+            return
+        self._finish(job, "completed", document_id=document_id)
+        job.future.set_result(document_id)
+
+    def _update_progress(self, job: IngestionJob, update: Dict[str, Any]):
+        with self._lock:
+            job.progress.update(update)
+
+    def _finish(self, job: IngestionJob, status: str, document_id: Optional[str] = None,
+                error: Optional[str] = None):
+        with self._lock:
+            job.status = status
+            job.document_id = document_id
+            job.error = error
+            job.finished_at = time.time()
+            if status == "completed" and "pages_total" in job.progress:
+                # Only full ingestions: registry hits would drag the estimate towards zero
+                self.ingest_seconds += 0.2 * (job.finished_at - job.started_at - self.ingest_seconds)
+            job.progress["stage"] = "done" if status == "completed" else "failed"
+            if self._active.get(job.url) is job:
+                del self._active[job.url]
+
+    def _trim_history(self):
+        """Forget the oldest finished jobs beyond the history size."""
+        finished = [job_id for job_id, job in self._jobs.items() if job.done()]
+        for job_id in finished[:max(0, len(finished) - self.config.INGESTION_JOB_HISTORY)]:
+            del self._jobs[job_id]
@@ -1,56 +1,383 @@
 # main.py - FastAPI Application
-from fastapi import FastAPI, HTTPException
+import time
+PROCESS_START = time.perf_counter()
+
+from fastapi import FastAPI, HTTPException, Request, Response
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Union
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager, contextmanager
+import asyncio
+import json
+import threading
 import uvicorn
-from document_processor import DocumentProcessor
-from query_engine import ImprovedQueryEngine
 from config import Config
+from metrics import render_prometheus, timed, traced, PARTIAL_RESPONSES, STARTUP_SECONDS
+from scheduler import Overloaded, RequestScheduler
 import logging
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title="Enhanced Insurance Document Query System", version="2.0.0")
-
 class QueryRequest(BaseModel):
     documents: str
     questions: List[str]
+    debug: bool = False  # Return DetailedQueryResponse with per-stage timings
+    deadline_seconds: Optional[float] = None  # Time budget; overrides the X-Request-Timeout header
+
+class DocumentRequest(BaseModel):
+    documents: str
 
 class QueryResponse(BaseModel):
     answers: List[str]
 
 class DetailedQueryResponse(BaseModel):
     answers: List[Dict[str, Any]]
+    timings: Dict[str, Any] = {}
 
-# Initialize components
 config = Config()
-doc_processor = DocumentProcessor(config)
-query_engine = ImprovedQueryEngine(config)
 
-@app.post("/hackrx/run", response_model=QueryResponse)
-async def run_queries(request: QueryRequest):
-    """Process documents and answer questions with enhanced accuracy."""
+# Blocking work (PDF parsing, encoding, vector lookups) runs here, off the event loop
+executor = ThreadPoolExecutor(max_workers=config.REQUEST_WORKERS, thread_name_prefix="hackrx-worker")
+
+class ServiceState:
+    """Components built by the background startup task, and its progress."""
+    
+    def __init__(self):
+        self.doc_processor = None
+        self.query_engine = None
+        self.ingestion_jobs = None
+        self.scheduler = None
+        self.ready = threading.Event()
+        self.error: Optional[str] = None
+        self.phases: Dict[str, float] = {}  # startup phase -> seconds
+    
+    def phase(self, name: str, func, *args):
+        start = time.perf_counter()
+        result = func(*args)
+        self.phases[name] = round(time.perf_counter() - start, 3)
+        STARTUP_SECONDS.set(self.phases[name], phase=name)
+        return result
+
+state = ServiceState()
+
+def initialize_services():
+    """Import and build the models and vector store, then warm them up.
+    
+    Runs in the background after uvicorn binds, so liveness probes answer
+    immediately and /readyz reports when queries can be served.
+    """
+    try:
+        def import_modules():
+            # torch/sentence-transformers and the Pinecone client load here, not at import time
+            import document_processor
+            import ingestion_jobs
+            import query_engine
+            import vector_store
+            return document_processor, ingestion_jobs, query_engine, vector_store
+        
+        document_processor, ingestion_jobs, query_engine, vector_store = state.phase("imports", import_modules)
+        store = state.phase("vector_store", vector_store.create_vector_store, config)
+        
+        def build_components():
+            processor = document_processor.DocumentProcessor(config, store)
+            engine = query_engine.ImprovedQueryEngine(config, store)
+            processor.ingest_listeners.append(engine.invalidate_document)
+            jobs = ingestion_jobs.IngestionJobs(config, processor)
+            return processor, engine, jobs, RequestScheduler(config, processor, jobs, executor)
+        
+        processor, engine, jobs, request_scheduler = state.phase("models", build_components)
+        
+        def warm_up():
+            # First encode pays for lazy weight loading and kernel selection
+            engine.embedder.encode(["What is the grace period for premium payment?"])
+            store.has_document("__warmup__")
+        
+        state.phase("warmup", warm_up)
+        
+        state.doc_processor, state.query_engine, state.ingestion_jobs = processor, engine, jobs
+        state.scheduler = request_scheduler
+        state.phases["time_to_ready"] = round(time.perf_counter() - PROCESS_START, 3)
+        STARTUP_SECONDS.set(state.phases["time_to_ready"], phase="time_to_ready")
+        state.ready.set()
+        logger.info(f"Service ready: {state.phases}")
+    except Exception as e:
+        state.error = str(e)
+        logger.error(f"Startup failed: {e}")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Not awaited: the server starts accepting connections while models load
+    startup = asyncio.get_running_loop().run_in_executor(executor, initialize_services)
+    yield
+    if not startup.done():
+        logger.warning("Shutting down before startup finished")
+    if state.doc_processor is not None:
+        state.doc_processor.close()
+
+app = FastAPI(title="Enhanced Insurance Document Query System", version="2.0.0", lifespan=lifespan)
+
+def require_ready():
+    """Raise 503 (with Retry-After) until startup has finished."""
+    if state.error is not None:
+        raise HTTPException(status_code=503, detail=f"Startup failed: {state.error}")
+    if not state.ready.is_set():
+        raise HTTPException(status_code=503, detail="Service is starting", headers={"Retry-After": "5"})
+
+async def run_query_work(func, *args):
+    """Run blocking query work in the query admission pool."""
+    return await state.scheduler.queries.run(func, *args)
+
+def request_deadline(request: QueryRequest, http_request: Request) -> Optional[float]:
+    """Monotonic deadline from the request's budget (field, else X-Request-Timeout header), or None."""
+    budget = request.deadline_seconds
+    if budget is None and "x-request-timeout" in http_request.headers:
+        try:
+            budget = float(http_request.headers["x-request-timeout"])
+        except ValueError:
+            raise HTTPException(status_code=400, detail="X-Request-Timeout must be a number of seconds")
+    return state.scheduler.deadline(budget)
+
+@contextmanager
+def overload_as_http():
+    """Turn an admission rejection into its HTTP error, with Retry-After when retrying can help."""
+    try:
+        yield
+    except Overloaded as e:
+        headers = {"Retry-After": str(e.retry_after)} if e.retry_after is not None else None
+        raise HTTPException(status_code=e.status_code, detail=e.detail, headers=headers)
+
+def admit(request: QueryRequest, deadline: Optional[float]):
+    """Reject the request with 429/503 and Retry-After if it cannot finish in time."""
+    with overload_as_http():
+        state.scheduler.admit(request.documents, len(request.questions), deadline)
+
+def remaining(deadline: Optional[float]) -> Optional[float]:
+    return None if deadline is None else max(0.0, deadline - time.monotonic())
+
+DEADLINE_ANSWER = "Not answered before the request deadline."
+
+@app.post("/hackrx/run", response_model=Union[QueryResponse, DetailedQueryResponse])
+async def run_queries(request: QueryRequest, http_request: Request, response: Response):
+    """Process documents and answer questions with enhanced accuracy.
+    
+    With a deadline, the request is rejected up front (429/503 with
+    Retry-After) when it is estimated not to finish in time, answered with
+    504 if the document is still being ingested at the deadline, and
+    otherwise gets the answers finished by then; the others are marked and
+    counted in the X-Partial-Results header.
+    """
+    require_ready()
+    deadline = request_deadline(request, http_request)
+    admit(request, deadline)
+    query_engine = state.query_engine
     try:
         logger.info(f"Processing document: {request.documents}")
         
-        # Process document and create embeddings
-        document_id = doc_processor.process_document(request.documents)
+        with timed("request"):
+            # Ingest the document, or wait on the job already ingesting it (registry hits resolve here)
+            job = await run_query_work(state.ingestion_jobs.submit, request.documents)
+            try:
+                # Shielded: the job keeps running for later requests if this one gives up
+                document_id = await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(job.future)),
+                                                     timeout=remaining(deadline))
+            except asyncio.TimeoutError:
+                retry_after = state.ingestion_jobs.estimate_seconds(request.documents, cold=True)
+                raise HTTPException(status_code=504, detail="Deadline exceeded while ingesting the document",
+                                    headers={"Retry-After": str(max(1, round(retry_after)))})
+            document_timings = job.timings
+            
+            # Embed all questions in one batch, then answer them concurrently until the deadline
+            tasks = [asyncio.ensure_future(answer_questions(query_engine, request.questions, document_id))]
+            done, _ = await asyncio.wait(tasks, timeout=remaining(deadline))
+            embedding_timings, traced_results = {}, [None] * len(request.questions)
+            if done:
+                embedding_timings, answer_tasks = tasks[0].result()
+                if answer_tasks:
+                    finished, pending = await asyncio.wait(answer_tasks, timeout=remaining(deadline))
+                    for task in pending:
+                        task.cancel()
+                    traced_results = [task.result() if task in finished else None for task in answer_tasks]
+            else:
+                tasks[0].cancel()
         
-        # Process all questions
-        answers = []
-        for i, question in enumerate(request.questions):
-            logger.info(f"Processing question {i+1}/{len(request.questions)}: {question}")
-            result = query_engine.query(question, document_id)
-            answers.append(result["answer"])
-            logger.info(f"Answer confidence: {result['confidence']}%")
+        unanswered = [i for i, traced_result in enumerate(traced_results) if traced_result is None]
+        results = [
+            traced_result[0] if traced_result is not None
+            else {"answer": DEADLINE_ANSWER, "confidence": 0, "status": "deadline_exceeded"}
+            for traced_result in traced_results
+        ]
+        for i, result in enumerate(results):
+            confidence = "n/a (lexical match)" if result["confidence"] is None else f"{result['confidence']}%"
+            logger.info(f"Answer {i+1}/{len(results)} confidence: {confidence}")
+        if unanswered:
+            PARTIAL_RESPONSES.inc()
+            logger.warning(f"Deadline hit with {len(unanswered)}/{len(results)} questions unanswered")
+            response.headers["X-Partial-Results"] = f"{len(results) - len(unanswered)}/{len(results)}"
         
-        return QueryResponse(answers=answers)
+        if request.debug:
+            return DetailedQueryResponse(
+                answers=[
+                    dict(result, timings=traced_result[1] if traced_result is not None else {})
+                    for result, traced_result in zip(results, traced_results)
+                ],
+                timings={"process_document": document_timings, "embed_queries": embedding_timings}
+            )
+        return QueryResponse(answers=[result["answer"] for result in results])
     
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error processing request: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Processing error: {str(e)}")
+
+async def answer_questions(query_engine, questions: List[str], document_id: str):
+    """Search and embed the questions, then start answering each; returns the embedding timings and answer tasks."""
+    plans, embedding_timings = await run_query_work(traced, query_engine.plan_queries, questions, document_id)
+    logger.info(f"Processing {len(questions)} questions")
+    return embedding_timings, [
+        asyncio.ensure_future(run_query_work(traced, query_engine.query, question, document_id, plan))
+        for question, plan in zip(questions, plans)
+    ]
+
+async def stream_events(request: QueryRequest, deadline: Optional[float] = None):
+    """Ingestion progress, then each answer as soon as it is ready, until the deadline."""
+    job = await run_query_work(state.ingestion_jobs.submit, request.documents)
+    yield {"event": "job", "job_id": job.job_id}
+    
+    # Report progress changes until the (possibly shared) ingestion job finishes
+    last_progress = None
+    while not job.done():
+        if deadline is not None and time.monotonic() >= deadline:
+            # The job keeps running for later requests, as in /hackrx/run
+            retry_after = state.ingestion_jobs.estimate_seconds(request.documents, cold=True)
+            yield partial_event(request.questions, set(), "Deadline exceeded while ingesting the document",
+                                retry_after=max(1, round(retry_after)))
+            return
+        progress = state.ingestion_jobs.status(job.job_id)["progress"]
+        if progress != last_progress:
+            yield {"event": "progress", **progress}
+            last_progress = progress
+        interval = config.STREAM_PROGRESS_INTERVAL_SECONDS
+        await asyncio.wait([asyncio.wrap_future(job.future)],
+                           timeout=interval if deadline is None else min(interval, remaining(deadline)))
+    document_id = job.future.result()
+    yield {"event": "document", "document_id": document_id}
+    
+    query_engine = state.query_engine
+    planning = asyncio.ensure_future(run_query_work(query_engine.plan_queries, request.questions, document_id))
+    done, _ = await asyncio.wait([planning], timeout=remaining(deadline))
+    if not done:
+        planning.cancel()
+        yield partial_event(request.questions, set(), DEADLINE_ANSWER)
+        return
+    plans = planning.result()
+    
+    async def answer(index: int, question: str, plan):
+        return index, await run_query_work(query_engine.query, question, document_id, plan)
+    
+    pending = {
+        asyncio.ensure_future(answer(index, question, plan))
+        for index, (question, plan) in enumerate(zip(request.questions, plans))
+    }
+    answered = set()
+    while pending:
+        done, pending = await asyncio.wait(pending, timeout=remaining(deadline), return_when=asyncio.FIRST_COMPLETED)
+        if not done:
+            break
+        for task in done:
+            index, result = task.result()
+            answered.add(index)
+            yield {"event": "answer", "index": index, **result}
+    
+    if pending:
+        for task in pending:
+            task.cancel()
+        yield partial_event(request.questions, answered, DEADLINE_ANSWER)
+        return
+    yield {"event": "done", "answered": len(request.questions)}
+
+def partial_event(questions: List[str], answered: set, detail: str, **fields) -> Dict[str, Any]:
+    """Terminal event of a stream cut off by its deadline, listing the unanswered question indexes."""
+    unanswered = [index for index in range(len(questions)) if index not in answered]
+    PARTIAL_RESPONSES.inc()
+    logger.warning(f"Deadline hit with {len(unanswered)}/{len(questions)} questions unanswered")
+    return {"event": "partial", "answered": len(answered), "unanswered": unanswered, "detail": detail, **fields}
+
+@app.post("/hackrx/run/stream")
+async def run_queries_stream(request: QueryRequest, http_request: Request):
+    """Streaming /hackrx/run: NDJSON by default, Server-Sent Events if the client accepts them.
+    
+    Emits "job" and "progress" events while the document is ingested, a
+    "document" event, one "answer" event per question in completion order
+    (with its index), and finally "done" - or "partial" (with the unanswered
+    indexes) if the deadline passes first, or "error" if anything fails.
+    An answer's ``confidence`` is null when it came from the BM25 fast path,
+    which has no dense similarity to derive one from.
+    """
+    require_ready()
+    deadline = request_deadline(request, http_request)
+    admit(request, deadline)
+    sse = "text/event-stream" in http_request.headers.get("accept", "")
+    
+    async def body():
+        try:
+            with timed("request_stream"):
+                async for event in stream_events(request, deadline):
+                    yield format_event(event, sse)
+        except Exception as e:
+            logger.error(f"Error streaming request: {str(e)}")
+            yield format_event({"event": "error", "detail": f"Processing error: {str(e)}"}, sse)
+    
+    media_type = "text/event-stream" if sse else "application/x-ndjson"
+    return StreamingResponse(body(), media_type=media_type, headers={"Cache-Control": "no-cache"})
+
+def format_event(event: Dict[str, Any], sse: bool) -> str:
+    data = json.dumps(event)
+    if sse:
+        return f"event: {event['event']}\ndata: {data}\n\n"
+    return data + "\n"
+
+@app.post("/documents", status_code=202)
+async def submit_document(request: DocumentRequest):
+    """Start ingesting a document in the background and return its job (503 if the ingestion queue is full)."""
+    require_ready()
+    with overload_as_http():
+        state.scheduler.admit_ingestion(request.documents)
+    job = await run_query_work(state.ingestion_jobs.submit, request.documents)
+    return state.ingestion_jobs.status(job.job_id)
+
+@app.get("/documents/{job_id}")
+async def document_status(job_id: str):
+    """Status and progress of an ingestion job."""
+    require_ready()
+    status = state.ingestion_jobs.status(job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job: {job_id}")
+    return status
+
+@app.get("/healthz")
+async def healthz():
+    """Liveness: the process is up and serving requests."""
+    return {"status": "ok"}
+
+@app.get("/readyz")
+async def readyz():
+    """Readiness: models are loaded and warmed up and the vector store is connected."""
+    if state.ready.is_set():
+        return {"status": "ready", "startup_seconds": state.phases}
+    status = "failed" if state.error is not None else "starting"
+    return JSONResponse(
+        status_code=503,
+        content={"status": status, "error": state.error, "startup_seconds": state.phases}
+    )
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Stage latencies, counters and distributions in Prometheus text format."""
+    return PlainTextResponse(render_prometheus(), media_type="text/plain; version=0.0.4")
     
 if __name__ == "__main__":
     print("🚀 Starting Enhanced Insurance Document Query System...")
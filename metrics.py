@@ -0,0 +1,200 @@
+import time
+import threading
+import contextvars
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Dict[str, Any]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(key: LabelKey, extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+    pairs = key + extra
+    if not pairs:
+        return ""
+    escaped = (v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Counter:
+    """Monotonic counter, one series per label combination."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self._lock = threading.Lock()
+        self._values: Dict[LabelKey, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            return [f"{self.name}{_format_labels(k)} {_format_value(v)}" for k, v in sorted(self._values.items())]
+
+
+class Gauge(Counter):
+    """Value that can go up and down."""
+
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[_label_key(labels)] = value
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus exposition layout."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, buckets: Iterable[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        self._series: Dict[LabelKey, List[float]] = {}  # bucket counts..., +Inf count, sum
+
+    def observe(self, value: float, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 2)
+            series[bisect_left(self.buckets, value)] += 1
+            series[-1] += value
+
+    def samples(self) -> List[str]:
+        lines = []
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float("inf"),), series[:-1]):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append(f"{self.name}_bucket{_format_labels(key, (('le', le),))} {cumulative}")
+                lines.append(f"{self.name}_sum{_format_labels(key)} {_format_value(series[-1])}")
+                lines.append(f"{self.name}_count{_format_labels(key)} {cumulative}")
+        return lines
+
+
+REGISTRY: List[Any] = []
+
+
+def _register(metric):
+    REGISTRY.append(metric)
+    return metric
+
+
+STAGE_SECONDS = _register(Histogram(
+    "hackrx_stage_duration_seconds", "Time spent per pipeline stage"))
+DOCUMENT_REQUESTS = _register(Counter(
+    "hackrx_document_requests_total", "process_document calls by outcome"))
+CHUNKS_PER_DOCUMENT = _register(Histogram(
+    "hackrx_document_chunks", "Chunks stored per ingested document",
+    buckets=(10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)))
+VECTORS_UPSERTED = _register(Counter(
+    "hackrx_vectors_upserted_total", "Vectors written to the vector store"))
+UPSERT_RETRIES = _register(Counter(
+    "hackrx_upsert_retries_total", "Vector store upsert batches retried after a transient failure"))
+UPSERT_THROUGHPUT = _register(Histogram(
+    "hackrx_upsert_vectors_per_second", "Upsert throughput per flushed write",
+    buckets=(50, 100, 250, 500, 1000, 2500, 5000, 10000, 25000)))
+INGEST_CHUNKS = _register(Counter(
+    "hackrx_ingest_chunks_total", "Chunks per ingestion outcome: unchanged, upserted, embedded, deleted"))
+TABLE_PAGES = _register(Counter(
+    "hackrx_pdf_table_pages_total", "PDF pages whose table extraction was run (extracted) or skipped by the pre-pass"))
+CACHE_REQUESTS = _register(Counter(
+    "hackrx_cache_requests_total", "Cache lookups by cache and result"))
+CHUNK_CACHE_HIT_RATIO = _register(Histogram(
+    "hackrx_chunk_embedding_cache_hit_ratio", "Share of chunks per ingestion served from the embedding cache",
+    buckets=(0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 1.0)))
+RETRIEVAL_SCORE = _register(Histogram(
+    "hackrx_retrieval_top_score", "Score of the best retrieved chunk per question",
+    buckets=(0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 1.0)))
+ANSWER_CONFIDENCE = _register(Histogram(
+    "hackrx_answer_confidence_percent", "Confidence reported per answered question",
+    buckets=(10, 20, 30, 40, 50, 60, 70, 80, 90, 95)))
+ADMISSION_DECISIONS = _register(Counter(
+    "hackrx_admission_decisions_total", "Requests admitted or rejected by admission control, by reason"))
+POOL_IN_FLIGHT = _register(Gauge(
+    "hackrx_pool_in_flight", "Tasks running per admission pool"))
+PARTIAL_RESPONSES = _register(Counter(
+    "hackrx_partial_responses_total", "Responses returned with unanswered questions at the deadline"))
+STARTUP_SECONDS = _register(Gauge(
+    "hackrx_startup_seconds", "Duration of each startup phase"))
+
+
+# Per-request stage timings, collected when a trace is active
+_trace: contextvars.ContextVar[Optional[Dict[str, Dict[str, float]]]] = contextvars.ContextVar(
+    "hackrx_trace", default=None)
+_trace_lock = threading.Lock()
+
+
+def _record(stage: str, seconds: float):
+    STAGE_SECONDS.observe(seconds, stage=stage)
+    trace = _trace.get()
+    if trace is None:
+        return
+    # Pipeline stages of one request may record from several threads
+    with _trace_lock:
+        entry = trace.setdefault(stage, {"count": 0, "total_ms": 0.0})
+        entry["count"] += 1
+        entry["total_ms"] = round(entry["total_ms"] + seconds * 1000, 3)
+
+
+@contextmanager
+def timed(stage: str):
+    """Time a block into the stage histogram and the active trace."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _record(stage, time.perf_counter() - start)
+
+
+def timed_iter(stage: str, items: Iterable) -> Iterator:
+    """Yield from ``items``, timing how long each item takes to produce."""
+    iterator = iter(items)
+    while True:
+        start = time.perf_counter()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            return
+        _record(stage, time.perf_counter() - start)
+        yield item
+
+
+def traced(func: Callable, *args) -> Tuple[Any, Dict[str, Dict[str, float]]]:
+    """Call ``func`` with a fresh trace; return its result and stage timings."""
+    trace: Dict[str, Dict[str, float]] = {}
+    token = _trace.set(trace)
+    try:
+        return func(*args), trace
+    finally:
+        _trace.reset(token)
+
+
+def render_prometheus() -> str:
+    """All registered metrics in the Prometheus text exposition format."""
+    lines = []
+    for metric in REGISTRY:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(metric.samples())
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,153 @@
+import logging
+from collections import deque
+from concurrent.futures import Executor
+from typing import List, Dict, Any, Iterator, Optional, Tuple
+import pdfplumber
+from metrics import TABLE_PAGES
+
+logger = logging.getLogger(__name__)
+
+Page = Tuple[int, str, List[List]]
+
+# A table without any of these words is dropped as not meaningful
+TABLE_KEYWORDS = ["premium", "coverage", "benefit", "limit", "amount", "period", "plan", "sum"]
+
+LINE_TABLE_SETTINGS = {"vertical_strategy": "lines", "horizontal_strategy": "lines"}
+TEXT_TABLE_SETTINGS = {"vertical_strategy": "text", "horizontal_strategy": "text"}
+
+
+def table_settings(page, page_text: str, text_tables: bool = False) -> Optional[Dict[str, Any]]:
+    """Table settings for a page, or None when table extraction cannot find a table worth keeping.
+
+    Tables without a keyword are discarded anyway, and the "lines" strategy
+    only builds cells from ruling edges (the page's line, rect and curve
+    objects), so a page is skipped unless ``_ruled_grid`` finds edges that
+    can bound two rows. Both checks are cheap next to ``extract_tables``.
+    With ``text_tables``, keyword pages without a ruled grid are searched for
+    borderless tables with the "text" strategy instead of being skipped.
+    """
+    text = page_text.lower()
+    if not any(keyword in text for keyword in TABLE_KEYWORDS):
+        return None
+    if (page.lines or page.rects or page.curves) and _ruled_grid(page.edges):
+        return LINE_TABLE_SETTINGS
+    return TEXT_TABLE_SETTINGS if text_tables else None
+
+
+def _ruled_grid(edges: List[Dict[str, Any]], tolerance: float = 3, max_edges: int = 400) -> bool:
+    """Whether three horizontal edges each cross two vertical ones, the least a two-row table needs.
+
+    A page frame, with or without header and footer rules outside it, has
+    only two such horizontals. Pages with very many edges are assumed to
+    hold tables rather than checked pairwise.
+    """
+    if len(edges) > max_edges:
+        return True
+    vertical = [edge for edge in edges if edge["orientation"] == "v"]
+    if len(vertical) < 2:
+        return False
+
+    crossing = 0
+    for edge in edges:
+        if edge["orientation"] != "h":
+            continue
+        crossed = sum(
+            1 for v in vertical
+            if edge["x0"] - tolerance <= v["x0"] <= edge["x1"] + tolerance
+            and v["top"] - tolerance <= edge["top"] <= v["bottom"] + tolerance
+        )
+        if crossed >= 2:
+            crossing += 1
+            if crossing >= 3:
+                return True
+    return False
+
+
+def iter_page_range(pdf_path: str, start: int, end: Optional[int] = None, table_prepass: bool = True,
+                    text_tables: bool = False, counts: Optional[Dict[str, int]] = None) -> Iterator[Page]:
+    """Yield (page number, text, tables) for pages ``start..end-1`` (0-based).
+
+    With ``table_prepass``, tables are only extracted from pages that
+    ``table_settings`` selects; ``counts`` tallies extracted and skipped pages.
+    """
+    counts = counts if counts is not None else {}
+    with pdfplumber.open(pdf_path) as pdf:
+        for index in range(start, len(pdf.pages) if end is None else end):
+            page = pdf.pages[index]
+            page_text = page.extract_text() or ""
+            if table_prepass:
+                settings = table_settings(page, page_text, text_tables)
+                tables = page.extract_tables(settings) if settings is not None else []
+            else:
+                settings = LINE_TABLE_SETTINGS
+                tables = page.extract_tables()
+            result = "skipped" if settings is None else "extracted"
+            counts[result] = counts.get(result, 0) + 1
+            yield index + 1, page_text, tables or []
+            page.flush_cache()
+
+
+def extract_page_range(pdf_path: str, start: int, end: int, table_prepass: bool = True,
+                       text_tables: bool = False) -> Tuple[List[Page], Dict[str, int]]:
+    """Worker entry point: opens the PDF itself and returns the whole range and its table counts."""
+    counts: Dict[str, int] = {}
+    pages = list(iter_page_range(pdf_path, start, end, table_prepass, text_tables, counts))
+    return pages, counts
+
+
+def count_pages(pdf_path: str) -> int:
+    with pdfplumber.open(pdf_path) as pdf:
+        return len(pdf.pages)
+
+
+def iter_pages(pdf_path: str, pool: Optional[Executor] = None, pages_per_task: int = 16,
+               table_prepass: bool = True, text_tables: bool = False,
+               counts: Optional[Dict[str, int]] = None, max_in_flight: int = 2) -> Iterator[Page]:
+    """Yield pages in order, extracting page ranges in ``pool`` when given.
+
+    Without a pool the pages are extracted serially in this process. With a
+    pool, ranges of ``pages_per_task`` pages are extracted in parallel and
+    yielded in page order. At most ``max_in_flight`` ranges (about the pool's
+    workers plus one) are queued or running besides the one being yielded,
+    so a slow consumer does not let extracted pages pile up. Pages whose
+    table extraction was skipped or run are added to ``counts`` and the
+    ``TABLE_PAGES`` counter.
+    """
+    counts = counts if counts is not None else {}
+    try:
+        if pool is None:
+            yield from iter_page_range(pdf_path, 0, None, table_prepass, text_tables, counts)
+            return
+
+        page_count = count_pages(pdf_path)
+        if page_count <= pages_per_task:
+            yield from iter_page_range(pdf_path, 0, page_count, table_prepass, text_tables, counts)
+            return
+
+        starts = iter(range(0, page_count, pages_per_task))
+        futures: deque = deque()
+
+        def submit_next():
+            start = next(starts, None)
+            if start is not None:
+                futures.append(pool.submit(extract_page_range, pdf_path, start,
+                                           min(start + pages_per_task, page_count), table_prepass, text_tables))
+
+        try:
+            for _ in range(max(1, max_in_flight)):
+                submit_next()
+            while futures:
+                pages, range_counts = futures.popleft().result()
+                submit_next()
+                for result, count in range_counts.items():
+                    counts[result] = counts.get(result, 0) + count
+                yield from pages
+        finally:
+            for future in futures:
+                future.cancel()
+    finally:
+        for result in ("extracted", "skipped"):
+            TABLE_PAGES.inc(counts.get(result, 0), result=result)
+        if counts:
+            logger.info(f"Table extraction for {pdf_path}: {counts.get('extracted', 0)} pages extracted, "
+                        f"{counts.get('skipped', 0)} skipped")
@@ -0,0 +1,101 @@
+import queue
+import contextvars
+import threading
+import logging
+from typing import Any, Callable, Iterable, Iterator, List
+
+logger = logging.getLogger(__name__)
+
+_END = object()
+
+
+class StreamingPipeline:
+    """Chain generator stages with bounded queues, one thread per stage.
+
+    ``run(source, stages, sink)`` iterates ``source`` in a producer thread and
+    feeds each stage the output of the previous one. Every stage is a function
+    taking an iterator and returning an iterator, so it can batch or fan out
+    items freely. The sink runs in the calling thread. Queues hold at most
+    ``queue_size`` items, which bounds memory and applies back-pressure to the
+    faster stages. The first error in any stage stops the whole pipeline and
+    is re-raised from ``run``.
+    """
+
+    POLL_SECONDS = 0.1
+
+    def __init__(self, queue_size: int = 8, name: str = "pipeline"):
+        self.queue_size = queue_size
+        self.name = name
+
+    def run(self, source: Iterable, stages: List[Callable[[Iterator], Iterator]],
+            sink: Callable[[Any], None]):
+        stop = threading.Event()
+        errors: List[BaseException] = []
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in range(len(stages) + 1)]
+
+        # Each stage runs in a copy of the caller's context (e.g. request traces)
+        threads = [threading.Thread(
+            target=contextvars.copy_context().run,
+            args=(self._produce, lambda: iter(source), queues[0], stop, errors),
+            name=f"{self.name}-source",
+            daemon=True
+        )]
+        for i, stage in enumerate(stages):
+            threads.append(threading.Thread(
+                target=contextvars.copy_context().run,
+                args=(self._produce, lambda stage=stage, inbox=queues[i]: stage(self._drain(inbox, stop)),
+                      queues[i + 1], stop, errors),
+                name=f"{self.name}-stage-{i + 1}",
+                daemon=True
+            ))
+
+        for thread in threads:
+            thread.start()
+
+        try:
+            for item in self._drain(queues[-1], stop):
+                sink(item)
+        except BaseException as e:
+            errors.append(e)
+            stop.set()
+        finally:
+            for thread in threads:
+                thread.join()
+
+        if errors:
+            raise errors[0]
+
+    def _produce(self, make_items: Callable[[], Iterator], outbox: queue.Queue,
+                 stop: threading.Event, errors: List[BaseException]):
+        """Push items from an iterator downstream, then an end marker."""
+        try:
+            for item in make_items():
+                if not self._put(outbox, item, stop):
+                    return
+        except BaseException as e:
+            logger.error(f"{self.name} stage failed: {e}")
+            errors.append(e)
+            stop.set()
+            return
+        self._put(outbox, _END, stop)
+
+    def _put(self, outbox: queue.Queue, item: Any, stop: threading.Event) -> bool:
+        while not stop.is_set():
+            try:
+                outbox.put(item, timeout=self.POLL_SECONDS)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _drain(self, inbox: queue.Queue, stop: threading.Event) -> Iterator:
+        while True:
+            try:
+                item = inbox.get(timeout=self.POLL_SECONDS)
+            except queue.Empty:
+                if stop.is_set():
+                    return
+                continue
+            if item is _END:
+                return
+            yield item
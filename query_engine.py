@@ -1,46 +1,135 @@
 import re
-from typing import List, Dict, Any
-from sentence_transformers import SentenceTransformer
+from typing import List, Dict, Any, Optional
 import logging
 from config import Config
 from answer_generator import AnswerGenerator
-
-# Handle different Pinecone versions
-try:
-    from pinecone import Pinecone
-    PINECONE_V3 = True
-except ImportError:
-    try:
-        import pinecone
-        PINECONE_V3 = False
-    except ImportError:
-        raise ImportError("Pinecone is not installed.")
+from bm25_index import BM25Index, LexicalIndexStore
+from embedding_service import get_embedding_service
+from metrics import timed, CACHE_REQUESTS, RETRIEVAL_SCORE, ANSWER_CONFIDENCE
+from query_cache import LRUCache, normalize_query
+from sentence_store import Sentence, SentenceStore
+from vector_store import VectorStore, create_vector_store
 
 logger = logging.getLogger(__name__)
 
+
+class QueryPlan:
+    """Retrieval inputs computed for a question before it is answered.
+
+    ``lexical`` holds the BM25 hits in hybrid mode (None otherwise) and
+    ``embedding`` the query embedding, None when the lexical fast path will
+    answer the question.
+    """
+
+    __slots__ = ("embedding", "lexical")
+
+    def __init__(self, embedding: Optional[List[float]] = None,
+                 lexical: Optional[List[Dict[str, Any]]] = None):
+        self.embedding = embedding
+        self.lexical = lexical
+
+
 class ImprovedQueryEngine:
-    def __init__(self, config: Config):
+    def __init__(self, config: Config, vector_store: Optional[VectorStore] = None):
         self.config = config
-        self.embedder = SentenceTransformer(config.EMBEDDING_MODEL_NAME)
+        self.embedder = get_embedding_service(config)
         self.answer_generator = AnswerGenerator()
+        self.vector_store = vector_store or create_vector_store(config)
+        
+        # Level 1: expanded query -> embedding. Level 2: (document, question, version) -> result
+        self.embedding_cache = LRUCache(config.QUERY_EMBEDDING_CACHE_SIZE, config.QUERY_CACHE_TTL_SECONDS)
+        self.result_cache = LRUCache(config.ANSWER_CACHE_SIZE, config.QUERY_CACHE_TTL_SECONDS)
+        self.cache_version = (f"{config.EMBEDDING_MODEL_NAME}:{config.TOP_K_RESULTS}:{config.CHUNK_SIZE}:"
+                              f"{config.RETRIEVAL_MODE}:{config.ANSWER_CACHE_VERSION}")
+        
+        # Per-document BM25 indexes for hybrid retrieval
+        self.lexical_store = LexicalIndexStore(config)
+        self.lexical_indexes = LRUCache(config.LEXICAL_INDEX_CACHE_SIZE, config.QUERY_CACHE_TTL_SECONDS)
+        
+        # Pre-split chunk sentences written at ingestion
+        self.sentence_store = SentenceStore(config)
+        self.document_sentences = LRUCache(config.LEXICAL_INDEX_CACHE_SIZE, config.QUERY_CACHE_TTL_SECONDS)
+    
+    def plan_queries(self, questions: List[str], document_id: Optional[str] = None) -> List[QueryPlan]:
+        """Search and embed several questions, embedding them as one micro-batch.
+        
+        With a document_id in hybrid mode, each question is searched with BM25
+        once; questions that the lexical fast path will answer are not
+        embedded. Pass each plan to ``query`` so the work is not repeated.
+        """
+        index = self._get_lexical_index(document_id) if document_id else None
+        lexical: List[Optional[List[Dict[str, Any]]]] = [None] * len(questions)
+        if index is not None:
+            with timed("lexical_search"):
+                lexical = [index.search(question, self.config.TOP_K_RESULTS) for question in questions]
+        keys = [
+            None if self._is_lexical_hit(hits) else self._embedding_key(question)
+            for question, hits in zip(questions, lexical)
+        ]
+        found = {key: self._cached_embedding(key) for key in set(keys) if key is not None}
+        
+        # Only encode the questions not already cached
+        missing = sorted(key for key, embedding in found.items() if embedding is None)
+        if missing:
+            with timed("embed_queries"):
+                embeddings = self.embedder.encode_queries(missing).tolist()
+            for key, embedding in zip(missing, embeddings):
+                self.embedding_cache.put(key, embedding)
+                found[key] = embedding
+        
+        return [
+            QueryPlan(found[key] if key is not None else None, hits)
+            for key, hits in zip(keys, lexical)
+        ]
+    
+    def invalidate_document(self, document_id: str):
+        """Drop cached answers and indexes for a document that was (re-)ingested."""
+        self.lexical_indexes.invalidate(lambda key: key == document_id)
+        self.document_sentences.invalidate(lambda key: key == document_id)
+        dropped = self.result_cache.invalidate(lambda key: key[0] == document_id)
+        if dropped:
+            logger.info(f"Invalidated {dropped} cached answers for document {document_id}")
+    
+    def cache_stats(self) -> Dict[str, Dict[str, Any]]:
+        return {
+            "query_embeddings": self.embedding_cache.stats(),
+            "answers": self.result_cache.stats()
+        }
+    
+    def query(self, question: str, document_id: str, plan: Optional[QueryPlan] = None) -> Dict[str, Any]:
+        """Process query and return answer, reusing the question's ``plan_queries`` result if given."""
+        cache_key = (document_id, normalize_query(question), self.cache_version)
+        cached = self.result_cache.get(cache_key)
+        CACHE_REQUESTS.inc(cache="answers", result="hit" if cached is not None else "miss")
+        if cached is not None:
+            return dict(cached)
+        
+        with timed("query"):
+            result = self._answer(question, document_id, plan)
+        self.result_cache.put(cache_key, result)
         
-        # Initialize Pinecone
-        if PINECONE_V3:
-            self.pc = Pinecone(api_key=config.PINECONE_API_KEY)
-            self.index = self.pc.Index(config.PINECONE_INDEX_NAME)
-        else:
-            pinecone.init(api_key=config.PINECONE_API_KEY, environment="us-east-1-aws")
-            self.index = pinecone.Index(config.PINECONE_INDEX_NAME)
+        if result["sources"] and result["sources"][0]["score"] is not None:
+            RETRIEVAL_SCORE.observe(result["sources"][0]["score"])
+        if result["confidence"] is not None:
+            ANSWER_CONFIDENCE.observe(result["confidence"])
+        return dict(result)
     
-    def query(self, question: str, document_id: str) -> Dict[str, Any]:
-        """Process query and return answer."""
+    def _answer(self, question: str, document_id: str, plan: Optional[QueryPlan] = None) -> Dict[str, Any]:
+        """Retrieve chunks and generate an answer (uncached)."""
         
         # Get relevant chunks
-        relevant_chunks = self._retrieve_chunks(question, document_id)
+        relevant_chunks = self._retrieve_chunks(question, document_id, plan)
         
         # Generate answer
         chunk_texts = [chunk["metadata"]["text"] for chunk in relevant_chunks]
-        answer = self.answer_generator.generate_answer(question, chunk_texts)
+        sentences = self._get_sentences(document_id)
+        chunk_sentences = [sentences.get(chunk["id"]) for chunk in relevant_chunks] if sentences else None
+        query_embedding = plan.embedding if plan is not None else None
+        if query_embedding is None:
+            # Embedded during retrieval unless the lexical fast path answered; never encoded just for this
+            query_embedding = self.embedding_cache.get(self._embedding_key(question))
+        with timed("generate_answer"):
+            answer = self.answer_generator.generate_answer(question, chunk_texts, chunk_sentences, query_embedding)
         
         # Calculate confidence
         confidence = self._calculate_confidence(relevant_chunks)
@@ -49,34 +138,124 @@ class ImprovedQueryEngine:
             "question": question,
             "answer": answer,
             "confidence": confidence,
-            "sources": [
-                {
-                    "page": chunk["metadata"]["page"],
-                    "type": chunk["metadata"]["type"],
-                    "score": chunk["score"]
-                }
-                for chunk in relevant_chunks[:2]
-            ]
+            "sources": [self._source(chunk) for chunk in relevant_chunks[:2]]
         }
     
-    def _retrieve_chunks(self, query: str, document_id: str) -> List[Dict[str, Any]]:
+    def _retrieve_chunks(self, query: str, document_id: str,
+                         plan: Optional[QueryPlan] = None) -> List[Dict[str, Any]]:
+        """Retrieve relevant chunks using semantic and, in hybrid mode, lexical search.
+        
+        Dense matches carry the cosine similarity as ``score``; lexical ones
+        carry the share of the query's IDF mass they match as ``coverage``,
+        and fused results also their reciprocal rank fusion value as ``rrf``.
+        """
+        query_embedding = plan.embedding if plan is not None else None
+        index = self._get_lexical_index(document_id)
+        if index is None:
+            return self._dense_search(query, document_id, query_embedding)
+        
+        lexical = plan.lexical if plan is not None else None
+        if lexical is None:
+            with timed("lexical_search"):
+                lexical = index.search(query, self.config.TOP_K_RESULTS)
+        if self._is_lexical_hit(lexical):
+            # Strong term match: skip embedding and vector search entirely
+            return lexical
+        
+        dense = self._dense_search(query, document_id, query_embedding)
+        return self._fuse_results(dense, lexical)
+    
+    def search_chunks(self, query: str, document_ids: Optional[List[str]] = None,
+                      top_k: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Semantic search across several documents, or all of them when document_ids is None.
+        
+        Intended for comparing clauses across policies; scales with the "ann"
+        vector store backend, which does not scan every document.
+        """
+        filter = {"document_id": {"$in": list(document_ids)}} if document_ids is not None else None
+        with timed("vector_search"):
+            return self.vector_store.query(
+                self._query_embedding(query),
+                top_k=top_k or self.config.TOP_K_RESULTS,
+                filter=filter
+            )
+    
+    def _dense_search(self, query: str, document_id: str,
+                      query_embedding: Optional[List[float]] = None) -> List[Dict[str, Any]]:
         """Retrieve relevant chunks using semantic search."""
+        if query_embedding is None:
+            query_embedding = self._query_embedding(query)
+        
+        # Search in the vector store
+        with timed("vector_search"):
+            return self.vector_store.query(
+                query_embedding,
+                top_k=self.config.TOP_K_RESULTS,
+                filter={"document_id": document_id}
+            )
+    
+    def _query_embedding(self, query: str) -> List[float]:
+        """Embedding of a query, from the cache or a micro-batched encode."""
+        key = self._embedding_key(query)
+        query_embedding = self._cached_embedding(key)
+        if query_embedding is None:
+            with timed("embed_query"):
+                query_embedding = self.embedder.encode_query(key).tolist()
+            self.embedding_cache.put(key, query_embedding)
+        return query_embedding
+    
+    def _cached_embedding(self, key: str) -> Optional[List[float]]:
+        embedding = self.embedding_cache.get(key)
+        CACHE_REQUESTS.inc(cache="query_embeddings", result="hit" if embedding is not None else "miss")
+        return embedding
+    
+    def _embedding_key(self, query: str) -> str:
+        """Text that gets embedded for a query (and its cache key)."""
+        if self.config.RETRIEVAL_MODE == "hybrid":
+            # Exact terms are handled by BM25, so no synonym expansion
+            return normalize_query(query)
         
         # Expand query with synonyms
-        expanded_query = self._expand_query(query)
+        return normalize_query(self._expand_query(query))
+    
+    def _get_lexical_index(self, document_id: str) -> Optional[BM25Index]:
+        """BM25 index of a document in hybrid mode, or None."""
+        if self.config.RETRIEVAL_MODE != "hybrid":
+            return None
         
-        # Get embedding
-        query_embedding = self.embedder.encode(expanded_query).tolist()
+        index = self.lexical_indexes.get(document_id)
+        if index is None:
+            index = self.lexical_store.load(document_id)
+            if index is not None:
+                self.lexical_indexes.put(document_id, index)
+        return index
+    
+    def _get_sentences(self, document_id: str) -> Optional[Dict[str, List[Sentence]]]:
+        """Pre-split sentences of a document keyed by vector id, if stored."""
+        sentences = self.document_sentences.get(document_id)
+        if sentences is None:
+            sentences = self.sentence_store.load(document_id)
+            if sentences is not None:
+                self.document_sentences.put(document_id, sentences)
+        return sentences
+    
+    def _is_lexical_hit(self, lexical: List[Dict[str, Any]]) -> bool:
+        """Whether the top BM25 match covers enough of the query on its own."""
+        return bool(lexical) and lexical[0]["coverage"] >= self.config.LEXICAL_FAST_PATH_COVERAGE
+    
+    def _fuse_results(self, dense: List[Dict[str, Any]], lexical: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Merge dense and lexical hits with reciprocal rank fusion."""
+        fused: Dict[str, Dict[str, Any]] = {}
         
-        # Search in Pinecone
-        results = self.index.query(
-            vector=query_embedding,
-            filter={"document_id": document_id},
-            top_k=5,
-            include_metadata=True
-        )
+        for results in (dense, lexical):
+            for rank, match in enumerate(results):
+                # Dense and lexical fields do not overlap, so a chunk found by both keeps both
+                entry = fused.setdefault(match["id"], {"match": {"score": None}, "rrf": 0.0})
+                entry["match"].update(match)
+                entry["rrf"] += 1.0 / (self.config.RRF_K + rank + 1)
         
-        return results.get("matches", [])
+        ranked = sorted(fused.values(), key=lambda entry: entry["rrf"], reverse=True)
+        return [dict(entry["match"], rrf=entry["rrf"]) for entry in ranked[:self.config.TOP_K_RESULTS]]
     
     def _expand_query(self, query: str) -> str:
         """Expand query with synonyms and related terms."""
@@ -98,15 +277,22 @@ class ImprovedQueryEngine:
         
         return " ".join(expansions)
     
-    def _calculate_confidence(self, chunks: List[Dict[str, Any]]) -> float:
-        """Calculate confidence score based on retrieval results."""
-        if not chunks:
-            return 0.0
-        
-        # Average of top scores
-        scores = [chunk["score"] for chunk in chunks[:3]]
+    @staticmethod
+    def _source(chunk: Dict[str, Any]) -> Dict[str, Any]:
+        """Page, type and dense similarity of a chunk, with its BM25 coverage if it was matched lexically."""
+        source = {"page": chunk["metadata"]["page"], "type": chunk["metadata"]["type"], "score": chunk.get("score")}
+        if "coverage" in chunk:
+            source["coverage"] = chunk["coverage"]
+        return source
+    
+    def _calculate_confidence(self, chunks: List[Dict[str, Any]]) -> Optional[float]:
+        """Confidence from the dense similarity of the top chunks; None when only BM25 found them."""
+        # Average of top scores (BM25 coverage is on another scale and not mixed in)
+        scores = [chunk["score"] for chunk in chunks[:3] if chunk.get("score") is not None]
+        if not scores:
+            return None if chunks else 0.0
         avg_score = sum(scores) / len(scores)
         
         # Convert to percentage
         confidence = min(avg_score * 100, 95.0)  # Cap at 95%
-        return round(confidence, 1)
\ No newline at end of file
+        return round(confidence, 1)
@@ -0,0 +1,137 @@
+import math
+import time
+import asyncio
+import functools
+import logging
+from concurrent.futures import Executor
+from typing import Any, Callable, Optional
+from config import Config
+from metrics import ADMISSION_DECISIONS, POOL_IN_FLIGHT
+
+logger = logging.getLogger(__name__)
+
+
+class Overloaded(Exception):
+    """A request rejected before any work started; answered with ``status_code`` and Retry-After.
+
+    ``retry_after`` is None for requests that cannot succeed on retry.
+    """
+
+    def __init__(self, status_code: int, detail: str, retry_after: Optional[float]):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+        self.retry_after = max(1, math.ceil(retry_after)) if retry_after is not None else None
+
+
+class AdmissionPool:
+    """Bounded concurrency for one kind of blocking work, with a completion-time estimate.
+
+    Tasks wait on a semaphore of ``concurrency`` slots and then run in
+    ``executor``. Service time is tracked as an exponentially weighted
+    moving average, so ``estimate_seconds`` reflects the current load.
+    """
+
+    SMOOTHING = 0.2  # Weight of the newest sample in the moving average
+
+    def __init__(self, name: str, executor: Executor, concurrency: int, initial_seconds: float):
+        self.name = name
+        self.executor = executor
+        self.concurrency = max(1, concurrency)
+        self.service_seconds = initial_seconds
+        self.running = 0
+        self.waiting = 0
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+
+    def estimate_seconds(self, tasks: int = 1) -> float:
+        """Seconds until ``tasks`` new tasks would finish, behind the work already admitted."""
+        ahead = self.running + self.waiting
+        return self.service_seconds * (1 + (ahead + max(1, tasks) - 1) // self.concurrency)
+
+    async def run(self, func: Callable, *args) -> Any:
+        self.waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+
+        self.running += 1
+        POOL_IN_FLIGHT.set(self.running, pool=self.name)
+        start = time.perf_counter()
+        future = asyncio.get_running_loop().run_in_executor(self.executor, functools.partial(func, *args))
+        # The slot is held until the thread finishes, even if the caller stops waiting
+        future.add_done_callback(lambda _: self._release(time.perf_counter() - start))
+        return await asyncio.shield(future)
+
+    def _release(self, elapsed: float):
+        self.service_seconds += self.SMOOTHING * (elapsed - self.service_seconds)
+        self.running -= 1
+        POOL_IN_FLIGHT.set(self.running, pool=self.name)
+        self._semaphore.release()
+
+
+class RequestScheduler:
+    """Admission control in front of document ingestion and question answering.
+
+    Ingestion runs on the ``IngestionJobs`` workers and queries in their own
+    ``AdmissionPool``, so cold documents cannot hold up questions about
+    documents that are already ingested. ``admit`` rejects a request up front
+    when a queue is full, or when the estimated ingestion plus answering time
+    exceeds its deadline: 503 if ingestion is the bottleneck (the ingestion
+    is still started, so the retry finds the document ready), 429 otherwise.
+    """
+
+    def __init__(self, config: Config, doc_processor, ingestion_jobs, executor: Executor):
+        self.config = config
+        self.doc_processor = doc_processor
+        self.ingestion_jobs = ingestion_jobs
+        self.queries = AdmissionPool("query", executor, config.REQUEST_WORKERS, config.QUERY_ESTIMATE_SECONDS)
+
+    def deadline(self, budget_seconds: Optional[float]) -> Optional[float]:
+        """Monotonic deadline for a budget in seconds; falls back to REQUEST_DEADLINE_SECONDS (0 = none)."""
+        budget = budget_seconds if budget_seconds is not None else self.config.REQUEST_DEADLINE_SECONDS
+        return time.monotonic() + budget if budget and budget > 0 else None
+
+    def admit(self, url: str, questions: int, deadline: Optional[float]):
+        """Raise ``Overloaded`` unless the request can plausibly finish before ``deadline``."""
+        cold = self.doc_processor.cached_document_id(url) is None
+        ingest_seconds = self.ingestion_jobs.estimate_seconds(url, cold)
+        # One embedding call for all questions, then the questions themselves
+        query_seconds = self.queries.estimate_seconds(1) + self.queries.estimate_seconds(questions)
+
+        self._check_ingestion_queue(url, cold, ingest_seconds)
+        if questions > self.config.QUERY_MAX_WAITING:
+            # Could never be admitted, so a client error rather than 429
+            self._reject(413, f"At most {self.config.QUERY_MAX_WAITING} questions per request", None,
+                         "too_many_questions")
+        if self.queries.waiting + questions > self.config.QUERY_MAX_WAITING:
+            self._reject(429, "Too many questions queued", query_seconds, "query_queue_full")
+
+        if deadline is not None:
+            budget = deadline - time.monotonic()
+            estimate = ingest_seconds + query_seconds
+            if estimate > budget:
+                detail = f"Estimated {estimate:.1f}s exceeds the {max(budget, 0):.1f}s deadline"
+                if ingest_seconds > query_seconds:
+                    if cold:
+                        self.ingestion_jobs.submit(url)  # Ready by the time the client retries
+                    self._reject(503, detail, ingest_seconds, "over_deadline")
+                self._reject(429, detail, query_seconds, "over_deadline")
+        ADMISSION_DECISIONS.inc(decision="admitted")
+
+    def admit_ingestion(self, url: str):
+        """Raise ``Overloaded`` (503) if ingesting ``url`` would start a job beyond INGESTION_MAX_QUEUE."""
+        cold = self.doc_processor.cached_document_id(url) is None
+        self._check_ingestion_queue(url, cold, self.ingestion_jobs.estimate_seconds(url, cold))
+        ADMISSION_DECISIONS.inc(decision="admitted")
+
+    def _check_ingestion_queue(self, url: str, cold: bool, ingest_seconds: float):
+        """Reject a new document while INGESTION_MAX_QUEUE jobs are queued or running."""
+        if cold and not self.ingestion_jobs.is_active(url) \
+                and self.ingestion_jobs.backlog() >= self.config.INGESTION_MAX_QUEUE:
+            self._reject(503, "Ingestion queue is full", ingest_seconds, "ingestion_queue_full")
+
+    def _reject(self, status_code: int, detail: str, retry_after: Optional[float], reason: str):
+        ADMISSION_DECISIONS.inc(decision=reason)
+        logger.warning(f"Rejecting request ({status_code}): {detail}")
+        raise Overloaded(status_code, detail, retry_after)
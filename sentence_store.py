@@ -0,0 +1,117 @@
+import os
+import re
+import json
+import logging
+import numpy as np
+from typing import List, Dict, Any, Optional, Tuple
+from config import Config
+from ann_index import normalize_rows
+
+logger = logging.getLogger(__name__)
+
+SENTENCE_SPLIT = re.compile(r'[.!?]+')
+WORD_PATTERN = re.compile(r'\b\w+\b')
+
+
+class Sentence:
+    """A sentence with its lowercase form, word set and (if stored) unit-length embedding."""
+
+    __slots__ = ("text", "lower", "tokens", "vector")
+
+    def __init__(self, text: str, lower: Optional[str] = None, tokens: Optional[List[str]] = None,
+                 vector: Optional[np.ndarray] = None):
+        self.text = text
+        self.lower = text.lower() if lower is None else lower
+        self.tokens = frozenset(WORD_PATTERN.findall(self.lower) if tokens is None else tokens)
+        self.vector = vector
+
+    def __repr__(self):
+        return f"Sentence({self.text!r})"
+
+
+def split_sentences(text: str) -> List[Sentence]:
+    """Split text on sentence punctuation into stripped, non-empty sentences."""
+    return [Sentence(part.strip()) for part in SENTENCE_SPLIT.split(text) if part.strip()]
+
+
+class SentenceStore:
+    """Pre-split, pre-tokenized sentences for every chunk of a document.
+
+    Written once at ingestion as ``<SENTENCE_STORE_DIR>/<document_id>.json``
+    (vector id -> list of ``[text, tokens]``) so answer extraction does not
+    re-split and re-tokenize retrieved chunks on every question.
+
+    Given the sentence embeddings of every chunk, ``save`` also stores them
+    unit-length as a float16 matrix, ``<document_id>.npy``, with rows in the
+    order of the JSON payload. ``load`` memory-maps it and gives
+    each sentence its row as ``vector``.
+    """
+
+    def __init__(self, config: Config):
+        self.root = config.SENTENCE_STORE_DIR
+        os.makedirs(self.root, exist_ok=True)
+
+    def save(self, document_id: str, chunks: List[Tuple[str, str]],
+             embeddings: Optional[Dict[str, np.ndarray]] = None):
+        """Split and store the sentences of ``(vector id, text)`` pairs.
+
+        ``embeddings`` maps each vector id to the embeddings of its sentences,
+        one row per sentence of ``split_sentences(text)``.
+        """
+        payload = {
+            vector_id: [[s.text, sorted(s.tokens)] for s in split_sentences(text)]
+            for vector_id, text in chunks
+        }
+        texts = [text for sentences in payload.values() for text, _ in sentences]
+
+        # The matrix goes first; load ignores one whose row count does not match the sentences
+        matrix_path = self._matrix_path(document_id)
+        if embeddings is not None and texts:
+            rows = np.vstack([embeddings[vector_id] for vector_id, sentences in payload.items() if sentences])
+            matrix = normalize_rows(np.asarray(rows, dtype=np.float32)).astype(np.float16)
+            with open(matrix_path + ".tmp", "wb") as f:
+                np.save(f, matrix)
+            os.replace(matrix_path + ".tmp", matrix_path)
+        elif os.path.exists(matrix_path):
+            os.remove(matrix_path)
+
+        path = self._path(document_id)
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(payload, f)
+        os.replace(path + ".tmp", path)
+        logger.info(f"Saved sentences for {document_id}: {len(texts)} sentences"
+                    f"{' with embeddings' if embeddings is not None and texts else ''}")
+
+    def load(self, document_id: str) -> Optional[Dict[str, List[Sentence]]]:
+        path = self._path(document_id)
+        if not os.path.exists(path):
+            return None
+
+        with open(path, "r", encoding="utf-8") as f:
+            payload: Dict[str, Any] = json.load(f)
+
+        matrix = self._load_matrix(document_id, sum(len(sentences) for sentences in payload.values()))
+        rows = iter(range(len(matrix))) if matrix is not None else None
+        return {
+            vector_id: [
+                Sentence(text, tokens=tokens, vector=matrix[next(rows)] if matrix is not None else None)
+                for text, tokens in sentences
+            ]
+            for vector_id, sentences in payload.items()
+        }
+
+    def _load_matrix(self, document_id: str, sentences: int) -> Optional[np.ndarray]:
+        path = self._matrix_path(document_id)
+        if not os.path.exists(path):
+            return None
+        matrix = np.load(path, mmap_mode="r")
+        if len(matrix) != sentences:
+            logger.warning(f"Sentence embeddings of {document_id} do not match its sentences, ignoring them")
+            return None
+        return matrix
+
+    def _path(self, document_id: str) -> str:
+        return os.path.join(self.root, f"{document_id}.json")
+
+    def _matrix_path(self, document_id: str) -> str:
+        return os.path.join(self.root, f"{document_id}.npy")
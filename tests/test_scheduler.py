@@ -0,0 +1,67 @@
+"""Admission control: warm documents bypass the ingestion pool; impossible requests are client errors."""
+import os
+import sys
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import replace
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Config
+from ingestion_jobs import IngestionJobs
+from scheduler import Overloaded, RequestScheduler
+
+CONFIG = replace(Config(), INGESTION_WORKERS=2, QUERY_MAX_WAITING=8, QUERY_ESTIMATE_SECONDS=0.05)
+
+
+class FakeProcessor:
+    """Registry hits for "warm" URLs; cold URLs ingest until released."""
+
+    def __init__(self):
+        self.release = threading.Event()
+
+    def fresh_document_id(self, url):
+        return f"doc-{url}" if url.startswith("warm") else None
+
+    def cached_document_id(self, url):
+        return self.fresh_document_id(url)
+
+    def process_document(self, url, progress=None):
+        self.release.wait(10)
+        return f"doc-{url}"
+
+
+@pytest.fixture
+def scheduler():
+    processor = FakeProcessor()
+    jobs = IngestionJobs(CONFIG, processor)
+    executor = ThreadPoolExecutor(max_workers=2)
+    yield RequestScheduler(CONFIG, processor, jobs, executor)
+    processor.release.set()
+    executor.shutdown()
+
+
+def test_warm_request_meets_deadline_while_cold_jobs_run(scheduler):
+    jobs = scheduler.ingestion_jobs
+    cold = [jobs.submit(f"cold-{n}") for n in range(CONFIG.INGESTION_WORKERS)]
+    time.sleep(0.05)
+    assert all(job.status == "running" for job in cold)
+
+    deadline = scheduler.deadline(0.5)
+    scheduler.admit("warm", 1, deadline)
+    job = jobs.submit("warm")
+    assert job.future.result(timeout=max(0.0, deadline - time.monotonic())) == "doc-warm"
+    assert time.monotonic() < deadline
+    assert not any(job.done() for job in cold)
+
+
+def test_more_questions_than_the_queue_holds_is_a_client_error(scheduler):
+    with pytest.raises(Overloaded) as rejected:
+        scheduler.admit("warm", CONFIG.QUERY_MAX_WAITING + 1, None)
+    assert rejected.value.status_code == 413
+    assert rejected.value.retry_after is None
+
+    scheduler.admit("warm", CONFIG.QUERY_MAX_WAITING, None)
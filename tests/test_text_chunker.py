@@ -0,0 +1,74 @@
+"""TextChunker must produce the chunks of the original whole-document chunker."""
+import os
+import sys
+import random
+from dataclasses import replace
+from typing import List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Config
+from text_chunker import PAGE_SEPARATOR, SENTENCE_BOUNDARY, TextChunker
+
+CONFIG = Config()
+
+
+def reference_chunks(pages: List[str], chunk_size: int) -> List[str]:
+    """The original ``_create_chunks`` loop over the whole document text (blank sentences dropped)."""
+    sentences = [s for s in SENTENCE_BOUNDARY.split(PAGE_SEPARATOR.join(pages)) if s.strip()]
+    chunks, current, current_length = [], [], 0
+    for sentence in sentences:
+        if current_length + len(sentence) > chunk_size and current:
+            chunks.append(" ".join(current))
+            current = [current[-1], sentence]
+            current_length = sum(len(s) for s in current)
+        else:
+            current.append(sentence)
+            current_length += len(sentence)
+    if current:
+        chunks.append(" ".join(current))
+    return chunks
+
+
+def chunk_texts(pages: List[str], config: Config = CONFIG) -> List[str]:
+    chunker = TextChunker(config)
+    chunks = []
+    for page_num, text in enumerate(pages, 1):
+        chunks.extend(chunker.add_page(page_num, text))
+    chunks.extend(chunker.finish())
+    assert [chunk["chunk_id"] for chunk in chunks] == [f"text_{n}" for n in range(len(chunks))]
+    return [chunk["text"] for chunk in chunks]
+
+
+def sentence(rnd: random.Random, length: int) -> str:
+    words = []
+    while sum(len(w) + 1 for w in words) < length:
+        words.append("".join(rnd.choice("abcdefghij") for _ in range(rnd.randint(2, 9))))
+    return " ".join(words) + rnd.choice(".!?")
+
+
+def test_long_sentences_are_not_repeated():
+    a, b, c = ("A" * 299 + ".", "B" * 299 + ".", "C" * 299 + ".")
+    assert chunk_texts([f"{a} {b} {c}"]) == [a, f"{a} {b}", f"{b} {c}"]
+
+
+def test_matches_reference_on_random_documents():
+    rnd = random.Random(5)
+    for _ in range(200):
+        pages = []
+        for _ in range(rnd.randint(1, 6)):
+            sentences = [sentence(rnd, rnd.choice([20, 80, 200, 300, 450, 700])) for _ in range(rnd.randint(0, 8))]
+            text = " ".join(sentences)
+            if sentences and rnd.random() < 0.3:
+                text = text[:-1]  # Sentence continues on the next page
+            pages.append(text)
+        assert chunk_texts(pages) == reference_chunks(pages, CONFIG.CHUNK_SIZE)
+
+
+def test_matches_reference_with_small_chunk_size():
+    rnd = random.Random(7)
+    config = replace(CONFIG, CHUNK_SIZE=100)
+    for _ in range(100):
+        pages = [" ".join(sentence(rnd, rnd.randint(10, 150)) for _ in range(rnd.randint(1, 10)))
+                 for _ in range(rnd.randint(1, 4))]
+        assert chunk_texts(pages, config) == reference_chunks(pages, 100)
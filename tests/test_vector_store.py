@@ -0,0 +1,35 @@
+"""Document filters behave the same on the local and in-memory backends."""
+import os
+import sys
+from dataclasses import replace
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Config
+from vector_store import InMemoryVectorStore, LocalVectorStore
+
+
+@pytest.fixture(params=[LocalVectorStore, InMemoryVectorStore])
+def store(request, tmp_path):
+    config = replace(Config(), LOCAL_VECTOR_STORE_DIR=str(tmp_path), EMBEDDING_DIMENSION=4)
+    store = request.param(config)
+    rng = np.random.default_rng(0)
+    store.upsert([
+        (f"{document}{i}", rng.random(4).tolist(), {"document_id": document, "text": "x"})
+        for document in "abc" for i in range(3)
+    ])
+    store.flush()
+    return store
+
+
+def test_single_document_filter(store):
+    matches = store.query([1.0, 0.0, 0.0, 0.0], top_k=9, filter={"document_id": "b"})
+    assert sorted(match["id"] for match in matches) == ["b0", "b1", "b2"]
+
+
+def test_in_document_filter(store):
+    matches = store.query([1.0, 0.0, 0.0, 0.0], top_k=9, filter={"document_id": {"$in": ["a", "c"]}})
+    assert sorted(match["id"] for match in matches) == ["a0", "a1", "a2", "c0", "c1", "c2"]
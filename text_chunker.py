@@ -0,0 +1,120 @@
+import re
+import bisect
+import logging
+from typing import List, Dict, Any, Tuple
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+SENTENCE_BOUNDARY = re.compile(r'(?<=[.!?])\s+')
+PAGE_SEPARATOR = "\n\n"
+
+
+class TextChunker:
+    """Incremental sentence chunker that tracks character offsets.
+
+    Pages are fed in order with ``add_page`` and completed chunks are returned
+    as soon as they are final; ``finish`` flushes the rest. Offsets refer to
+    the document text formed by joining all pages with a blank line. Each
+    chunk's first and last character are mapped to pages by bisecting the
+    page start offsets, so chunks crossing a page break carry both ``page``
+    and ``page_end``.
+
+    The chunk being built and the position of the first sentence not yet
+    placed in it carry over between pages, so the chunks are the ones a
+    single pass over the whole document would produce. Only the text of that
+    chunk is kept, so the cost per page is proportional to the page, not to
+    the document.
+    """
+
+    def __init__(self, config: Config):
+        self.config = config
+        self._buffer = ""
+        self._buffer_start = 0  # document offset of self._buffer[0]
+        self._page_starts: List[int] = []
+        self._page_numbers: List[int] = []
+        self._chunk_count = 0
+        self._current: List[Tuple[int, int]] = []  # Buffer spans of the chunk being built
+        self._current_length = 0
+        self._consumed = 0  # Buffer offset of the first sentence not yet in a chunk
+
+    def add_page(self, page_num: int, text: str) -> List[Dict[str, Any]]:
+        """Append a page and return the chunks it completed."""
+        separator = PAGE_SEPARATOR if self._page_starts else ""
+        self._page_starts.append(self._buffer_start + len(self._buffer) + len(separator))
+        self._page_numbers.append(page_num)
+        self._buffer += separator + text
+        return self._assemble(final=False)
+
+    def finish(self) -> List[Dict[str, Any]]:
+        """Return the remaining chunks once all pages have been added."""
+        return self._assemble(final=True)
+
+    def page_at(self, offset: int) -> int:
+        """Page number containing the document offset."""
+        index = bisect.bisect_right(self._page_starts, offset) - 1
+        return self._page_numbers[max(index, 0)] if self._page_numbers else 1
+
+    def _sentence_spans(self) -> List[Tuple[int, int]]:
+        """Non-empty (start, end) spans of sentences in the buffer."""
+        spans = []
+        start = 0
+        for boundary in SENTENCE_BOUNDARY.finditer(self._buffer):
+            spans.append((start, boundary.start()))
+            start = boundary.end()
+        spans.append((start, len(self._buffer)))
+        return [(s, e) for s, e in spans if e > s and not self._buffer[s:e].isspace()]
+
+    def _assemble(self, final: bool) -> List[Dict[str, Any]]:
+        """Group sentences into chunks with a one-sentence overlap."""
+        spans = [span for span in self._sentence_spans() if span[0] >= self._consumed]
+        if not final and spans:
+            # The last sentence may continue on the next page
+            spans, provisional = spans[:-1], spans[-1]
+        else:
+            provisional = None
+
+        chunks = []
+        for span in spans:
+            sentence_length = span[1] - span[0]
+
+            if self._current_length + sentence_length > self.config.CHUNK_SIZE and self._current:
+                chunks.append(self._make_chunk(self._current))
+                # Overlap with last sentence
+                self._current = [self._current[-1], span]
+                self._current_length = sum(e - s for s, e in self._current)
+            else:
+                self._current.append(span)
+                self._current_length += sentence_length
+
+        if final:
+            if self._current:
+                chunks.append(self._make_chunk(self._current))
+            self._current, self._current_length = [], 0
+            consumed = keep_from = len(self._buffer)
+        else:
+            # Without a provisional sentence only blank text follows; it starts the next sentence
+            consumed = provisional[0] if provisional else self._consumed
+            keep_from = self._current[0][0] if self._current else consumed
+
+        # Drop text that can no longer be part of a future chunk
+        self._buffer = self._buffer[keep_from:]
+        self._buffer_start += keep_from
+        self._current = [(s - keep_from, e - keep_from) for s, e in self._current]
+        self._consumed = consumed - keep_from
+        return chunks
+
+    def _make_chunk(self, spans: List[Tuple[int, int]]) -> Dict[str, Any]:
+        start = self._buffer_start + spans[0][0]
+        end = self._buffer_start + spans[-1][1]
+        chunk = {
+            "text": ' '.join(self._buffer[s:e] for s, e in spans),
+            "page": self.page_at(start),
+            "page_end": self.page_at(end - 1),
+            "type": "text",
+            "chunk_id": f"text_{self._chunk_count}",
+            "char_start": start,
+            "char_end": end
+        }
+        self._chunk_count += 1
+        return chunk
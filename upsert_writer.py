@@ -0,0 +1,194 @@
+import json
+import time
+import random
+import threading
+import logging
+from concurrent.futures import Future, ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import List, Dict, Any, Tuple
+import requests
+import urllib3
+from config import Config
+from metrics import timed, UPSERT_RETRIES, UPSERT_THROUGHPUT
+
+logger = logging.getLogger(__name__)
+
+Vector = Tuple[str, List[float], Dict[str, Any]]
+
+# Network failures from the standard library and the HTTP clients the index clients are built on
+TRANSPORT_ERRORS = (
+    ConnectionError,
+    TimeoutError,
+    urllib3.exceptions.ProtocolError,
+    urllib3.exceptions.TimeoutError,
+    urllib3.exceptions.NewConnectionError,
+    urllib3.exceptions.MaxRetryError,
+    requests.exceptions.ConnectionError,
+    requests.exceptions.Timeout,
+)
+
+
+def is_retryable(error: Exception) -> bool:
+    """Transient failures: throttling (429), server errors (5xx) and transport errors (timeouts, resets).
+
+    Anything else, such as a TypeError from a malformed vector, is raised at once.
+    """
+    status = getattr(error, "status", None) or getattr(error, "status_code", None)
+    if isinstance(status, int):
+        return status == 429 or status >= 500
+    return isinstance(error, TRANSPORT_ERRORS)
+
+
+def is_too_large(error: Exception) -> bool:
+    """The request was rejected for its size; a smaller batch may pass."""
+    status = getattr(error, "status", None) or getattr(error, "status_code", None)
+    message = str(error).lower()
+    return status == 413 or "too large" in message or "exceeds the maximum" in message
+
+
+class UpsertWriter:
+    """Writes vectors to a remote index in parallel, byte-sized, retried batches.
+
+    Vectors are buffered per calling thread and cut into batches of at most
+    ``UPSERT_MAX_BATCH_BYTES`` of estimated request payload and
+    ``UPSERT_MAX_BATCH_VECTORS`` vectors, so batches of long chunk texts stay
+    under the request limit and batches of short ones are not needlessly
+    small. Each thread keeps up to ``UPSERT_CONCURRENCY`` batches in flight on
+    a shared pool. Transient failures are retried with full-jitter
+    exponential backoff, and a batch rejected as too large is split in half.
+    Upserts replace vectors by id, so retrying a batch that partly landed is
+    safe; a batch never holds the same id twice (the last write wins).
+    ``flush`` waits for the calling thread's batches, raises the first failure
+    and returns throughput statistics.
+    """
+
+    BYTES_PER_VALUE = 20  # A float32 as JSON text, as the REST client sends it
+    OVERHEAD_BYTES = 64  # Per-vector field names and punctuation
+
+    def __init__(self, index: Any, config: Config):
+        self.index = index
+        self.config = config
+        self.max_batch_bytes = config.UPSERT_MAX_BATCH_BYTES
+        self.max_batch_vectors = config.UPSERT_MAX_BATCH_VECTORS
+        self.concurrency = max(1, config.UPSERT_CONCURRENCY)
+        self._executor = ThreadPoolExecutor(max_workers=self.concurrency * max(1, config.INGESTION_WORKERS),
+                                            thread_name_prefix="hackrx-upsert")
+        self._local = threading.local()
+        self._stats_lock = threading.Lock()  # Batches of one thread finish on several pool threads
+
+    def write(self, vectors: List[Vector]):
+        """Buffer vectors and send every full batch, waiting while too many are in flight."""
+        state = self._state()
+        if state["started"] is None:
+            state["started"] = time.perf_counter()
+        for vector in vectors:
+            size = self.payload_bytes(vector)
+            # A later write of the same id replaces the buffered one
+            previous = state["pending"].pop(vector[0], None)
+            if previous is not None:
+                state["pending_bytes"] -= previous[1]
+            if state["pending"] and (state["pending_bytes"] + size > self.max_batch_bytes
+                                     or len(state["pending"]) >= self.max_batch_vectors):
+                self._submit(state)
+            state["pending"][vector[0]] = (vector, size)
+            state["pending_bytes"] += size
+
+    def flush(self) -> Dict[str, Any]:
+        """Send the remaining vectors, wait for all of this thread's batches and report throughput."""
+        state = self._state()
+        if state["pending"]:
+            self._submit(state)
+        try:
+            self._wait(state, 0)
+        finally:
+            self._local.state = None
+
+        seconds = time.perf_counter() - state["started"] if state["started"] is not None else 0.0
+        stats = {
+            "vectors": state["vectors"],
+            "batches": state["batches"],
+            "retries": state["retries"],
+            "splits": state["splits"],
+            "seconds": round(seconds, 3),
+            "vectors_per_second": round(state["vectors"] / seconds, 1) if seconds else 0.0
+        }
+        if state["vectors"]:
+            UPSERT_THROUGHPUT.observe(stats["vectors_per_second"])
+            logger.info(f"Upserted {stats['vectors']} vectors in {stats['batches']} batches "
+                        f"({stats['vectors_per_second']} vectors/s, {stats['retries']} retries)")
+        return stats
+
+    def payload_bytes(self, vector: Vector) -> int:
+        """Estimated request bytes of one vector."""
+        vector_id, values, metadata = vector
+        return (len(vector_id) + len(values) * self.BYTES_PER_VALUE + self.OVERHEAD_BYTES
+                + len(json.dumps(metadata, ensure_ascii=False)))
+
+    def _state(self) -> Dict[str, Any]:
+        state = getattr(self._local, "state", None)
+        if state is None:
+            state = self._local.state = {
+                "pending": {},  # id -> (vector, payload bytes), in insertion order
+                "pending_bytes": 0,
+                "futures": [],
+                "started": None,
+                "vectors": 0,
+                "batches": 0,
+                "retries": 0,
+                "splits": 0
+            }
+        return state
+
+    def _submit(self, state: Dict[str, Any]):
+        batch = [vector for vector, _ in state["pending"].values()]
+        state["pending"] = {}
+        state["pending_bytes"] = 0
+        # Backpressure: keep at most `concurrency` batches of this thread in flight
+        self._wait(state, self.concurrency - 1)
+        state["futures"].append(self._executor.submit(self._send, batch, state))
+
+    def _wait(self, state: Dict[str, Any], max_in_flight: int):
+        """Wait until at most ``max_in_flight`` batches are running; raise the first failure."""
+        futures: List[Future] = state["futures"]
+        while len(futures) > max_in_flight:
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                futures.remove(future)
+                error = future.exception()
+                if error is not None:
+                    # Let the other batches finish so none lands after the caller gives up
+                    wait(futures)
+                    futures.clear()
+                    self._local.state = None
+                    raise error
+
+    def _send(self, batch: List[Vector], state: Dict[str, Any]):
+        """Upsert one batch, retrying transient failures and splitting oversized batches."""
+        attempt = 0
+        while True:
+            try:
+                with timed("upsert_batch"):
+                    self.index.upsert(vectors=batch)
+                break
+            except Exception as e:
+                if is_too_large(e) and len(batch) > 1:
+                    half = len(batch) // 2
+                    with self._stats_lock:
+                        state["splits"] += 1
+                    logger.warning(f"Upsert of {len(batch)} vectors rejected as too large, splitting")
+                    self._send(batch[:half], state)
+                    self._send(batch[half:], state)
+                    return
+                if attempt >= self.config.UPSERT_MAX_RETRIES or not is_retryable(e):
+                    raise
+                delay = random.uniform(0, min(self.config.UPSERT_MAX_BACKOFF_SECONDS,
+                                              self.config.UPSERT_BACKOFF_SECONDS * 2 ** attempt))
+                attempt += 1
+                with self._stats_lock:
+                    state["retries"] += 1
+                UPSERT_RETRIES.inc()
+                logger.warning(f"Upsert of {len(batch)} vectors failed ({e}), retry {attempt} in {delay:.2f}s")
+                time.sleep(delay)
+
+        with self._stats_lock:
+            state["vectors"] += len(batch)
+            state["batches"] += 1
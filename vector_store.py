@@ -0,0 +1,472 @@
+import os
+import json
+import time
+import shutil
+import threading
+import logging
+from typing import List, Dict, Any, Optional, Tuple
+import numpy as np
+from config import Config
+from ann_index import IVFIndex
+from upsert_writer import UpsertWriter
+
+# Handle different Pinecone versions (only needed for the Pinecone backend)
+try:
+    from pinecone import Pinecone, ServerlessSpec
+    PINECONE_V3 = True
+except ImportError:
+    try:
+        import pinecone
+        PINECONE_V3 = False
+    except ImportError:
+        PINECONE_V3 = None
+
+logger = logging.getLogger(__name__)
+
+Vector = Tuple[str, List[float], Dict[str, Any]]
+
+
+class VectorStore:
+    """Common interface for the vector backends used by ingestion and retrieval.
+
+    Matches are returned as plain dicts with ``id``, ``score`` and ``metadata``
+    keys so callers do not depend on a backend's response types.
+    """
+
+    def upsert(self, vectors: List[Vector]):
+        """Insert or replace ``(id, embedding, metadata)`` tuples."""
+        raise NotImplementedError
+
+    def query(self, vector: List[float], top_k: int,
+              filter: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """Return the ``top_k`` most similar vectors matching ``filter``.
+
+        A ``document_id`` filter is either one id or ``{"$in": [...ids]}``.
+        """
+        raise NotImplementedError
+
+    def has_document(self, document_id: str) -> bool:
+        """Check whether any vector is stored for ``document_id``."""
+        raise NotImplementedError
+
+    def delete(self, ids: List[str], document_id: Optional[str] = None):
+        """Delete vectors by id. ``document_id``, if given, is the document they all belong to."""
+        raise NotImplementedError
+
+    def flush(self):
+        """Persist buffered writes. No-op for backends that write through."""
+        pass
+
+
+class PineconeVectorStore(VectorStore):
+    """Vector store backed by a remote Pinecone index.
+
+    Upserts go through an ``UpsertWriter``: they return once buffered and
+    ``flush`` waits until the calling thread's vectors are written.
+    """
+
+    DELETE_BATCH_SIZE = 1000  # Pinecone's limit on ids per delete call
+
+    def __init__(self, config: Config):
+        if PINECONE_V3 is None:
+            raise ImportError("Pinecone is not installed. Install with: pip install pinecone-client")
+
+        self.config = config
+
+        # Initialize Pinecone based on version
+        if PINECONE_V3:
+            self.pc = Pinecone(api_key=config.PINECONE_API_KEY)
+        else:
+            self.pc = None
+
+        self._ensure_index()
+        self.writer = UpsertWriter(self.index, config)
+
+    def _ensure_index(self):
+        """Ensure Pinecone index exists."""
+        try:
+            if PINECONE_V3:
+                if self.config.PINECONE_INDEX_NAME not in self.pc.list_indexes().names():
+                    self.pc.create_index(
+                        name=self.config.PINECONE_INDEX_NAME,
+                        dimension=self.config.EMBEDDING_DIMENSION,
+                        metric="cosine",
+                        spec=ServerlessSpec(cloud="aws", region="us-east-1")
+                    )
+                    while not self.pc.describe_index(self.config.PINECONE_INDEX_NAME).status["ready"]:
+                        time.sleep(1)
+                # Size the client's connection pool for the upserts kept in flight
+                self.index = self.pc.Index(self.config.PINECONE_INDEX_NAME, pool_threads=self._pool_threads())
+            else:
+                pinecone.init(api_key=self.config.PINECONE_API_KEY, environment="us-east-1-aws")
+                if self.config.PINECONE_INDEX_NAME not in pinecone.list_indexes():
+                    pinecone.create_index(
+                        name=self.config.PINECONE_INDEX_NAME,
+                        dimension=self.config.EMBEDDING_DIMENSION,
+                        metric="cosine"
+                    )
+                    while not pinecone.describe_index(self.config.PINECONE_INDEX_NAME).status["ready"]:
+                        time.sleep(1)
+                self.index = pinecone.Index(self.config.PINECONE_INDEX_NAME, pool_threads=self._pool_threads())
+        except Exception as e:
+            logger.error(f"Error setting up Pinecone index: {e}")
+            raise
+
+    def _pool_threads(self) -> int:
+        return max(1, self.config.UPSERT_CONCURRENCY) * max(1, self.config.INGESTION_WORKERS)
+
+    def upsert(self, vectors: List[Vector]):
+        self.writer.write(vectors)
+
+    def flush(self):
+        self.writer.flush()
+
+    def query(self, vector: List[float], top_k: int,
+              filter: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        results = self.index.query(
+            vector=list(vector),
+            filter=filter,
+            top_k=top_k,
+            include_metadata=True
+        )
+        return [
+            {
+                "id": match["id"],
+                "score": match["score"],
+                "metadata": match.get("metadata") or {}
+            }
+            for match in results.get("matches", [])
+        ]
+
+    def delete(self, ids: List[str], document_id: Optional[str] = None):
+        self.flush()  # Keep deletes ordered after this thread's buffered upserts
+        for start in range(0, len(ids), self.DELETE_BATCH_SIZE):
+            self.index.delete(ids=ids[start:start + self.DELETE_BATCH_SIZE])
+
+    def has_document(self, document_id: str) -> bool:
+        try:
+            dummy_vector = [0.0] * self.config.EMBEDDING_DIMENSION
+            return len(self.query(dummy_vector, top_k=1, filter={"document_id": document_id})) > 0
+        except Exception:
+            return False
+
+
+class LocalVectorStore(VectorStore):
+    """In-process vector store with one memory-mapped matrix per document.
+
+    Each document lives in ``<LOCAL_VECTOR_STORE_DIR>/<document_id>/`` as an
+    ``embeddings.npy`` matrix of L2-normalised float32 rows and a
+    ``metadata.json`` list holding the id and metadata of every row. Queries
+    run an exact cosine scan, i.e. a single matrix-vector product per document.
+    Upserts are buffered in memory and written on ``flush()`` (or lazily before
+    the next query touching the same document).
+    """
+
+    DEFAULT_DOCUMENT = "_default"
+
+    def __init__(self, config: Config):
+        self.config = config
+        self.root = config.LOCAL_VECTOR_STORE_DIR
+        os.makedirs(self.root, exist_ok=True)
+
+        self._lock = threading.RLock()
+        self._documents: Dict[str, Dict[str, Any]] = {}
+        self._pending: Dict[str, Dict[str, Tuple[np.ndarray, Dict[str, Any]]]] = {}
+
+    def upsert(self, vectors: List[Vector]):
+        with self._lock:
+            for vector_id, embedding, metadata in vectors:
+                document_id = (metadata or {}).get("document_id", self.DEFAULT_DOCUMENT)
+                row = self._normalize(np.asarray(embedding, dtype=np.float32))
+                self._pending.setdefault(document_id, {})[vector_id] = (row, dict(metadata or {}))
+
+    def flush(self):
+        with self._lock:
+            for document_id in list(self._pending):
+                self._flush_document(document_id)
+
+    def query(self, vector: List[float], top_k: int,
+              filter: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        filter = dict(filter or {})
+        query_vector = self._normalize(np.asarray(vector, dtype=np.float32))
+
+        if "document_id" in filter:
+            document_ids = sorted(IVFIndex._document_filter(filter.pop("document_id")))
+        else:
+            document_ids = self._list_documents()
+
+        candidates = []
+        for document_id in document_ids:
+            document = self._load_document(document_id)
+            if document is None:
+                continue
+
+            scores = document["matrix"] @ query_vector
+            if filter:
+                mask = np.fromiter(
+                    (all(meta.get(k) == v for k, v in filter.items()) for meta in document["metadata"]),
+                    dtype=bool,
+                    count=len(document["metadata"])
+                )
+                scores = np.where(mask, scores, -np.inf)
+
+            for row in self._top_k(scores, top_k):
+                if np.isfinite(scores[row]):
+                    candidates.append((float(scores[row]), document, int(row)))
+
+        candidates.sort(key=lambda c: c[0], reverse=True)
+        return [
+            {
+                "id": document["ids"][row],
+                "score": score,
+                "metadata": document["metadata"][row]
+            }
+            for score, document, row in candidates[:top_k]
+        ]
+
+    def has_document(self, document_id: str) -> bool:
+        with self._lock:
+            if document_id in self._pending or document_id in self._documents:
+                return True
+        return os.path.exists(self._matrix_path(document_id))
+
+    def delete(self, ids: List[str], document_id: Optional[str] = None):
+        ids = set(ids)
+        with self._lock:
+            for name in [document_id] if document_id else self._list_documents():
+                document = self._load_document(name)
+                if document is None:
+                    continue
+                keep = [n for n, vector_id in enumerate(document["ids"]) if vector_id not in ids]
+                if len(keep) == len(document["ids"]):
+                    continue
+
+                self._documents.pop(name, None)
+                if keep:
+                    self._write_document(
+                        name,
+                        [document["ids"][n] for n in keep],
+                        [document["metadata"][n] for n in keep],
+                        np.asarray(document["matrix"][keep], dtype=np.float32)
+                    )
+                else:
+                    shutil.rmtree(os.path.join(self.root, name), ignore_errors=True)
+                logger.info(f"Local store deleted {len(document['ids']) - len(keep)} vectors from {name}")
+
+    def _load_document(self, document_id: str) -> Optional[Dict[str, Any]]:
+        """Return the cached (ids, metadata, mmap matrix) for a document."""
+        with self._lock:
+            if document_id in self._pending:
+                self._flush_document(document_id)
+
+            document = self._documents.get(document_id)
+            if document is None:
+                document = self._read_document(document_id)
+                if document is not None:
+                    self._documents[document_id] = document
+            return document
+
+    def _read_document(self, document_id: str) -> Optional[Dict[str, Any]]:
+        """Read a document's files from disk, memory-mapping the matrix."""
+        matrix_path = self._matrix_path(document_id)
+        if not os.path.exists(matrix_path):
+            return None
+
+        with open(self._metadata_path(document_id), "r", encoding="utf-8") as f:
+            rows = json.load(f)
+
+        return {
+            "ids": [row["id"] for row in rows],
+            "metadata": [row["metadata"] for row in rows],
+            "matrix": np.load(matrix_path, mmap_mode="r")
+        }
+
+    def _flush_document(self, document_id: str):
+        """Merge buffered rows into the document's files on disk."""
+        pending = self._pending.pop(document_id, None)
+        if not pending:
+            return
+
+        document = self._documents.pop(document_id, None) or self._read_document(document_id)
+        if document is not None:
+            ids = list(document["ids"])
+            metadata = list(document["metadata"])
+            rows = list(np.array(document["matrix"]))
+        else:
+            ids, metadata, rows = [], [], []
+
+        positions = {vector_id: n for n, vector_id in enumerate(ids)}
+        for vector_id, (row, meta) in pending.items():
+            if vector_id in positions:
+                n = positions[vector_id]
+                rows[n] = row
+                metadata[n] = meta
+            else:
+                positions[vector_id] = len(ids)
+                ids.append(vector_id)
+                metadata.append(meta)
+                rows.append(row)
+
+        self._write_document(document_id, ids, metadata, np.vstack(rows).astype(np.float32))
+        logger.info(f"Local store flushed {document_id}: {len(ids)} vectors")
+
+    def _write_document(self, document_id: str, ids: List[str], metadata: List[Dict[str, Any]],
+                        matrix: np.ndarray):
+        """Atomically replace a document's matrix and metadata files."""
+        directory = os.path.join(self.root, document_id)
+        os.makedirs(directory, exist_ok=True)
+
+        tmp_matrix = self._matrix_path(document_id) + ".tmp.npy"
+        np.save(tmp_matrix, matrix)
+        os.replace(tmp_matrix, self._matrix_path(document_id))
+
+        tmp_metadata = self._metadata_path(document_id) + ".tmp"
+        with open(tmp_metadata, "w", encoding="utf-8") as f:
+            json.dump([{"id": i, "metadata": m} for i, m in zip(ids, metadata)], f)
+        os.replace(tmp_metadata, self._metadata_path(document_id))
+
+    def _list_documents(self) -> List[str]:
+        with self._lock:
+            self.flush()
+        return [
+            name for name in os.listdir(self.root)
+            if os.path.exists(self._matrix_path(name))
+        ]
+
+    def _matrix_path(self, document_id: str) -> str:
+        return os.path.join(self.root, document_id, "embeddings.npy")
+
+    def _metadata_path(self, document_id: str) -> str:
+        return os.path.join(self.root, document_id, "metadata.json")
+
+    @staticmethod
+    def _normalize(vector: np.ndarray) -> np.ndarray:
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    @staticmethod
+    def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+        """Indices of the ``k`` highest scores, best first."""
+        if len(scores) <= k:
+            return np.argsort(-scores)
+        top = np.argpartition(-scores, k)[:k]
+        return top[np.argsort(-scores[top])]
+
+
+class InMemoryVectorStore(VectorStore):
+    """Non-persistent exact-search store for benchmarks and offline runs."""
+
+    def __init__(self, config: Optional[Config] = None):
+        self._lock = threading.Lock()
+        self._documents: Dict[str, Dict[str, Tuple[np.ndarray, Dict[str, Any]]]] = {}
+        self._matrices: Dict[str, Tuple[List[str], np.ndarray]] = {}
+
+    def upsert(self, vectors: List[Vector]):
+        with self._lock:
+            for vector_id, embedding, metadata in vectors:
+                document_id = (metadata or {}).get("document_id", LocalVectorStore.DEFAULT_DOCUMENT)
+                row = LocalVectorStore._normalize(np.asarray(embedding, dtype=np.float32))
+                self._documents.setdefault(document_id, {})[vector_id] = (row, dict(metadata or {}))
+                self._matrices.pop(document_id, None)
+
+    def query(self, vector: List[float], top_k: int,
+              filter: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        filter = dict(filter or {})
+        query_vector = LocalVectorStore._normalize(np.asarray(vector, dtype=np.float32))
+
+        with self._lock:
+            if "document_id" in filter:
+                document_ids = sorted(IVFIndex._document_filter(filter.pop("document_id")))
+            else:
+                document_ids = list(self._documents)
+
+            matches = []
+            for document_id in document_ids:
+                rows = self._documents.get(document_id)
+                if not rows:
+                    continue
+                if document_id not in self._matrices:
+                    self._matrices[document_id] = (list(rows), np.vstack([row for row, _ in rows.values()]))
+                ids, matrix = self._matrices[document_id]
+
+                scores = matrix @ query_vector
+                for n in LocalVectorStore._top_k(scores, len(scores) if filter else top_k):
+                    metadata = rows[ids[n]][1]
+                    if all(metadata.get(k) == v for k, v in filter.items()):
+                        matches.append({"id": ids[n], "score": float(scores[n]), "metadata": metadata})
+
+        matches.sort(key=lambda match: match["score"], reverse=True)
+        return matches[:top_k]
+
+    def has_document(self, document_id: str) -> bool:
+        return bool(self._documents.get(document_id))
+
+    def delete(self, ids: List[str], document_id: Optional[str] = None):
+        with self._lock:
+            for name in [document_id] if document_id else list(self._documents):
+                rows = self._documents.get(name, {})
+                for vector_id in ids:
+                    if rows.pop(vector_id, None) is not None:
+                        self._matrices.pop(name, None)
+
+
+class AnnVectorStore(VectorStore):
+    """Local store backed by an IVF index over all documents.
+
+    Unlike ``LocalVectorStore`` a query without a ``document_id`` filter does
+    not scan every document, so cross-document search stays fast as the
+    collection grows. ``document_id`` filters may use ``{"$in": [...]}``.
+    """
+
+    def __init__(self, config: Config):
+        self.config = config
+        self.index = IVFIndex(
+            config.ANN_INDEX_DIR,
+            config.EMBEDDING_DIMENSION,
+            nlist=config.ANN_NLIST,
+            nprobe=config.ANN_NPROBE,
+            min_train_rows=config.ANN_MIN_TRAIN_ROWS,
+            max_segments=config.ANN_MAX_SEGMENTS,
+            exact_filter_rows=config.ANN_EXACT_FILTER_ROWS
+        )
+
+    def upsert(self, vectors: List[Vector]):
+        if not vectors:
+            return
+        rows = np.asarray([embedding for _, embedding, _ in vectors], dtype=np.float32)
+        norms = np.linalg.norm(rows, axis=1, keepdims=True)
+        norms[norms == 0] = 1
+        self.index.add(
+            [vector_id for vector_id, _, _ in vectors],
+            rows / norms,
+            [dict(metadata or {}, document_id=(metadata or {}).get("document_id", LocalVectorStore.DEFAULT_DOCUMENT))
+             for _, _, metadata in vectors]
+        )
+
+    def query(self, vector: List[float], top_k: int,
+              filter: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        return self.index.search(np.asarray(vector, dtype=np.float32), top_k, filter)
+
+    def has_document(self, document_id: str) -> bool:
+        return self.index.has_document(document_id)
+
+    def delete(self, ids: List[str], document_id: Optional[str] = None):
+        self.index.remove(ids)
+        self.index.flush()
+
+    def flush(self):
+        self.index.flush()
+
+
+def create_vector_store(config: Config) -> VectorStore:
+    """Build the vector store selected by ``config.VECTOR_STORE_BACKEND``."""
+    backend = config.VECTOR_STORE_BACKEND.lower()
+    if backend == "pinecone":
+        return PineconeVectorStore(config)
+    if backend == "local":
+        return LocalVectorStore(config)
+    if backend == "memory":
+        return InMemoryVectorStore(config)
+    if backend == "ann":
+        return AnnVectorStore(config)
+    raise ValueError(f"Unknown vector store backend: {config.VECTOR_STORE_BACKEND}")